@@ -0,0 +1,620 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks del Generador de Códigos QR
+--------------------------------------
+Mediciones reproducibles de rendimiento para generador_qr_app.py.
+
+Uso:
+    python benchmark_qr.py paralelo --registros 5000 --workers 1 2 4 8
+    python benchmark_qr.py render --registros 2000
+    python benchmark_qr.py ingesta --registros 100000
+    python benchmark_qr.py formatos --registros 1000 --longitud 32
+    python benchmark_qr.py suite --salida resultados.json --base base.json --umbral 0.15
+    python benchmark_qr.py arranque --limite-ms 200
+    python benchmark_qr.py archivo --registros 20000
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import openpyxl
+
+import generador_qr_app as app
+
+
+def generar_ids_sinteticos(cantidad, longitud=32):
+    """
+    Genera IDs hexadecimales deterministas similares a ID_Unico.
+
+    Args:
+        cantidad (int): Número de IDs a generar
+        longitud (int): Longitud de cada ID (más de 32 repite el hexadecimal)
+
+    Returns:
+        list: Lista de IDs
+    """
+    repeticiones = longitud // 32 + 1
+    return [(uuid.UUID(int=i + 1).hex * repeticiones)[-longitud:] for i in range(cantidad)]
+
+
+def crear_excel_sintetico(ruta, registros, longitud_id=32):
+    """
+    Crea un Excel con la estructura esperada (ID_Unico en la columna L)
+    usando el modo de solo escritura de openpyxl.
+
+    Args:
+        ruta (str): Ruta del archivo a crear
+        registros (int): Número de filas de datos
+        longitud_id (int): Longitud de cada ID_Unico
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([f"Columna_{i}" for i in range(1, 12)] + ["ID_Unico", "QR"])
+    for numero, id_unico in enumerate(generar_ids_sinteticos(registros, longitud_id)):
+        ws.append([f"dato_{numero}_{i}" for i in range(1, 12)] + [id_unico, None])
+    wb.save(ruta)
+
+
+def _medir(funcion):
+    """
+    Ejecuta una función dos veces: una para medir el tiempo de pared y otra
+    bajo tracemalloc para el pico de memoria (tracemalloc distorsiona el tiempo).
+
+    Returns:
+        tuple: (resultado, segundos, pico en MB)
+    """
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, duracion, pico / (1024 * 1024)
+
+
+def benchmark_paralelo(registros, lista_workers, tamano_lote):
+    """
+    Mide cómo escala el throughput de generar_imagenes_qr (la canalización que usa
+    procesar_excel_optimizado, sin caché) con el número de procesos.
+
+    Args:
+        registros (int): Número de códigos a generar por medición
+        lista_workers (list): Valores de workers a medir
+        tamano_lote (int): Tamaño de lote enviado a cada proceso
+    """
+    ids = generar_ids_sinteticos(registros)
+    print(f"📊 Benchmark paralelo: {registros} QR, lotes de {tamano_lote}")
+    print(f"{'workers':>8} {'segundos':>10} {'QR/s':>10} {'speedup':>8}")
+
+    base = None
+    for workers in lista_workers:
+        directorio = tempfile.mkdtemp(prefix="bench_qr_")
+        try:
+            tareas = [(id_unico, os.path.join(directorio, id_unico)) for id_unico in ids]
+            inicio = time.perf_counter()
+            resultados, _ = app.generar_imagenes_qr(tareas, calidad=85, workers=workers,
+                                                    tamano_lote=tamano_lote, usar_cache=False)
+            duracion = time.perf_counter() - inicio
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        exitosos = sum(1 for ruta, _ in resultados if ruta)
+        if exitosos != registros:
+            print(f"❌ Solo {exitosos}/{registros} QR generados con {workers} workers")
+        base = base or duracion
+        print(f"{workers:>8} {duracion:>10.2f} {registros / duracion:>10.1f} {base / duracion:>7.2f}x")
+
+
+def benchmark_render(registros):
+    """
+    Compara el motor de renderizado NumPy ('rapido') contra la fábrica PIL de qrcode
+    ('pil'), en memoria y guardando el archivo, la máscara óptima frente a la
+    memoizada y el JPEG frente al PNG de 1 bit emitido directamente.
+
+    Args:
+        registros (int): Número de códigos por medición
+    """
+    ids = generar_ids_sinteticos(registros)
+    print(f"📊 Benchmark de renderizado: {registros} QR")
+    print(f"{'motor':>8} {'máscara':>8} {'modo':>8} {'ms/QR':>8} {'bytes/QR':>9} {'QR/s':>8}")
+
+    combinaciones = (("pil", "optima", "jpeg"), ("rapido", "optima", "jpeg"), ("rapido", "memo", "jpeg"),
+                     ("rapido", "optima", "png1"), ("rapido", "memo", "png1"))
+    for motor, mascara, formato in combinaciones:
+        if formato == "jpeg":
+            inicio = time.perf_counter()
+            for id_unico in ids:
+                app.generar_qr_optimizado(id_unico, return_image=True, motor=motor, mascara=mascara)
+            duracion = time.perf_counter() - inicio
+            print(f"{motor:>8} {mascara:>8} {'memoria':>8} {duracion / registros * 1000:>8.3f} "
+                  f"{'-':>9} {registros / duracion:>8.0f}")
+
+        directorio = tempfile.mkdtemp(prefix="bench_qr_")
+        try:
+            inicio = time.perf_counter()
+            total_bytes = 0
+            for id_unico in ids:
+                ruta = app.generar_qr_optimizado(id_unico, os.path.join(directorio, id_unico),
+                                                 motor=motor, mascara=mascara, formato=formato)
+                total_bytes += os.path.getsize(ruta)
+            duracion = time.perf_counter() - inicio
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+        print(f"{motor:>8} {mascara:>8} {formato:>8} {duracion / registros * 1000:>8.3f} "
+              f"{total_bytes // registros:>9} {registros / duracion:>8.0f}")
+
+
+def benchmark_formatos(registros, longitud=32, mascara="memo"):
+    """
+    Informe de tamaño y tiempo de codificación por formato de salida, con la
+    fracción de códigos dentro del presupuesto de 'auto' y los formatos que elige.
+
+    Args:
+        registros (int): Número de códigos por formato
+        longitud (int): Longitud de los IDs
+        mascara (str): Modo de máscara usado (el mismo para todos los formatos)
+    """
+    ids = generar_ids_sinteticos(registros, longitud)
+    presupuesto = app.PRESUPUESTO_BYTES_AUTO
+    print(f"📊 Benchmark de formatos: {registros} QR de {longitud} caracteres, máscara '{mascara}', "
+          f"presupuesto {presupuesto // 1024} KB")
+    print(f"{'formato':>11} {'ms/QR':>8} {'QR/s':>8} {'bytes med.':>10} {'bytes máx.':>10} {'≤ presup.':>9}")
+
+    for formato in app.formatos_salida():
+        tamanos = []
+        elegidos = {}
+        inicio = time.perf_counter()
+        for id_unico in ids:
+            datos = app.generar_qr_optimizado(id_unico, return_bytes=True, mascara=mascara, formato=formato)
+            tamanos.append(len(datos))
+            if formato == "auto":
+                extension = app.extension_de_datos(datos)
+                elegidos[extension] = elegidos.get(extension, 0) + 1
+        duracion = time.perf_counter() - inicio
+        dentro = sum(1 for tamano in tamanos if tamano <= presupuesto) / registros * 100
+        print(f"{formato:>11} {duracion / registros * 1000:>8.3f} {registros / duracion:>8.0f} "
+              f"{sum(tamanos) // registros:>10} {max(tamanos):>10} {dentro:>8.1f}%")
+        if elegidos:
+            print(f"{'':>11} elegidos: " + ", ".join(f"{extension} {cuenta}" for extension, cuenta in elegidos.items()))
+
+
+def benchmark_ingesta(registros):
+    """
+    Compara la lectura anterior de la columna ID_Unico (validación con pandas
+    + pd.read_excel completo) contra la lectura en streaming de leer_columna_ids().
+
+    Args:
+        registros (int): Filas del Excel sintético
+    """
+    import pandas as pd
+
+    directorio = tempfile.mkdtemp(prefix="bench_qr_")
+    ruta = os.path.join(directorio, "sintetico.xlsx")
+    try:
+        crear_excel_sintetico(ruta, registros)
+        print(f"📊 Benchmark de ingesta: {registros} filas ({os.path.getsize(ruta) / 1024 / 1024:.1f} MB)")
+
+        def lectura_pandas():
+            pd.read_excel(ruta, nrows=1)
+            df = pd.read_excel(ruta)
+            return [str(valor) for valor in df["ID_Unico"]]
+
+        def lectura_streaming():
+            app.validar_archivo_excel(ruta)
+            _, _, filas = app.leer_columna_ids(ruta)
+            return [str(valor) for _, valor in filas]
+
+        print(f"{'método':>10} {'segundos':>10} {'pico MB':>10}")
+        for nombre, funcion in (("pandas", lectura_pandas), ("streaming", lectura_streaming)):
+            ids, duracion, pico = _medir(funcion)
+            if len(ids) != registros:
+                print(f"❌ {nombre}: {len(ids)} IDs leídos de {registros}")
+            print(f"{nombre:>10} {duracion:>10.2f} {pico:>10.1f}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def benchmark_archivo(registros):
+    """
+    Compara la carpeta de imágenes (un archivo por ID, un open/read/close por
+    lectura) contra el archivo ZIP sin compresión leído con ArchivoImagenesQR
+    (vistas mmap, sin copias).
+
+    Args:
+        registros (int): Número de imágenes
+    """
+    directorio = tempfile.mkdtemp(prefix="bench_qr_")
+    try:
+        imagenes = [(id_unico, f"qr_{id_unico}", app.generar_qr_optimizado(id_unico, return_bytes=True,
+                                                                         mascara="memo", formato="png1"))
+                    for id_unico in generar_ids_sinteticos(registros)]
+        carpeta = os.path.join(directorio, "carpeta")
+        os.makedirs(carpeta)
+        ruta_zip = os.path.join(directorio, "imagenes.zip")
+        print(f"📦 Benchmark de archivo de imágenes: {registros} imágenes PNG de 1 bit")
+
+        def escribir_carpeta():
+            for _, nombre, datos in imagenes:
+                with open(os.path.join(carpeta, nombre + ".png"), "wb") as archivo:
+                    archivo.write(datos)
+
+        def leer_carpeta():
+            total = 0
+            for _, nombre, _ in imagenes:
+                with open(os.path.join(carpeta, nombre + ".png"), "rb") as archivo:
+                    total += len(archivo.read())
+            return total
+
+        def leer_archivo():
+            # Un cargador enviaría cada vista directamente al socket
+            with app.ArchivoImagenesQR(ruta_zip) as archivo:
+                return sum(len(archivo[id_unico]) for id_unico, _, _ in imagenes)
+
+        print(f"{'método':>10} {'escritura s':>12} {'lectura s':>10} {'archivos':>9}")
+        for nombre, escribir, leer, archivos in (
+                ("carpeta", escribir_carpeta, leer_carpeta, registros),
+                ("zip", lambda: app.escribir_archivo_imagenes_qr(ruta_zip, imagenes), leer_archivo, 1)):
+            _, duracion_escritura, _ = _medir(escribir)
+            leidos, duracion_lectura, _ = _medir(leer)
+            if leidos != sum(len(datos) for _, _, datos in imagenes):
+                print(f"❌ {nombre}: {leidos} bytes leídos")
+            print(f"{nombre:>10} {duracion_escritura:>12.3f} {duracion_lectura:>10.3f} {archivos:>9}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+# Dependencias que no deben cargarse al importar generador_qr_app
+DEPENDENCIAS_PESADAS = ("numpy", "pandas", "openpyxl", "PIL", "qrcode")
+
+
+def benchmark_arranque(repeticiones=7, limite_ms=None):
+    """
+    Mide el tiempo de arranque en procesos nuevos: importar el módulo, la ayuda
+    de la CLI y un único código con `qr`. Desglosa la importación con
+    `python -X importtime` y comprueba que no carga dependencias pesadas.
+
+    Args:
+        repeticiones (int): Ejecuciones por caso (se informa el mínimo y la mediana)
+        limite_ms (float, optional): Tiempo máximo aceptado para `qr`
+
+    Returns:
+        int: 0 si se cumplen el límite y la importación diferida, 1 si no
+    """
+    script = os.path.abspath(app.__file__)
+    directorio_app = os.path.dirname(script)
+    directorio = tempfile.mkdtemp(prefix="bench_qr_")
+    casos = (
+        ("python vacío", [sys.executable, "-c", "pass"]),
+        ("importar", [sys.executable, "-c", "import generador_qr_app"]),
+        ("--help", [sys.executable, script, "--help"]),
+        ("qr png1", [sys.executable, script, "qr", generar_ids_sinteticos(1)[0],
+                     "-o", os.path.join(directorio, "qr")]),
+    )
+    fallos = 0
+    try:
+        print(f"📊 Benchmark de arranque ({repeticiones} repeticiones por caso)")
+        print(f"{'caso':>14} {'mín. ms':>9} {'mediana ms':>11}")
+        for nombre, comando in casos:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                subprocess.run(comando, cwd=directorio_app, check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            print(f"{nombre:>14} {tiempos[0]:>9.1f} {tiempos[len(tiempos) // 2]:>11.1f}")
+            if nombre == "qr png1" and limite_ms and tiempos[0] > limite_ms:
+                print(f"❌ `qr` tarda {tiempos[0]:.0f} ms (límite {limite_ms:.0f} ms)")
+                fallos += 1
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    # Desglose de -X importtime: "import time: propio | acumulado | módulo"
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import generador_qr_app"],
+                            cwd=directorio_app, capture_output=True, text=True, check=True).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        partes = linea.split("|")
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            modulos.append((int(partes[1]), partes[2].strip()))
+    print("⏱️ Importaciones más costosas (acumulado, µs):")
+    for acumulado, modulo in sorted(modulos, reverse=True)[:10]:
+        print(f"   {acumulado:>8} {modulo}")
+    cargadas = sorted({modulo.split(".")[0] for _, modulo in modulos} & set(DEPENDENCIAS_PESADAS))
+    if cargadas:
+        print(f"❌ Importar generador_qr_app carga: {', '.join(cargadas)}")
+        fallos += 1
+    else:
+        print("✅ Sin dependencias pesadas al importar generador_qr_app")
+    return 1 if fallos else 0
+
+
+# Etapas de procesar_excel_optimizado() agrupadas como las reporta la suite
+ETAPAS_SUITE = {
+    'lectura': ('validacion', 'lectura_ids'),
+    'codificacion': ('generacion_qr',),
+    'insercion': ('carga_libro', 'insercion', 'escritura_streaming'),
+    'guardado': ('guardado_excel', 'inyeccion_imagenes', 'manifiesto'),
+}
+
+# Por debajo de este tiempo las diferencias se consideran ruido al comparar
+RUIDO_SEGUNDOS = 0.05
+
+
+def _pico_rss_mb():
+    """
+    Pico de memoria residente del proceso actual y de sus hijos ya terminados
+    (los procesos del pool). None si la plataforma no ofrece el módulo resource.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(max(propio, hijos) / divisor, 1)
+
+
+def medir_caso(ruta, workers, tamano_lote, modo_escritura, muestra_micro=1000):
+    """
+    Procesa un Excel sintético con la caché desactivada y devuelve los tiempos
+    por etapa, el pico de RSS y el tamaño de la salida. Se ejecuta en un
+    subproceso propio para que el pico de RSS corresponda solo a este caso; el
+    resultado vuelve en un archivo JSON (ver `_caso`), no por stdout, donde
+    pueden escribir los procesos del pool.
+
+    Args:
+        ruta (str): Excel sintético
+        workers (int): Procesos para generar QR
+        tamano_lote (int): Tamaño de lote del pool
+        modo_escritura (str): 'completo' o 'streaming'
+        muestra_micro (int): IDs usados para separar codificación QR y guardado JPEG
+
+    Returns:
+        dict: Resultado del caso
+    """
+    metricas = app.MetricasEjecucion()
+    inicio = time.perf_counter()
+    with open(os.devnull, "w") as nulo:
+        sys.stdout, salida_original = nulo, sys.stdout
+        try:
+            resumen = app.procesar_excel_optimizado(
+                ruta, workers=workers, tamano_lote=tamano_lote, usar_cache=False,
+                modo_escritura=modo_escritura, directorio_salida=os.path.dirname(ruta),
+                metricas=metricas)
+        finally:
+            sys.stdout = salida_original
+    total = time.perf_counter() - inicio
+    datos = metricas.a_dict()
+
+    etapas = {nombre: round(sum(datos['etapas'].get(etapa, {}).get('pared_s', 0.0) for etapa in grupo), 4)
+              for nombre, grupo in ETAPAS_SUITE.items()}
+
+    # Desglose por QR en el proceso actual: codificación + rasterizado frente a guardado JPEG
+    _, _, filas = app.leer_columna_ids(ruta)
+    muestra = [str(valor) for _, valor in filas][:muestra_micro]
+    inicio = time.perf_counter()
+    for texto in muestra:
+        app.generar_qr_optimizado(texto, return_image=True)
+    imagen_s = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for texto in muestra:
+        app.generar_qr_optimizado(texto, return_bytes=True)
+    bytes_s = time.perf_counter() - inicio
+
+    return {
+        'exito': resumen['exito'],
+        'segundos_total': round(total, 4),
+        'etapas': etapas,
+        'qr_ms': round(imagen_s / max(len(muestra), 1) * 1000, 4),
+        'jpeg_ms': round(max(bytes_s - imagen_s, 0.0) / max(len(muestra), 1) * 1000, 4),
+        'qr_por_segundo': round(resumen['qr_generados'] / max(etapas['codificacion'], 1e-9), 1),
+        'bytes_salida': os.path.getsize(resumen['salida']) if resumen['salida'] else 0,
+        'pico_rss_mb': _pico_rss_mb(),
+    }
+
+
+def benchmark_suite(tamanos, longitudes, workers, tamano_lote, modo_escritura, ruta_salida=None):
+    """
+    Ejecuta la suite completa Excel → QR → Excel sobre libros sintéticos.
+
+    Args:
+        tamanos (list): Número de filas de cada libro
+        longitudes (list): Longitudes de ID_Unico a medir
+        workers (int): Procesos para generar QR
+        tamano_lote (int): Tamaño de lote del pool
+        modo_escritura (str): 'completo' o 'streaming'
+        ruta_salida (str, optional): JSON donde guardar los resultados
+
+    Returns:
+        dict: Resultados con metadatos del entorno
+    """
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'parametros': {'workers': workers, 'tamano_lote': tamano_lote,
+                       'modo_escritura': modo_escritura},
+        'casos': [],
+    }
+    print(f"📊 Suite de benchmarks ({modo_escritura}, {workers} workers)")
+    print(f"{'filas':>8} {'long.':>6} {'lectura':>8} {'codif.':>8} {'inserc.':>8} "
+          f"{'guardado':>8} {'total':>8} {'QR/s':>8} {'RSS MB':>7} {'salida MB':>9}")
+
+    for tamano in tamanos:
+        for longitud in longitudes:
+            directorio = tempfile.mkdtemp(prefix="bench_qr_")
+            try:
+                ruta = os.path.join(directorio, "sintetico.xlsx")
+                ruta_resultado = os.path.join(directorio, "caso.json")
+                crear_excel_sintetico(ruta, tamano, longitud)
+                # Subproceso propio por caso: el pico de RSS no se mezcla entre casos
+                proceso = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "_caso", ruta,
+                     "--workers", str(workers), "--tamano-lote", str(tamano_lote),
+                     "--modo-escritura", modo_escritura, "--resultado", ruta_resultado],
+                    cwd=directorio, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                medido = None
+                if proceso.returncode == 0:
+                    with open(ruta_resultado, encoding="utf-8") as archivo:
+                        medido = json.load(archivo)
+            finally:
+                shutil.rmtree(directorio, ignore_errors=True)
+            if medido is None:
+                print(f"❌ Caso {tamano} filas / {longitud} caracteres falló:\n{proceso.stderr}")
+                continue
+
+            caso = {'filas': tamano, 'longitud_id': longitud, **medido}
+            resultados['casos'].append(caso)
+            etapas = caso['etapas']
+            rss = f"{caso['pico_rss_mb']:.1f}" if caso['pico_rss_mb'] is not None else "-"
+            print(f"{tamano:>8} {longitud:>6} {etapas['lectura']:>8.2f} {etapas['codificacion']:>8.2f} "
+                  f"{etapas['insercion']:>8.2f} {etapas['guardado']:>8.2f} {caso['segundos_total']:>8.2f} "
+                  f"{caso['qr_por_segundo']:>8.1f} {rss:>7} {caso['bytes_salida'] / 1024 / 1024:>9.2f}")
+
+    if ruta_salida:
+        with open(ruta_salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados guardados en: {ruta_salida}")
+    return resultados
+
+
+def comparar_con_base(resultados, base, umbral):
+    """
+    Compara los resultados con una ejecución de referencia.
+
+    Un caso (filas, longitud) regresa si su tiempo total o el de alguna etapa
+    supera al de la base en más de `umbral` (fracción, 0.10 = 10%), o si su
+    pico de RSS lo hace. Se ignoran los tiempos por debajo de RUIDO_SEGUNDOS.
+
+    Args:
+        resultados (dict): Resultados de benchmark_suite()
+        base (dict): Resultados de referencia con el mismo formato
+        umbral (float): Empeoramiento relativo tolerado
+
+    Returns:
+        list: Descripciones de las regresiones encontradas
+    """
+    casos_base = {(caso['filas'], caso['longitud_id']): caso for caso in base['casos']}
+    regresiones = []
+    for caso in resultados['casos']:
+        referencia = casos_base.get((caso['filas'], caso['longitud_id']))
+        if referencia is None:
+            continue
+        metricas = [('total', caso['segundos_total'], referencia['segundos_total'])]
+        metricas += [(etapa, valor, referencia['etapas'].get(etapa, 0.0))
+                     for etapa, valor in caso['etapas'].items()]
+        for nombre, actual, anterior in metricas:
+            if max(actual, anterior) >= RUIDO_SEGUNDOS and actual > anterior * (1 + umbral):
+                regresiones.append(f"{caso['filas']} filas / {caso['longitud_id']} caracteres: "
+                                   f"{nombre} {anterior:.2f} s → {actual:.2f} s "
+                                   f"(+{(actual / max(anterior, 1e-9) - 1) * 100:.0f}%)")
+        if caso['pico_rss_mb'] and referencia.get('pico_rss_mb') and \
+                caso['pico_rss_mb'] > referencia['pico_rss_mb'] * (1 + umbral):
+            regresiones.append(f"{caso['filas']} filas / {caso['longitud_id']} caracteres: "
+                               f"RSS {referencia['pico_rss_mb']:.1f} MB → {caso['pico_rss_mb']:.1f} MB")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del generador de QR")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_paralelo = subparsers.add_parser("paralelo", help="Escalado con el número de procesos")
+    p_paralelo.add_argument("--registros", type=int, default=2000)
+    p_paralelo.add_argument("--workers", type=int, nargs="+",
+                            default=[1, 2, 4, os.cpu_count() or 1])
+    p_paralelo.add_argument("--tamano-lote", type=int, default=app.TAMANO_LOTE_DEFECTO)
+
+    p_render = subparsers.add_parser("render", help="Motor NumPy vs fábrica PIL")
+    p_render.add_argument("--registros", type=int, default=1000)
+
+    p_ingesta = subparsers.add_parser("ingesta", help="Lectura pandas vs streaming")
+    p_ingesta.add_argument("--registros", type=int, default=50000)
+
+    p_formatos = subparsers.add_parser("formatos", help="Tamaño y velocidad por formato de salida")
+    p_formatos.add_argument("--registros", type=int, default=500)
+    p_formatos.add_argument("--longitud", type=int, default=32, help="Longitud de ID_Unico")
+    p_formatos.add_argument("--mascara", choices=app.MODOS_MASCARA, default="memo")
+
+    p_suite = subparsers.add_parser("suite", help="Pipeline completo por etapas con comparación contra una base")
+    p_suite.add_argument("--tamanos", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    p_suite.add_argument("--longitudes", type=int, nargs="+", default=[8, 32, 64],
+                         help="Longitudes de ID_Unico a medir")
+    p_suite.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p_suite.add_argument("--tamano-lote", type=int, default=app.TAMANO_LOTE_DEFECTO)
+    p_suite.add_argument("--modo-escritura", choices=app.MODOS_ESCRITURA, default="completo")
+    p_suite.add_argument("--salida", help="JSON donde guardar los resultados")
+    p_suite.add_argument("--base", help="JSON de una ejecución anterior para detectar regresiones")
+    p_suite.add_argument("--umbral", type=float, default=0.10,
+                         help="Empeoramiento relativo tolerado frente a la base (0.10 = 10%%)")
+
+    p_arranque = subparsers.add_parser("arranque", help="Tiempo de arranque e importaciones (-X importtime)")
+    p_arranque.add_argument("--repeticiones", type=int, default=7)
+    p_arranque.add_argument("--limite-ms", type=float,
+                            help="Falla (código 1) si `qr` tarda más que este tiempo")
+
+    p_archivo = subparsers.add_parser("archivo", help="Carpeta de imágenes vs ZIP sin compresión con mmap")
+    p_archivo.add_argument("--registros", type=int, default=10000)
+
+    # Uso interno de la suite: un caso por subproceso
+    p_caso = subparsers.add_parser("_caso")
+    p_caso.add_argument("ruta")
+    p_caso.add_argument("--workers", type=int)
+    p_caso.add_argument("--tamano-lote", type=int, default=app.TAMANO_LOTE_DEFECTO)
+    p_caso.add_argument("--modo-escritura", default="completo")
+    p_caso.add_argument("--resultado", required=True, help="JSON donde escribir el resultado del caso")
+
+    args = parser.parse_args(argv)
+    if args.comando == "paralelo":
+        benchmark_paralelo(args.registros, args.workers, args.tamano_lote)
+    elif args.comando == "render":
+        benchmark_render(args.registros)
+    elif args.comando == "ingesta":
+        benchmark_ingesta(args.registros)
+    elif args.comando == "formatos":
+        benchmark_formatos(args.registros, args.longitud, args.mascara)
+    elif args.comando == "arranque":
+        return benchmark_arranque(args.repeticiones, args.limite_ms)
+    elif args.comando == "archivo":
+        benchmark_archivo(args.registros)
+    elif args.comando == "_caso":
+        resultado = medir_caso(args.ruta, args.workers, args.tamano_lote, args.modo_escritura)
+        with open(args.resultado, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo)
+    elif args.comando == "suite":
+        resultados = benchmark_suite(args.tamanos, args.longitudes, args.workers, args.tamano_lote,
+                                     args.modo_escritura, args.salida)
+        if args.base:
+            with open(args.base, encoding="utf-8") as archivo:
+                base = json.load(archivo)
+            regresiones = comparar_con_base(resultados, base, args.umbral)
+            if regresiones:
+                print(f"❌ {len(regresiones)} regresiones frente a {args.base} (umbral {args.umbral:.0%}):")
+                for regresion in regresiones:
+                    print(f"   • {regresion}")
+                return 1
+            print(f"✅ Sin regresiones frente a {args.base} (umbral {args.umbral:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,274 +23,2741 @@ FECHA: Enero 2025
 VERSIÓN: 2.0 Final
 """
 
+import io
 import os
 import re
-import pandas as pd
-import qrcode
-from PIL import Image
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import posixpath
+import json
+import glob
+import argparse
+import contextlib
+import bisect
+import struct
+import zlib
+import mmap
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque, namedtuple
 import time
 import sys
-import openpyxl
-from openpyxl.drawing.image import Image as XLImage
-from openpyxl.styles import Alignment
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-def limpiar_nombre_archivo(nombre):
+# NumPy, PIL, qrcode y openpyxl se importan dentro de las funciones que los usan:
+# la ayuda o un único código PNG no pagan la carga de todas las dependencias
+
+# Tamaño de lote por defecto para la generación en paralelo.
+# Lotes grandes amortizan el costo de enviar tareas entre procesos.
+TAMANO_LOTE_DEFECTO = 64
+
+# Hilos de la etapa de escritura a disco (solapa la E/S con la codificación)
+HILOS_ESCRITURA_DEFECTO = 4
+
+# Parámetros del código QR compartidos por todos los motores de renderizado
+QR_ERROR_CORRECTION = 1  # qrcode.constants.ERROR_CORRECT_L
+QR_BOX_SIZE = 8
+QR_BORDER = 2
+
+# 'rapido' = rasterizado NumPy en escala de grises, 'pil' = fábrica de imágenes de qrcode
+MOTOR_RENDER_DEFECTO = 'rapido'
+
+# 'optima' evalúa las 8 máscaras para cada código (comportamiento de qrcode);
+# 'memo' reutiliza versión y máscara entre contenidos de la misma forma (IDs de longitud fija)
+MODOS_MASCARA = ('optima', 'memo')
+MASCARA_QR_DEFECTO = 'optima'
+
+# Caché persistente de QR entre ejecuciones (direccionada por contenido)
+DIRECTORIO_CACHE_DEFECTO = os.path.join("codigos_qr_optimizados", ".cache")
+LIMITE_CACHE_MB_DEFECTO = 500
+
+# Nivel de compresión zlib del PNG de 1 bit (las imágenes son muy pequeñas)
+NIVEL_ZLIB_PNG = 9
+
+# Formato 'auto': el más pequeño de estos que quepa en el presupuesto
+# (límite de WhatsApp Business para imágenes ligeras). 'auto_excel' es el 'auto'
+# de las ejecuciones cuyas imágenes solo van al Excel: solo formatos que Excel muestra
+CANDIDATOS_AUTO = ('png1', 'png_paleta', 'webp', 'jpeg_base', 'jpeg')
+FORMATOS_AUTO = {'auto': CANDIDATOS_AUTO, 'auto_excel': ('png1', 'png_paleta', 'jpeg_base', 'jpeg')}
+PRESUPUESTO_BYTES_AUTO = 10 * 1024
+
+# Extensiones de imagen que Excel muestra; el resto se incrusta como PNG de 1 bit
+EXTENSIONES_EXCEL = ('.jpg', '.png')
+
+# 'completo' carga el libro entero con openpyxl (conserva formato);
+# 'streaming' escribe filas e imágenes incrementalmente (memoria constante)
+MODOS_ESCRITURA = ('completo', 'streaming')
+
+# Espacios de nombres y tipos del formato OOXML usados al escribir dibujos
+NS_HOJA = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_RELACIONES = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_DIBUJO = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_DRAWINGML = "http://schemas.openxmlformats.org/drawingml/2006/main"
+TIPO_REL_DIBUJO = NS_REL + "/drawing"
+TIPO_REL_IMAGEN = NS_REL + "/image"
+TIPO_CONTENIDO_DIBUJO = "application/vnd.openxmlformats-officedocument.drawing+xml"
+EMU_POR_PIXEL = 9525
+
+# Imagen guardada en otro paquete ZIP: un .xlsx (p. ej. la salida de la ejecución
+# anterior) o un archivo .imagenes.zip
+ParteXlsx = namedtuple('ParteXlsx', ['ruta_xlsx', 'parte'])
+
+# Trabajo de procesamiento: columna de entrada de una hoja -> columna donde se anclan
+# los QR. hoja None = hoja activa; columna None = ID_Unico o, si no existe, la L
+TrabajoQR = namedtuple('TrabajoQR', ['hoja', 'columna', 'salida'])
+TRABAJO_DEFECTO = TrabajoQR(None, None, 'M')
+
+# Versión del formato del manifiesto usado por el modo incremental
+# (2: filas identificadas por hoja, columna de salida y fila)
+VERSION_MANIFIESTO = 2
+
+# Entrada del archivo de imágenes con el índice ID -> entrada
+NOMBRE_INDICE_ARCHIVO = "indice.json"
+
+# Cada cuántos segundos se guarda el punto de control durante la generación
+INTERVALO_PUNTO_CONTROL_SEGUNDOS = 30
+
+# Longitud máxima de los nombres de archivo de las imágenes y caracteres del
+# sufijo hash que desambigua nombres truncados, vacíos o repetidos
+LONGITUD_MAXIMA_NOMBRE = 100
+LONGITUD_SUFIJO_HASH = 8
+
+# Nombres de dispositivo reservados en Windows (con cualquier extensión): un ID
+# que se limpia a uno de ellos lleva sufijo hash como los nombres repetidos
+NOMBRES_RESERVADOS = frozenset(['con', 'prn', 'aux', 'nul']
+                               + [f"com{numero}" for numero in range(1, 10)]
+                               + [f"lpt{numero}" for numero in range(1, 10)])
+
+# Actualizaciones por segundo de las líneas de progreso en consola: escribir y
+# vaciar stdout en cada fila cuesta más que codificar un QR de ID corto
+FRECUENCIA_PROGRESO_HZ = 10
+
+# Límites (en segundos) de las cubetas de los histogramas de latencia por fila
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+class MetricasEjecucion:
+    """
+    Instrumentación de una ejecución: tiempos por etapa (pared y CPU), contadores
+    e histogramas de latencia por fila.
+
+    Las etapas se miden de forma secuencial: etapa() cierra la anterior y abre la
+    siguiente. El tiempo de CPU de las etapas es el del proceso principal; la CPU
+    gastada generando QR en los procesos de trabajo se acumula en el contador
+    'cpu_generacion_segundos'.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+        self.histogramas = {}
+        self._etapa_actual = None
+
+    def etapa(self, nombre):
+        """
+        Cierra la etapa en curso (si la hay) y empieza a medir `nombre`.
+        Medir varias veces la misma etapa acumula los tiempos.
+        """
+        self.cerrar()
+        self._etapa_actual = (nombre, time.perf_counter(), time.process_time())
+
+    def cerrar(self):
+        """
+        Cierra la etapa en curso.
+        """
+        if self._etapa_actual is None:
+            return
+        nombre, pared, cpu = self._etapa_actual
+        self._etapa_actual = None
+        acumulado = self.etapas.setdefault(nombre, {'pared_s': 0.0, 'cpu_s': 0.0})
+        acumulado['pared_s'] += time.perf_counter() - pared
+        acumulado['cpu_s'] += time.process_time() - cpu
+
+    def contar(self, nombre, valor=1):
+        """
+        Suma `valor` al contador `nombre`.
+        """
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+    def observar(self, nombre, segundos):
+        """
+        Registra una latencia en el histograma `nombre`.
+        """
+        histograma = self.histogramas.get(nombre)
+        if histograma is None:
+            histograma = self.histogramas[nombre] = {
+                'cubetas': [0] * (len(LIMITES_LATENCIA) + 1), 'cuenta': 0, 'suma': 0.0, 'maximo': 0.0}
+        histograma['cubetas'][bisect.bisect_left(LIMITES_LATENCIA, segundos)] += 1
+        histograma['cuenta'] += 1
+        histograma['suma'] += segundos
+        histograma['maximo'] = max(histograma['maximo'], segundos)
+
+    def a_dict(self):
+        """
+        Exporta las métricas como un diccionario serializable a JSON.
+        Las cubetas de los histogramas no son acumulativas; la última es +Inf.
+        """
+        self.cerrar()
+        return {
+            'etapas': {nombre: {clave: round(valor, 6) for clave, valor in tiempos.items()}
+                       for nombre, tiempos in self.etapas.items()},
+            'contadores': {nombre: round(valor, 6) if isinstance(valor, float) else valor
+                           for nombre, valor in self.contadores.items()},
+            'histogramas': {nombre: {'limites': list(LIMITES_LATENCIA), 'cubetas': list(h['cubetas']),
+                                     'cuenta': h['cuenta'], 'suma': round(h['suma'], 6),
+                                     'maximo': round(h['maximo'], 6)}
+                            for nombre, h in self.histogramas.items()},
+        }
+
+def metricas_a_prometheus(metricas_por_archivo):
+    """
+    Convierte métricas exportadas con MetricasEjecucion.a_dict() al formato de
+    texto de Prometheus (apto para el textfile collector de node_exporter).
+
+    Args:
+        metricas_por_archivo (list): Tuplas (ruta_archivo, dict de métricas)
+
+    Returns:
+        str: Texto en formato de exposición de Prometheus
+    """
+    def escapar(valor):
+        # Valores de etiqueta: barra invertida, comillas y saltos de línea escapados
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def etiquetas(**valores):
+        return ",".join(f'{clave}="{escapar(valor)}"' for clave, valor in valores.items())
+
+    familias = {}
+    def agregar(nombre, tipo, linea):
+        familias.setdefault(nombre, (tipo, []))[1].append(linea)
+
+    for archivo, metricas in metricas_por_archivo:
+        for etapa, tiempos in metricas['etapas'].items():
+            agregar("qr_etapa_pared_segundos", "gauge",
+                    f"qr_etapa_pared_segundos{{{etiquetas(archivo=archivo, etapa=etapa)}}} {tiempos['pared_s']}")
+            agregar("qr_etapa_cpu_segundos", "gauge",
+                    f"qr_etapa_cpu_segundos{{{etiquetas(archivo=archivo, etapa=etapa)}}} {tiempos['cpu_s']}")
+        for contador, valor in metricas['contadores'].items():
+            nombre = f"qr_{contador}"
+            agregar(nombre, "gauge", f"{nombre}{{{etiquetas(archivo=archivo)}}} {valor}")
+        for histograma, datos in metricas['histogramas'].items():
+            nombre = f"qr_{histograma}_segundos"
+            acumulado = 0
+            for limite, cuenta in zip(list(datos['limites']) + ['+Inf'], datos['cubetas']):
+                acumulado += cuenta
+                agregar(nombre, "histogram",
+                        f"{nombre}_bucket{{{etiquetas(archivo=archivo, le=limite)}}} {acumulado}")
+            agregar(nombre, "histogram", f"{nombre}_sum{{{etiquetas(archivo=archivo)}}} {datos['suma']}")
+            agregar(nombre, "histogram", f"{nombre}_count{{{etiquetas(archivo=archivo)}}} {datos['cuenta']}")
+
+    lineas = []
+    for nombre, (tipo, muestras) in familias.items():
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        lineas.extend(muestras)
+    return "\n".join(lineas) + "\n"
+
+class ReportadorProgreso:
+    """
+    Línea de progreso en consola limitada en el tiempo: se reescribe como mucho
+    `frecuencia` veces por segundo, y siempre al llegar al total.
+    """
+
+    def __init__(self, plantilla, frecuencia=FRECUENCIA_PROGRESO_HZ):
+        """
+        Args:
+            plantilla (str): Texto con campos {completadas}, {total}, {porcentaje}
+                y los valores adicionales que se pasen al actualizar
+            frecuencia (float): Actualizaciones por segundo
+        """
+        self.plantilla = plantilla
+        self.intervalo = 1.0 / frecuencia
+        self.ultima = None
+
+    def __call__(self, completadas, total, **valores):
+        ahora = time.monotonic()
+        if completadas < total and self.ultima is not None and ahora - self.ultima < self.intervalo:
+            return
+        self.ultima = ahora
+        porcentaje = completadas / max(total, 1) * 100
+        # sys.stdout se consulta en cada escritura: respeta redirecciones posteriores
+        sys.stdout.write("\r" + self.plantilla.format(completadas=completadas, total=total,
+                                                      porcentaje=porcentaje, **valores))
+        sys.stdout.flush()
+
+def sufijo_hash_nombre(texto, longitud=LONGITUD_SUFIJO_HASH):
+    """
+    Sufijo determinista para desambiguar nombres de archivo (prefijo del SHA-256).
+
+    Args:
+        texto (str): ID original
+        longitud (int): Caracteres hexadecimales
+
+    Returns:
+        str: Sufijo hexadecimal
+    """
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:longitud]
+
+# Caracteres no permitidos en nombres de archivo; el salto de línea se conserva
+# porque separa los IDs en la limpieza por columna
+_PATRON_NO_PERMITIDO_COLUMNA = re.compile(r'[^a-zA-Z0-9_\-\n]')
+
+def _limpiar_columna(nombres):
+    """
+    Limpia los nombres de toda la columna: espacios a guiones bajos, solo
+    caracteres alfanuméricos, '_' y '-', y minúsculas (los IDs hexadecimales se
+    conservan). Se hace una sola vez sobre el texto unido, no fila a fila. No
+    trunca ni sustituye los nombres vacíos ('nan' y 'none' quedan vacíos).
+    """
+    recortados = [str(nombre).strip() for nombre in nombres]
+    limpios = _PATRON_NO_PERMITIDO_COLUMNA.sub('', "\n".join(recortados).replace(' ', '_')).lower().split("\n")
+    if len(limpios) != len(recortados):
+        # Algún nombre tiene saltos de línea internos: limpieza fila a fila
+        limpios = [re.sub(r'[^a-zA-Z0-9_\-]', '', nombre.replace(' ', '_')).lower() for nombre in recortados]
+    return ['' if original.lower() in ('nan', 'none') else limpio
+            for original, limpio in zip(recortados, limpios)]
+
+def asignar_nombres_archivo(ids):
+    """
+    Asigna a cada ID distinto un nombre de archivo único. Se usa el nombre limpio
+    (ver _limpiar_columna()) salvo que quede vacío, supere la longitud
+    máxima, sea un nombre reservado de Windows o ya lo tenga otro ID anterior
+    (también si solo difieren en mayúsculas): entonces se añade un sufijo hash
+    del ID, así dos IDs distintos nunca se sobrescriben la imagen.
+
+    Args:
+        ids (list): IDs en orden de fila (puede haber repetidos)
+
+    Returns:
+        dict: ID -> nombre de archivo sin extensión
+    """
+    unicos = list(dict.fromkeys(ids))
+    nombres = {}
+    ocupados = set()
+    conflictivos = []
+    for id_unico, limpio in zip(unicos, _limpiar_columna(unicos)):
+        if limpio and len(limpio) <= LONGITUD_MAXIMA_NOMBRE and limpio not in ocupados \
+                and limpio not in NOMBRES_RESERVADOS:
+            nombres[id_unico] = limpio
+            ocupados.add(limpio)
+        else:
+            conflictivos.append((id_unico, limpio))
+
+    # Segunda pasada: los nombres con sufijo no pueden quitar el suyo a un ID posterior
+    for id_unico, limpio in conflictivos:
+        base = limpio[:LONGITUD_MAXIMA_NOMBRE - LONGITUD_SUFIJO_HASH - 1] or 'qr'
+        longitud = LONGITUD_SUFIJO_HASH
+        nombre = f"{base}_{sufijo_hash_nombre(id_unico, longitud)}"
+        while nombre in ocupados and longitud < 64:
+            longitud += LONGITUD_SUFIJO_HASH
+            nombre = f"{base}_{sufijo_hash_nombre(id_unico, longitud)}"
+        nombres[id_unico] = nombre
+        ocupados.add(nombre)
+    return nombres
+
+def calcular_dimensiones_optimas(registros_totales):
     """
-    Convierte un nombre a un formato válido para nombre de archivo.
-    Maneja IDs complejos, hexadecimales y caracteres especiales.
+    Calcula las dimensiones óptimas de celda e imagen basado en el número de registros.
+    Para archivos grandes, usa celdas más pequeñas para mejor rendimiento.
+    Para archivos pequeños, usa celdas más grandes para mejor visualización.
     
     Args:
-        nombre (str): Nombre original que puede contener caracteres especiales
+        registros_totales (int): Número total de registros a procesar
         
     Returns:
-        str: Nombre limpio válido para archivo
+        dict: Diccionario con dimensiones optimizadas
     """
-    # Convertir a string y limpiar espacios
-    nombre = str(nombre).strip()
-    
-    # Si está vacío o es 'nan', generar nombre alternativo
-    if not nombre or nombre.lower() in ['nan', 'none', '']:
-        return f"qr_{int(time.time())}"
-    
-    # Reemplazar espacios por guiones bajos
-    nombre = nombre.replace(' ', '_')
+    if registros_totales > 1000:
+        # Para archivos muy grandes: celdas más pequeñas para mejor rendimiento
+        return {
+            'altura_celda': 75,
+            'ancho_celda': 12,
+            'imagen_width': 95,
+            'imagen_height': 95,
+            'offset_horizontal': 9525 * 3,  # 3 píxeles de margen
+            'offset_vertical': 9525 * 3,
+            'descripcion': 'Optimizado para archivos grandes (>1000 registros)'
+        }
+    elif registros_totales > 500:
+        # Para archivos medianos: tamaño intermedio
+        return {
+            'altura_celda': 80,
+            'ancho_celda': 13,
+            'imagen_width': 100,
+            'imagen_height': 100,
+            'offset_horizontal': 9525 * 4,  # 4 píxeles de margen
+            'offset_vertical': 9525 * 4,
+            'descripcion': 'Equilibrio para archivos medianos (500-1000 registros)'
+        }
+    else:
+        # Para archivos pequeños: tamaño completo para mejor visualización
+        return {
+            'altura_celda': 90,
+            'ancho_celda': 15,
+            'imagen_width': 110,
+            'imagen_height': 110,
+            'offset_horizontal': 9525 * 5,  # 5 píxeles de margen
+            'offset_vertical': 9525 * 5,
+            'descripcion': 'Máxima calidad para archivos pequeños (<500 registros)'
+        }
+
+def renderizar_matriz_qr(matriz, box_size=QR_BOX_SIZE):
+    """
+    Rasteriza la matriz de módulos de un QR a una imagen en escala de grises
+    usando operaciones vectorizadas de NumPy (sin dibujar módulo por módulo).
+
+    Args:
+        matriz (list): Matriz de booleanos de qr.get_matrix() (ya incluye el borde)
+        box_size (int): Píxeles por módulo
+
+    Returns:
+        Image: Imagen PIL en modo 'L' (0 = módulo oscuro, 255 = fondo)
+    """
+    import numpy as np
+    from PIL import Image
+
+    modulos = np.asarray(matriz, dtype=bool)
+    # Módulo oscuro -> 0 (negro), módulo claro -> 255 (blanco)
+    pixeles = np.where(modulos, np.uint8(0), np.uint8(255))
+    pixeles = pixeles.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    return Image.fromarray(np.ascontiguousarray(pixeles))
+
+# Partes fijas del PNG de 1 bit por (módulos por lado, box_size, border):
+# cabecera, cierre y zona de silencio ya empaquetadas
+_PLANTILLAS_PNG = {}
+
+def _chunk_png(tipo, datos):
+    """
+    Serializa un chunk PNG (longitud, tipo, datos y CRC).
+    """
+    return struct.pack('>I', len(datos)) + tipo + datos + struct.pack('>I', zlib.crc32(tipo + datos))
+
+def _plantilla_png(modulos_lado, box_size, border):
+    """
+    Devuelve (y memoriza) las regiones estáticas del PNG de un QR de este tamaño:
+    la firma con el IHDR, el IEND, las líneas de la zona de silencio superior e
+    inferior y el margen izquierdo/derecho de cada línea de datos.
+
+    Args:
+        modulos_lado (int): Módulos por lado sin borde (depende de la versión)
+        box_size (int): Píxeles por módulo
+        border (int): Módulos de zona de silencio
+
+    Returns:
+        dict: Piezas precalculadas de la imagen
+    """
+    clave = (modulos_lado, box_size, border)
+    plantilla = _PLANTILLAS_PNG.get(clave)
+    if plantilla is None:
+        lado = (modulos_lado + 2 * border) * box_size
+        # Escala de grises de 1 bit: 1 = blanco, 0 = negro
+        ihdr = struct.pack('>IIBBBBB', lado, lado, 1, 0, 0, 0, 0)
+        relleno = -lado % 8
+        linea_blanca = b'\x00' + (((1 << lado) - 1) << relleno).to_bytes((lado + relleno) // 8, 'big')
+        plantilla = {
+            'cabecera': b'\x89PNG\r\n\x1a\n' + _chunk_png(b'IHDR', ihdr),
+            'fin': _chunk_png(b'IEND', b''),
+            'zona_silencio': linea_blanca * (border * box_size),
+            'margen': '1' * (border * box_size),
+            'relleno': '0' * relleno,
+            'bytes_linea': (lado + relleno) // 8,
+        }
+        _PLANTILLAS_PNG[clave] = plantilla
+    return plantilla
+
+def codificar_png_1bit(modulos, box_size=QR_BOX_SIZE, border=QR_BORDER):
+    """
+    Emite directamente un PNG de 1 bit a partir de la matriz de módulos, sin
+    pasar por una imagen PIL ni por NumPy. Las regiones fijas (cabecera y zona de
+    silencio) salen de la plantilla de la versión; solo se empaquetan las filas de
+    datos, una vez por fila de módulos (la compresión domina el tiempo).
+
+    Args:
+        modulos (list): Matriz de booleanos sin borde (qr.modules)
+        box_size (int): Píxeles por módulo
+        border (int): Módulos de zona de silencio
+
+    Returns:
+        bytes: Archivo PNG completo
+    """
+    plantilla = _plantilla_png(len(modulos), box_size, border)
+    margen = plantilla['margen']
+    relleno = plantilla['relleno']
+    bytes_linea = plantilla['bytes_linea']
+    oscuro, claro = '0' * box_size, '1' * box_size
+
+    # Cada fila de módulos -> una línea de píxeles (blanco = 1) con sus márgenes,
+    # empaquetada como entero; byte de filtro 0 (ninguno) delante de cada línea
+    # y cada fila se repite box_size veces
+    lineas = [(b'\x00' + int(margen + ''.join([oscuro if modulo else claro for modulo in fila])
+                             + margen + relleno, 2).to_bytes(bytes_linea, 'big')) * box_size
+              for fila in modulos]
+    datos = plantilla['zona_silencio'] + b''.join(lineas) + plantilla['zona_silencio']
+    return (plantilla['cabecera'] + _chunk_png(b'IDAT', zlib.compress(datos, NIVEL_ZLIB_PNG))
+            + plantilla['fin'])
+
+# Versión y máscara por forma del contenido para el modo de máscara 'memo'.
+# Clave: ((modo, longitud) de cada segmento, corrección de errores). LRU acotada:
+# un proceso de larga vida (el servicio HTTP) ve formas arbitrarias
+CAPACIDAD_FORMAS_QR = 1024
+_FORMAS_QR = OrderedDict()
+_CERROJO_FORMAS_QR = threading.Lock()
+
+def construir_qr_memoizado(qr):
+    """
+    Equivalente a qr.make(fit=True) que reutiliza la versión y la máscara
+    calculadas una vez por forma (mismos modos y longitudes de segmento) sobre un
+    contenido canónico de esa forma. La versión es exactamente la que daría la
+    búsqueda de ajuste; la máscara va codificada en el propio QR, así que el
+    código se lee igual aunque no sea la de menor penalización para este
+    contenido. Al no depender de qué ID llega primero, la imagen de cada ID es
+    la misma en cualquier proceso del pool y en cualquier orden.
+
+    Args:
+        qr (QRCode): Objeto QR con los datos ya añadidos (add_data)
+    """
+    clave = (tuple((segmento.mode, len(segmento)) for segmento in qr.data_list), qr.error_correction)
+    with _CERROJO_FORMAS_QR:
+        forma = _FORMAS_QR.get(clave)
+        if forma is not None:
+            _FORMAS_QR.move_to_end(clave)
+    if forma is None:
+        import qrcode
+        from qrcode.util import QRData
+
+        # Contenido canónico de la misma forma: '1' se representa en cualquier modo
+        # y, a diferencia de '0', no produce bloques de datos que empiecen por 0x00
+        sonda = qrcode.QRCode(version=qr.version, error_correction=qr.error_correction)
+        for modo, longitud in clave[0]:
+            sonda.add_data(QRData(b'1' * longitud, mode=modo))
+        forma = (sonda.best_fit(start=sonda.version), sonda.best_mask_pattern())
+        with _CERROJO_FORMAS_QR:
+            _FORMAS_QR[clave] = forma
+            while len(_FORMAS_QR) > CAPACIDAD_FORMAS_QR:
+                _FORMAS_QR.popitem(last=False)
+    qr.version, qr.mask_pattern = forma
+    qr.make(fit=False)
+
+def generar_qr_optimizado(texto, nombre_archivo=None, calidad=85, return_image=False,
+                          motor=MOTOR_RENDER_DEFECTO, return_bytes=False,
+                          mascara=MASCARA_QR_DEFECTO, formato='jpeg', imagen_excel=False):
+    """
+    Genera un código QR OPTIMIZADO para APIs con formato JPEG y sin metadatos.
+    Versión corregida para evitar el error "cannot determine region size".
     
-    # Permitir caracteres alfanuméricos, guiones bajos y guiones
-    # Esto preserva IDs hexadecimales como 45b1c1aaea524769950s724e41e153dc
-    nombre = re.sub(r'[^a-zA-Z0-9_\-]', '', nombre)
+    Args:
+        texto (str): Contenido del código QR (ID_Unico)
+        nombre_archivo (str, optional): Nombre del archivo sin extensión
+        calidad (int): Calidad JPEG (1-100, recomendado 85)
+        return_image (bool): Si es True, devuelve la imagen en memoria
+        motor (str): 'rapido' rasteriza la matriz con NumPy y guarda JPEG de un canal;
+            'pil' usa la fábrica de imágenes de qrcode y convierte a RGB
+        return_bytes (bool): Si es True, devuelve el JPEG codificado en memoria
+        mascara (str): 'optima' busca versión y máscara para cada código; 'memo' las
+            reutiliza entre IDs con la misma forma (ver construir_qr_memoizado)
+        formato (str): Codificador registrado en CODIFICADORES ('jpeg', 'jpeg_base', 'png1',
+            'png_paleta', 'webp', 'svg'), 'auto' (el más pequeño bajo PRESUPUESTO_BYTES_AUTO)
+            o 'auto_excel' (igual, pero solo entre PNG y JPEG)
+        imagen_excel (bool): Con return_bytes, devuelve también la imagen que se incrusta
+            en Excel: None si la elegida ya se muestra en Excel (JPEG/PNG) o un PNG de
+            1 bit codificado a partir del mismo QR
     
-    # Convertir a minúsculas
-    nombre = nombre.lower()
+    Returns:
+        str, Image o bytes: Ruta del archivo guardado, imagen o imagen codificada en memoria
+            (tupla (bytes, bytes o None) con imagen_excel)
+    """
+    try:
+        import qrcode
+
+        # Crear objeto QR con configuración OPTIMIZADA para APIs
+        qr = qrcode.QRCode(
+            version=1,  # Auto ajuste del tamaño
+            error_correction=QR_ERROR_CORRECTION,  # Mínima corrección = menor tamaño
+            box_size=QR_BOX_SIZE,  # Reducido para menor tamaño
+            border=QR_BORDER,      # Reducido para menos píxeles desperdiciados
+        )
+        
+        # Agregar datos al código QR
+        qr.add_data(texto)
+        if mascara == 'memo':
+            construir_qr_memoizado(qr)
+        else:
+            qr.make(fit=True)
+        
+        # Si necesitamos devolver la imagen en memoria
+        if return_image:
+            return _imagen_qr(qr, motor)
+        
+        # Imagen codificada en memoria con el codificador elegido
+        if formato in FORMATOS_AUTO:
+            datos = codificar_auto(qr, calidad, motor, candidatos=FORMATOS_AUTO[formato])
+        else:
+            datos = CODIFICADORES[formato][1](qr, calidad, motor)
+        if return_bytes:
+            if imagen_excel:
+                # WebP/SVG no se muestran en todas las versiones de Excel
+                if extension_de_datos(datos, formato) in EXTENSIONES_EXCEL:
+                    return datos, None
+                return datos, CODIFICADORES['png1'][1](qr, calidad, motor)
+            return datos
+        
+        # Si necesitamos guardar en archivo
+        if nombre_archivo:
+            # Asegurar la extensión del formato realmente usado
+            base, extension = os.path.splitext(nombre_archivo)
+            if extension.lower() in EXTENSIONES_CONOCIDAS:
+                nombre_archivo = base
+            nombre_archivo += extension_de_datos(datos, formato)
+            with open(nombre_archivo, 'wb') as archivo:
+                archivo.write(datos)
+            return nombre_archivo
+        
+        return None
+        
+    except Exception as e:
+        # A stderr: en los procesos del pool stdout no se redirige y el modo por
+        # lotes reserva stdout para el resumen JSON
+        print(f"Error al generar QR optimizado: {str(e)}", file=sys.stderr)
+        return None
+
+def _renderizar_con_pil(qr):
+    """
+    Ruta original de renderizado: fábrica de imágenes PIL de qrcode y conversión a RGB.
+
+    Args:
+        qr (QRCode): Objeto QR ya construido con make()
+
+    Returns:
+        Image: Imagen PIL en modo 'RGB'
+    """
+    from PIL import Image
+
+    # Crear imagen QR inicial
+    img_qr = qr.make_image(fill_color="black", back_color="white")
     
-    # Asegurar que no esté vacío después de la limpieza
-    if not nombre:
-        return f"qr_{int(time.time())}"
+    # SOLUCIÓN: Convertir directamente a RGB evitando el error de paste()
+    # Crear nueva imagen RGB del mismo tamaño
+    img_rgb = Image.new('RGB', img_qr.size, 'white')
     
-    # Limitar longitud para evitar problemas de sistema de archivos
-    if len(nombre) > 100:
-        nombre = nombre[:100]
+    # MÉTODO SEGURO: Convertir píxel por píxel si es necesario
+    if img_qr.mode == '1':  # Imagen en modo 1-bit (blanco y negro)
+        # Convertir a L (grayscale) primero, luego a RGB
+        img_gray = img_qr.convert('L')
+        img_rgb = img_gray.convert('RGB')
+    elif img_qr.mode == 'L':  # Ya en grayscale
+        img_rgb = img_qr.convert('RGB')
+    elif img_qr.mode == 'RGB':  # Ya en RGB
+        img_rgb = img_qr
+    else:
+        # Para cualquier otro modo, usar conversión directa
+        img_rgb = img_qr.convert('RGB')
     
-    return nombre
+    return img_rgb
 
-def calcular_dimensiones_optimas(registros_totales):
+def _imagen_qr(qr, motor=MOTOR_RENDER_DEFECTO):
+    """
+    Rasteriza un QR ya construido con el motor indicado.
+
+    Args:
+        qr (QRCode): Objeto QR ya construido con make()
+        motor (str): 'rapido' (escala de grises con NumPy) o 'pil'
+
+    Returns:
+        Image: Imagen PIL
+    """
+    if motor == 'rapido':
+        # Escala de grises directa: el JPEG de un canal decodifica a los mismos módulos
+        return renderizar_matriz_qr(qr.get_matrix(), QR_BOX_SIZE)
+    return _renderizar_con_pil(qr)
+
+def _guardar_en_memoria(imagen, **opciones):
+    """
+    Codifica una imagen PIL en memoria con las opciones de Image.save().
+    """
+    buffer = io.BytesIO()
+    imagen.save(buffer, **opciones)
+    return buffer.getvalue()
+
+def _codificar_jpeg(qr, calidad, motor):
+    """JPEG progresivo con tablas Huffman optimizadas (el más compacto de los JPEG)."""
+    return _guardar_en_memoria(_imagen_qr(qr, motor), format='JPEG', quality=calidad,
+                               optimize=True, progressive=True, exif=b'')
+
+def _codificar_jpeg_base(qr, calidad, motor):
+    """JPEG baseline con tablas estándar: más rápido de codificar que el progresivo."""
+    return _guardar_en_memoria(_imagen_qr(qr, motor), format='JPEG', quality=calidad, exif=b'')
+
+def _codificar_png1(qr, calidad, motor):
+    """PNG de 1 bit emitido directamente desde la matriz (sin pérdida)."""
+    return codificar_png_1bit(qr.modules, QR_BOX_SIZE, QR_BORDER)
+
+def _codificar_png_paleta(qr, calidad, motor):
+    """PNG con paleta de 2 colores generado por PIL (sin pérdida)."""
+    import numpy as np
+    from PIL import Image
+
+    # Índice 0 = negro (módulo oscuro), 1 = blanco
+    indices = (~np.asarray(qr.get_matrix(), dtype=bool)).astype(np.uint8)
+    indices = indices.repeat(QR_BOX_SIZE, axis=0).repeat(QR_BOX_SIZE, axis=1)
+    imagen = Image.frombytes('P', (indices.shape[1], indices.shape[0]), indices.tobytes())
+    imagen.putpalette([0, 0, 0, 255, 255, 255])
+    return _guardar_en_memoria(imagen, format='PNG', optimize=True, bits=1)
+
+def _codificar_webp(qr, calidad, motor):
+    """WebP sin pérdida."""
+    return _guardar_en_memoria(renderizar_matriz_qr(qr.get_matrix(), QR_BOX_SIZE),
+                               format='WEBP', lossless=True, quality=100, method=4)
+
+def _codificar_svg(qr, calidad, motor):
+    """
+    SVG vectorial: un trazo por cada tramo horizontal de módulos oscuros,
+    en unidades de módulo y escalado al tamaño en píxeles del resto de formatos.
+    """
+    modulos = qr.get_matrix()
+    lado = len(modulos)
+    trazos = []
+    for y, fila in enumerate(modulos):
+        x = 0
+        while x < lado:
+            if fila[x]:
+                inicio = x
+                while x < lado and fila[x]:
+                    x += 1
+                trazos.append(f"M{inicio} {y}h{x - inicio}v1h-{x - inicio}z")
+            else:
+                x += 1
+    pixeles = lado * QR_BOX_SIZE
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixeles}" height="{pixeles}" '
+            f'viewBox="0 0 {lado} {lado}" shape-rendering="crispEdges">'
+            f'<rect width="{lado}" height="{lado}" fill="#fff"/>'
+            f'<path d="{"".join(trazos)}" fill="#000"/></svg>').encode('utf-8')
+
+# Registro de codificadores: nombre -> (extensión, función(qr, calidad, motor) -> bytes)
+CODIFICADORES = {
+    'jpeg': ('.jpg', _codificar_jpeg),
+    'jpeg_base': ('.jpg', _codificar_jpeg_base),
+    'png1': ('.png', _codificar_png1),
+    'png_paleta': ('.png', _codificar_png_paleta),
+    'webp': ('.webp', _codificar_webp),
+    'svg': ('.svg', _codificar_svg),
+}
+EXTENSIONES_CONOCIDAS = ('.jpg', '.jpeg', '.png', '.webp', '.svg')
+
+def registrar_codificador(nombre, extension, funcion):
+    """
+    Registra un codificador de imagen adicional para `formato`.
+
+    Args:
+        nombre (str): Nombre del formato
+        extension (str): Extensión de archivo (con punto)
+        funcion (callable): funcion(qr, calidad, motor) -> bytes; debe ser de nivel
+            de módulo para poder usarse desde los procesos del pool
+    """
+    CODIFICADORES[nombre] = (extension, funcion)
+
+def formatos_salida():
+    """
+    Formatos aceptados por `formato`: los codificadores registrados y 'auto'.
+    """
+    return tuple(CODIFICADORES) + ('auto',)
+
+# Nombres para los mensajes; los formatos registrados después se muestran por su nombre
+NOMBRES_FORMATO = {
+    'jpeg': 'JPEG progresivo',
+    'jpeg_base': 'JPEG baseline',
+    'png1': 'PNG de 1 bit',
+    'png_paleta': 'PNG con paleta',
+    'webp': 'WebP sin pérdida',
+    'svg': 'SVG vectorial',
+    'auto': 'auto (el más pequeño bajo el presupuesto)',
+    'auto_excel': 'auto para Excel (el PNG o JPEG más pequeño bajo el presupuesto)',
+}
+
+def describir_formato(formato, extensiones=None):
+    """
+    Descripción legible del formato usado en una ejecución.
+
+    Args:
+        formato (str): Nombre del formato
+        extensiones (dict, optional): {extensión: imágenes} realmente producidas ('auto')
+
+    Returns:
+        str: Descripción para los mensajes de la consola
+    """
+    descripcion = NOMBRES_FORMATO.get(formato, formato.upper())
+    if formato in FORMATOS_AUTO and extensiones:
+        descripcion += ": " + ", ".join(f"{extension.lstrip('.').upper()} {cuenta}"
+                                        for extension, cuenta in sorted(extensiones.items()))
+    return descripcion
+
+def extension_de_datos(datos, formato=None):
+    """
+    Extensión de archivo de una imagen codificada: la registrada para su formato
+    en CODIFICADORES o, si no se conoce (p. ej. 'auto'), la que indica su firma.
+
+    Args:
+        datos (bytes): Imagen codificada
+        formato (str, optional): Formato con el que se codificó
+
+    Returns:
+        str: Extensión del formato, o '.png', '.jpg', '.webp' o '.svg' según la firma
+    """
+    if formato in CODIFICADORES:
+        return CODIFICADORES[formato][0]
+    if datos.startswith(b'\x89PNG'):
+        return '.png'
+    if datos.startswith(b'\xff\xd8'):
+        return '.jpg'
+    if datos[:4] == b'RIFF' and datos[8:12] == b'WEBP':
+        return '.webp'
+    return '.svg'
+
+def extensiones_formato(formato):
+    """
+    Extensiones que puede producir un formato ('auto' puede dar varias).
+
+    Args:
+        formato (str): Nombre del formato
+
+    Returns:
+        list: Extensiones posibles, sin repetir
+    """
+    nombres = FORMATOS_AUTO.get(formato, (formato,))
+    return list(dict.fromkeys(CODIFICADORES[nombre][0] for nombre in nombres))
+
+def codificar_auto(qr, calidad, motor, presupuesto=PRESUPUESTO_BYTES_AUTO, candidatos=CANDIDATOS_AUTO):
+    """
+    Codifica el QR con cada candidato y se queda con el resultado más pequeño que
+    no supere el presupuesto (si ninguno cabe, el más pequeño de todos).
+
+    Args:
+        qr (QRCode): Objeto QR ya construido con make()
+        calidad (int): Calidad para los formatos con pérdida
+        motor (str): Motor de renderizado para los formatos rasterizados por PIL
+        presupuesto (int): Tamaño máximo deseado en bytes
+        candidatos (tuple): Formatos a probar
+
+    Returns:
+        bytes: Imagen codificada elegida
+    """
+    codificados = [CODIFICADORES[nombre][1](qr, calidad, motor) for nombre in candidatos]
+    dentro = [datos for datos in codificados if len(datos) <= presupuesto]
+    return min(dentro or codificados, key=len)
+
+def _generar_lote_qr(tareas, calidad, en_memoria=False, medir=False, mascara=MASCARA_QR_DEFECTO,
+                     formato='jpeg', imagen_excel=False):
+    """
+    Genera un lote de códigos QR dentro de un proceso de trabajo.
+    Debe ser una función de nivel de módulo para poder enviarse al pool.
+
+    Args:
+        tareas (list): Lista de tuplas (texto, ruta_archivo_sin_extension)
+        calidad (int): Calidad JPEG (1-100)
+        en_memoria (bool): Devolver los bytes JPEG en lugar de guardarlos en disco
+        medir (bool): Añadir a cada resultado los segundos de pared y de CPU empleados
+        mascara (str): Modo de selección de máscara (ver MODOS_MASCARA)
+        formato (str): Formato de imagen (ver formatos_salida())
+        imagen_excel (bool): En memoria, añadir a cada resultado el PNG de 1 bit que se
+            incrusta en Excel cuando el formato elegido no se muestra en él (o None)
+
+    Returns:
+        list: Lista de tuplas (ruta_generada o bytes JPEG o None, tamaño en bytes),
+            con la imagen para Excel a continuación si imagen_excel=True y los
+            segundos de pared y de CPU al final si medir=True
+    """
+    resultados = []
+    for texto, ruta_archivo in tareas:
+        inicio_pared = time.perf_counter()
+        inicio_cpu = time.process_time()
+        if en_memoria:
+            resultado = generar_qr_optimizado(texto, calidad=calidad, return_bytes=True,
+                                              mascara=mascara, formato=formato,
+                                              imagen_excel=imagen_excel)
+            if imagen_excel:
+                resultado, excel = resultado or (None, None)
+            tamano = len(resultado) if resultado else 0
+        else:
+            resultado = generar_qr_optimizado(texto, ruta_archivo, calidad=calidad,
+                                              mascara=mascara, formato=formato)
+            tamano = os.path.getsize(resultado) if resultado else 0
+        elemento = (resultado, tamano, excel) if imagen_excel and en_memoria else (resultado, tamano)
+        if medir:
+            elemento += (time.perf_counter() - inicio_pared, time.process_time() - inicio_cpu)
+        resultados.append(elemento)
+    return resultados
+
+def _registrar_latencias(lote_resultados, metricas):
+    """
+    Pasa las mediciones por fila de un lote a las métricas y devuelve los
+    resultados sin ellas (resultado, tamaño[, imagen para Excel]).
+    """
+    if metricas is None:
+        return lote_resultados
+    for *_, pared, cpu in lote_resultados:
+        metricas.observar('latencia_qr', pared)
+        metricas.contar('cpu_generacion_segundos', cpu)
+    return [resultado[:-2] for resultado in lote_resultados]
+
+def clave_cache_qr(texto, calidad=85, formato='jpeg', motor=MOTOR_RENDER_DEFECTO,
+                   mascara=MASCARA_QR_DEFECTO):
+    """
+    Calcula la clave de caché de un QR a partir de todo lo que determina su imagen.
+
+    Args:
+        texto (str): Contenido del código QR
+        calidad (int): Calidad JPEG usada
+        formato (str): Formato de la imagen
+        motor (str): Motor de renderizado usado
+        mascara (str): Modo de selección de máscara
+
+    Returns:
+        str: Hash SHA-256 hexadecimal
+    """
+    componentes = [texto, QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER, calidad, formato, motor]
+    if mascara != 'optima':
+        # Las entradas ya existentes (máscara óptima) conservan su clave
+        componentes.append(mascara)
+    return hashlib.sha256("\x1f".join(str(c) for c in componentes).encode('utf-8')).hexdigest()
+
+def ruta_cache_qr(directorio_cache, clave, extension='.jpg'):
+    """
+    Devuelve la ruta de una entrada de la caché (repartida en subcarpetas por prefijo).
+
+    Args:
+        directorio_cache (str): Directorio raíz de la caché
+        clave (str): Clave calculada con clave_cache_qr()
+        extension (str): Extensión del archivo
+
+    Returns:
+        str: Ruta del archivo en caché
+    """
+    return os.path.join(directorio_cache, clave[:2], clave + extension)
+
+def _ruta_temporal(ruta):
+    """Nombre temporal único (por proceso e hilo) junto a ruta, en el mismo directorio."""
+    directorio, nombre = os.path.split(ruta)
+    return os.path.join(directorio, f".{nombre}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+def _publicar(escribir, destino):
+    """
+    Crea destino de forma atómica: escribir(ruta_temporal) genera el archivo
+    con un nombre temporal del mismo directorio y os.replace() lo publica. Una
+    caída o un Ctrl-C a mitad de la escritura nunca deja un archivo truncado
+    con el nombre final.
+    """
+    temporal = _ruta_temporal(destino)
+    try:
+        escribir(temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporal)
+        raise
+
+def _escribir_atomico(destino, datos):
+    """Escribe datos en destino de forma atómica (ver _publicar())."""
+    def escribir(temporal):
+        with open(temporal, 'wb') as archivo:
+            archivo.write(datos)
+    _publicar(escribir, destino)
+
+def _enlazar_o_copiar(origen, destino):
+    """
+    Crea destino como enlace duro a origen; si el sistema de archivos no lo
+    permite (otra unidad, FAT, recurso de red), copia el archivo. En ambos casos
+    se publica de forma atómica, de modo que nunca se reescribe en su sitio un
+    archivo que otra carpeta o la caché tengan enlazado.
+    """
+    def escribir(temporal):
+        try:
+            os.link(origen, temporal)
+        except FileExistsError:
+            raise
+        except OSError:
+            shutil.copyfile(origen, temporal)
+    _publicar(escribir, destino)
+
+def cache_leer(directorio_cache, clave, extension='.jpg'):
+    """
+    Lee una entrada de la caché en memoria (modo sin disco intermedio).
+    Actualiza la fecha de modificación de la entrada para la política LRU.
+
+    Args:
+        directorio_cache (str): Directorio raíz de la caché
+        clave (str): Clave del QR
+        extension (str): Extensión del archivo
+
+    Returns:
+        bytes o None: Contenido de la imagen, o None si no está en caché
+    """
+    ruta = ruta_cache_qr(directorio_cache, clave, extension)
+    try:
+        with open(ruta, 'rb') as archivo:
+            datos = archivo.read()
+        os.utime(ruta)
+        return datos
+    except OSError:
+        return None
+
+def cache_guardar(directorio_cache, clave, ruta_generada):
+    """
+    Añade a la caché un QR recién generado.
+
+    Args:
+        directorio_cache (str): Directorio raíz de la caché
+        clave (str): Clave del QR
+        ruta_generada (str): Archivo generado (con extensión)
+    """
+    ruta = ruta_cache_qr(directorio_cache, clave, os.path.splitext(ruta_generada)[1])
+    if os.path.exists(ruta):
+        return
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        _enlazar_o_copiar(ruta_generada, ruta)
+    except OSError as e:
+        print(f"\n⚠️ No se pudo guardar en caché {ruta_generada}: {str(e)}")
+
+def podar_cache_qr(directorio_cache, limite_mb=LIMITE_CACHE_MB_DEFECTO):
+    """
+    Elimina las entradas usadas hace más tiempo (LRU) hasta que la caché
+    quede por debajo del límite de tamaño.
+
+    Args:
+        directorio_cache (str): Directorio raíz de la caché
+        limite_mb (float): Tamaño máximo de la caché en MB
+
+    Returns:
+        tuple: (int: archivos eliminados, int: bytes liberados)
+    """
+    if not os.path.isdir(directorio_cache):
+        return 0, 0
+
+    entradas = []
+    total = 0
+    for raiz, _, archivos in os.walk(directorio_cache):
+        for archivo in archivos:
+            ruta = os.path.join(raiz, archivo)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((estado.st_mtime, estado.st_size, ruta))
+            total += estado.st_size
+
+    limite = limite_mb * 1024 * 1024
+    eliminados = 0
+    liberados = 0
+    for _, tamano, ruta in sorted(entradas):
+        if total <= limite:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tamano
+        eliminados += 1
+        liberados += tamano
+    return eliminados, liberados
+
+def _guardar_salida_qr(datos, destino, directorio_cache=None, clave=None, extension='.jpg'):
+    """
+    Escribe en disco un QR generado en memoria (salida secundaria) y lo
+    registra en la caché. Se ejecuta en el hilo de escritura en segundo plano.
+
+    Args:
+        datos (bytes): Imagen codificada
+        destino (str, optional): Ruta del archivo en la carpeta de la ejecución
+        directorio_cache (str, optional): Directorio de la caché (None = sin caché)
+        clave (str, optional): Clave de caché del QR
+        extension (str): Extensión de la entrada de caché
+    """
+    if destino:
+        _escribir_atomico(destino, datos)
+        if directorio_cache:
+            cache_guardar(directorio_cache, clave, destino)
+        return
+    ruta = ruta_cache_qr(directorio_cache, clave, extension)
+    if os.path.exists(ruta):
+        return
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        _escribir_atomico(ruta, datos)
+    except OSError as e:
+        # Como en cache_guardar(): sin la entrada de caché la imagen sigue siendo válida
+        print(f"\n⚠️ No se pudo guardar en caché {ruta}: {str(e)}")
+
+def _escribir_lote_qr(elementos, directorio_cache=None):
+    """
+    Etapa de escritura: guarda en disco (carpeta de la ejecución y caché) los QR
+    de un lote ya codificado. Se ejecuta en el pool de hilos de escritura.
+
+    Args:
+        elementos (list): Tuplas (posicion, datos, destino, clave, extension)
+        directorio_cache (str, optional): Directorio de la caché (None = sin caché)
+
+    Returns:
+        list: Tuplas (posicion, error) de las escrituras que fallaron
+    """
+    fallidas = []
+    for posicion, datos, destino, clave, extension in elementos:
+        try:
+            _guardar_salida_qr(datos, destino, directorio_cache, clave, extension)
+        except OSError as e:
+            fallidas.append((posicion, e))
+    return fallidas
+
+def _copiar_desde_cache(posicion, ruta_cache, destino):
+    """
+    Etapa de escritura: enlaza o copia un acierto de caché a la carpeta de la
+    ejecución y actualiza su fecha para la política LRU.
+
+    Returns:
+        list: [(posicion, error)] si falló, o lista vacía
+    """
+    try:
+        os.utime(ruta_cache)
+        _enlazar_o_copiar(ruta_cache, destino)
+    except OSError as e:
+        return [(posicion, e)]
+    return []
+
+def generar_imagenes_qr(tareas, calidad=85, workers=None, tamano_lote=TAMANO_LOTE_DEFECTO,
+                        usar_cache=True, directorio_cache=DIRECTORIO_CACHE_DEFECTO,
+                        en_memoria=False, guardar_archivos=True, progreso=None, metricas=None,
+                        mascara=MASCARA_QR_DEFECTO, formato='jpeg', profundidad_cola=None,
+                        hilos_escritura=HILOS_ESCRITURA_DEFECTO, al_completar=None, imagen_excel=False):
+    """
+    Etapa de generación como canalización productor/consumidor de tres etapas:
+
+    1. Lectura: recorre las tareas, resuelve las que ya están en la caché y
+       agrupa el resto en lotes.
+    2. Codificación: el pool de procesos codifica cada lote en memoria, con como
+       mucho `profundidad_cola` lotes en vuelo.
+    3. Escritura: un pool de hilos escribe la carpeta de la ejecución y la caché,
+       con como mucho `profundidad_cola` escrituras pendientes (lotes codificados
+       o copias de aciertos de caché).
+
+    Las colas acotadas aplican contrapresión: si el disco (p. ej. un recurso de
+    red SMB) va más lento que la codificación, se deja de enviar trabajo al pool
+    y la memoria queda limitada; mientras tanto la CPU sigue codificando. Los
+    lotes se consumen en orden de envío y los resultados se devuelven en el
+    orden de `tareas`.
+
+    Args:
+        tareas (list): Tuplas (texto, ruta_archivo_sin_extension), sin rutas repetidas
+        calidad (int): Calidad JPEG (1-100)
+        workers (int, optional): Procesos para generar QR
+        tamano_lote (int): Tareas enviadas a cada proceso por lote
+        usar_cache (bool): Consultar y alimentar la caché persistente
+        directorio_cache (str): Directorio de la caché
+        en_memoria (bool): Devolver bytes en lugar de rutas
+        guardar_archivos (bool): Escribir la carpeta de imágenes (en modo en memoria)
+        progreso (callable, optional): Función progreso(completadas, exitosas, total)
+        metricas (MetricasEjecucion, optional): Registra latencias y contadores de la etapa
+        mascara (str): Modo de selección de máscara (ver MODOS_MASCARA)
+        formato (str): Formato de imagen (ver formatos_salida())
+        profundidad_cola (int, optional): Lotes en vuelo en cada cola (por defecto, 2 por proceso)
+        hilos_escritura (int): Hilos de la etapa de escritura
+        al_completar (callable, optional): Función al_completar(posicion, ruta, tamaño)
+            invocada desde el hilo de escritura (una llamada cada vez) cuando la imagen
+            de una tarea ya está escrita en la carpeta de la ejecución
+        imagen_excel (bool): Añadir a cada resultado la imagen que se incrusta en Excel:
+            la propia si es JPEG/PNG o un PNG de 1 bit codificado por el mismo proceso
+            (y guardado en la caché) si el formato es WebP, SVG u otro registrado
+
+    Returns:
+        tuple: (list de (ruta o bytes o None, tamaño[, imagen para Excel]) en el orden de
+            tareas, int: aciertos de caché)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, int(workers))
+    tamano_lote = max(1, int(tamano_lote))
+    if profundidad_cola is None:
+        profundidad_cola = 2 * workers
+    profundidad_cola = max(1, int(profundidad_cola))
+
+    resultados = [None] * len(tareas)
+    claves = [None] * len(tareas)
+    # 'auto' puede haber guardado cualquiera de sus candidatos en la caché
+    extensiones = extensiones_formato(formato)
+    escribir_carpeta = guardar_archivos or not en_memoria
+    medir = metricas is not None
+    sin_imagen = (None, 0, None) if imagen_excel else (None, 0)
+    estado = {'aciertos': 0, 'completadas': 0, 'exitosas': 0, 'generados': 0}
+
+    escritor = ThreadPoolExecutor(max_workers=max(1, int(hilos_escritura)))
+    huecos_escritura = threading.BoundedSemaphore(profundidad_cola)
+    escrituras = []
+    cerrojo_completadas = threading.Lock()
+    # Con un solo proceso se codifica en un hilo: la escritura sigue solapándose
+    codificador = ProcessPoolExecutor(max_workers=workers) if workers > 1 else ThreadPoolExecutor(max_workers=1)
+    en_vuelo = deque()
+
+    def notificar():
+        if progreso:
+            progreso(estado['completadas'], estado['exitosas'], len(tareas))
+
+    def leer_lotes():
+        # Etapa de lectura: aciertos de caché resueltos aquí, el resto en lotes
+        lote = []
+        for posicion, (texto, ruta_archivo_qr) in enumerate(tareas):
+            if usar_cache:
+                claves[posicion] = clave_cache_qr(texto, calidad=calidad, formato=formato, mascara=mascara)
+                if resolver_desde_cache(posicion, ruta_archivo_qr):
+                    continue
+            lote.append(posicion)
+            if len(lote) == tamano_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    def programar_escritura(funcion, *argumentos, completadas=()):
+        # Contrapresión: si la escritura va por detrás, se espera antes de aceptar más
+        huecos_escritura.acquire()
+        escritura = escritor.submit(funcion, *argumentos)
+        if al_completar and completadas:
+            escritura.add_done_callback(lambda futuro: avisar_completadas(futuro, completadas))
+        escritura.add_done_callback(lambda _: huecos_escritura.release())
+        escrituras.append(escritura)
+
+    def avisar_completadas(escritura, completadas):
+        # Solo cuentan como completadas las imágenes que ya están en disco
+        if escritura.exception():
+            return
+        fallidas = {posicion for posicion, _ in escritura.result()}
+        with cerrojo_completadas:
+            for posicion, destino, tamano in completadas:
+                if posicion not in fallidas:
+                    al_completar(posicion, destino, tamano)
+
+    def clave_excel(posicion):
+        return clave_cache_qr(tareas[posicion][0], calidad=calidad, formato='png1', mascara=mascara)
+
+    def resolver_desde_cache(posicion, ruta_archivo_qr):
+        for extension in extensiones:
+            ruta_cache = ruta_cache_qr(directorio_cache, claves[posicion], extension)
+            destino = ruta_archivo_qr + extension
+            excel = ()
+            if imagen_excel:
+                excel = (None,)
+                if extension not in EXTENSIONES_EXCEL:
+                    # El PNG para Excel también tiene que estar en la caché; si no, se codifican ambos
+                    excel = (cache_leer(directorio_cache, clave_excel(posicion), '.png'),)
+                    if excel[0] is None:
+                        continue
+            if en_memoria:
+                datos = cache_leer(directorio_cache, claves[posicion], extension)
+                if datos is None:
+                    continue
+                resultados[posicion] = (datos, len(datos)) + tuple(imagen or datos for imagen in excel)
+                if guardar_archivos:
+                    programar_escritura(_copiar_desde_cache, posicion, ruta_cache, destino,
+                                        completadas=[(posicion, destino, len(datos))])
+            else:
+                try:
+                    tamano = os.path.getsize(ruta_cache)
+                except OSError:
+                    continue
+                # El enlace o la copia al destino (quizá un recurso de red) va a la etapa de escritura
+                resultados[posicion] = (destino, tamano) + tuple(imagen or destino for imagen in excel)
+                programar_escritura(_copiar_desde_cache, posicion, ruta_cache, destino,
+                                    completadas=[(posicion, destino, tamano)])
+            estado['aciertos'] += 1
+            estado['completadas'] += 1
+            estado['exitosas'] += 1
+            return True
+        return False
+
+    def consumir(futuro, posiciones):
+        # Resultado de un lote codificado -> etapa de escritura
+        elementos = []
+        completadas = []
+        for posicion, (datos, tamano, *excel) in zip(posiciones, _registrar_latencias(futuro.result(), metricas)):
+            estado['completadas'] += 1
+            if not datos:
+                resultados[posicion] = sin_imagen
+                continue
+            estado['exitosas'] += 1
+            estado['generados'] += 1
+            extension = extension_de_datos(datos, formato)
+            destino = tareas[posicion][1] + extension if escribir_carpeta else None
+            resultado = datos if en_memoria else destino
+            resultados[posicion] = (resultado, tamano) + tuple(imagen or resultado for imagen in excel)
+            if destino or usar_cache:
+                elementos.append((posicion, datos, destino, claves[posicion], extension))
+            if usar_cache and excel and excel[0]:
+                elementos.append((posicion, excel[0], None, clave_excel(posicion), '.png'))
+            if destino:
+                completadas.append((posicion, destino, tamano))
+        if elementos:
+            programar_escritura(_escribir_lote_qr, elementos, directorio_cache if usar_cache else None,
+                                completadas=completadas)
+        notificar()
+
+    try:
+        for posiciones in leer_lotes():
+            if len(en_vuelo) >= profundidad_cola:
+                consumir(*en_vuelo.popleft())
+            lote = [tareas[posicion] for posicion in posiciones]
+            en_vuelo.append((codificador.submit(_generar_lote_qr, lote, calidad, True, medir,
+                                                mascara, formato, imagen_excel), posiciones))
+        notificar()
+        while en_vuelo:
+            consumir(*en_vuelo.popleft())
+    finally:
+        codificador.shutdown(wait=True)
+        escritor.shutdown(wait=True)
+
+    for escritura in escrituras:
+        if escritura.exception():
+            print(f"\n⚠️ Error en la escritura en segundo plano: {escritura.exception()}")
+            continue
+        for posicion, error in escritura.result():
+            print(f"\n⚠️ No se pudo escribir {tareas[posicion][1]}: {error}")
+            if not en_memoria:
+                # Sin el archivo la fila no puede insertarse en el Excel
+                resultados[posicion] = sin_imagen
+    if metricas is not None:
+        metricas.contar('aciertos_cache', estado['aciertos'])
+        # Imágenes distintas codificadas (el resumen cuenta filas en 'qr_generados')
+        metricas.contar('imagenes_codificadas', estado['generados'])
+    return resultados, estado['aciertos']
+
+def obtener_tamano_archivo(ruta_archivo):
+    """
+    Obtiene el tamaño de un archivo en formato legible.
+    
+    Args:
+        ruta_archivo (str): Ruta al archivo
+        
+    Returns:
+        str: Tamaño formateado (bytes, KB, MB)
+    """
+    if not os.path.exists(ruta_archivo):
+        return "0 bytes"
+    
+    tamano = os.path.getsize(ruta_archivo)
+    if tamano < 1024:
+        return f"{tamano} bytes"
+    elif tamano < 1024 * 1024:
+        return f"{tamano/1024:.1f} KB"
+    else:
+        return f"{tamano/(1024*1024):.1f} MB"
+
+def crear_directorio_unico(ruta):
+    """
+    Crea un directorio nuevo; si ya existe (p. ej. dos ejecuciones en el mismo
+    segundo), añade un sufijo numérico.
+
+    Args:
+        ruta (str): Ruta deseada
+
+    Returns:
+        str: Ruta del directorio creado
+    """
+    candidata = ruta
+    numero = 1
+    while True:
+        try:
+            os.makedirs(candidata)
+            return candidata
+        except FileExistsError:
+            numero += 1
+            candidata = f"{ruta}_{numero}"
+
+def validar_archivo_excel(ruta_archivo):
+    """
+    Valida que el archivo Excel existe y es accesible.
+    
+    Args:
+        ruta_archivo (str): Ruta al archivo Excel
+        
+    Returns:
+        tuple: (bool: es_valido, str: mensaje)
+    """
+    if not os.path.exists(ruta_archivo):
+        return False, f"El archivo {ruta_archivo} no existe."
+    
+    if not ruta_archivo.lower().endswith(('.xlsx', '.xls')):
+        return False, "El archivo debe tener extensión .xlsx o .xls"
+    
+    try:
+        import openpyxl
+
+        # Abrir en modo solo lectura: verifica el archivo sin cargar las hojas
+        wb = openpyxl.load_workbook(ruta_archivo, read_only=True)
+        wb.close()
+        return True, "Archivo válido"
+    except Exception as e:
+        return False, f"Error al leer el archivo: {str(e)}"
+
+def localizar_columna_id(encabezados):
+    """
+    Identifica la columna ID_Unico: por nombre de encabezado o, si no existe,
+    la columna L (12ª columna).
+
+    Args:
+        encabezados (tuple): Valores de la primera fila de la hoja
+
+    Returns:
+        int o None: Índice de columna (1-indexed) o None si no se encuentra
+    """
+    encabezados = list(encabezados)
+    if 'ID_Unico' in encabezados:
+        return encabezados.index('ID_Unico') + 1
+    if len(encabezados) >= 12:  # Columna L es la 12ª columna
+        return 12
+    return None
+
+def indice_columna(letras):
+    """
+    Convierte una letra de columna de Excel en su índice.
+
+    Args:
+        letras (str): Letra(s) de columna ('A', 'M', 'AB'...)
+
+    Returns:
+        int o None: Índice (1-indexed) o None si no es una columna válida (A-XFD)
+    """
+    if not re.fullmatch(r'[A-Za-z]{1,3}', letras or ''):
+        return None
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + ord(letra) - ord('A') + 1
+    return indice if indice <= 16384 else None
+
+def letra_columna(indice):
+    """
+    Convierte un índice de columna (1-indexed) en su letra de Excel.
+
+    Args:
+        indice (int): Índice de columna
+
+    Returns:
+        str: Letra(s) de columna
+    """
+    letras = ''
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+def parsear_trabajo(texto):
+    """
+    Interpreta un trabajo con la forma HOJA:COLUMNA:SALIDA. HOJA vacía es la hoja
+    activa; COLUMNA es un encabezado o una letra (vacía = ID_Unico o L); SALIDA
+    es la letra de la columna de las imágenes (vacía = M).
+
+    Args:
+        texto (str): Especificación del trabajo (p. ej. 'Tickets:URL:N')
+
+    Returns:
+        TrabajoQR: Trabajo interpretado
+
+    Raises:
+        ValueError: Si el formato o la columna de salida no son válidos
+    """
+    # Los títulos de hoja no admiten ':' en Excel; los encabezados sí
+    hoja, separador, resto = texto.partition(':')
+    columna, separador_salida, salida = resto.rpartition(':')
+    if not separador or not separador_salida:
+        raise ValueError(f"Trabajo '{texto}' no válido: se espera HOJA:COLUMNA:SALIDA")
+    salida = salida.strip().upper() or TRABAJO_DEFECTO.salida
+    if indice_columna(salida) is None:
+        raise ValueError(f"Columna de salida '{salida}' no válida en el trabajo '{texto}'")
+    return TrabajoQR(hoja.strip() or None, columna.strip() or None, salida)
+
+def comprobar_salidas_trabajos(trabajos):
+    """
+    Comprueba que no haya dos trabajos que escriban los QR en la misma columna de
+    la misma hoja. Con las hojas ya resueltas (ver leer_columnas_trabajos()) también
+    se detecta la hoja activa indicada por su título.
+
+    Args:
+        trabajos (list): Trabajos TrabajoQR (hoja None = hoja activa)
+
+    Raises:
+        ValueError: Si dos trabajos comparten hoja y columna de salida
+    """
+    destinos = set()
+    for trabajo in trabajos:
+        destino = (trabajo.hoja, indice_columna(trabajo.salida))
+        if destino in destinos:
+            raise ValueError(f"dos trabajos escriben los QR en la columna {letra_columna(destino[1])} de la "
+                             f"hoja {repr(trabajo.hoja) if trabajo.hoja else 'activa'}")
+        destinos.add(destino)
+
+def leer_columnas_trabajos(ruta_archivo, trabajos):
+    """
+    Lee las columnas de entrada de varios trabajos abriendo el Excel una sola vez
+    en modo streaming (solo lectura). Cada hoja se recorre una única vez, aunque
+    tenga varios trabajos, y solo entre sus columnas de entrada.
+
+    Args:
+        ruta_archivo (str): Ruta al archivo Excel
+        trabajos (list): Trabajos TrabajoQR
+
+    Returns:
+        list: Un dict por trabajo con 'hoja' (título), 'columna' (índice de entrada),
+            'nombre_columna', 'salida' (índice) y 'filas' [(fila_excel, valor)]
+
+    Raises:
+        ValueError: Si una hoja o una columna no existe (el mensaje incluye las
+            columnas disponibles) o si dos trabajos escriben en la misma columna
+            de la misma hoja
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(ruta_archivo, read_only=True, data_only=True)
+    try:
+        comprobar_salidas_trabajos([trabajo._replace(hoja=trabajo.hoja or wb.active.title)
+                                    for trabajo in trabajos])
+        resueltos = []
+        for trabajo in trabajos:
+            titulo = trabajo.hoja or wb.active.title
+            if titulo not in wb.sheetnames:
+                raise ValueError(f"La hoja '{titulo}' no existe (hojas disponibles: {wb.sheetnames})")
+            encabezados = list(next(wb[titulo].iter_rows(min_row=1, max_row=1, values_only=True), ()))
+            if trabajo.columna is None:
+                columna = localizar_columna_id(encabezados)
+                if columna is None:
+                    raise ValueError(f"No se pudo identificar la columna ID_Unico (L) en la hoja "
+                                     f"'{titulo}'. Columnas disponibles: {encabezados}")
+            elif trabajo.columna in encabezados:
+                columna = encabezados.index(trabajo.columna) + 1
+            else:
+                columna = indice_columna(trabajo.columna)
+                if columna is None:
+                    raise ValueError(f"La columna '{trabajo.columna}' no existe en la hoja "
+                                     f"'{titulo}'. Columnas disponibles: {encabezados}")
+            nombre_columna = encabezados[columna - 1] if columna <= len(encabezados) else None
+            resueltos.append({'hoja': titulo, 'columna': columna,
+                              'nombre_columna': nombre_columna or letra_columna(columna),
+                              'salida': indice_columna(trabajo.salida), 'filas': []})
+
+        # Una pasada por hoja entre la primera y la última columna de entrada
+        for titulo in dict.fromkeys(resuelto['hoja'] for resuelto in resueltos):
+            de_la_hoja = [resuelto for resuelto in resueltos if resuelto['hoja'] == titulo]
+            minima = min(resuelto['columna'] for resuelto in de_la_hoja)
+            maxima = max(resuelto['columna'] for resuelto in de_la_hoja)
+            celdas = wb[titulo].iter_rows(min_row=2, min_col=minima, max_col=maxima, values_only=True)
+            for fila_excel, valores in enumerate(celdas, start=2):
+                for resuelto in de_la_hoja:
+                    resuelto['filas'].append((fila_excel, valores[resuelto['columna'] - minima]))
+        return resueltos
+    finally:
+        wb.close()
+
+def leer_columna_ids(ruta_archivo):
+    """
+    Abre el Excel en modo streaming (solo lectura) y prepara la lectura perezosa
+    de la columna ID_Unico. Solo se recorre esa columna, sin cargar el libro completo.
+
+    Args:
+        ruta_archivo (str): Ruta al archivo Excel
+
+    Returns:
+        tuple: (nombre de la columna, encabezados, generador de (fila_excel, valor));
+            el generador es None si no se encuentra la columna
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(ruta_archivo, read_only=True, data_only=True)
+    ws = wb.active
+    encabezados = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    columna = localizar_columna_id(encabezados)
+    if columna is None:
+        wb.close()
+        return None, list(encabezados), None
+
+    def filas():
+        try:
+            celdas = ws.iter_rows(min_row=2, min_col=columna, max_col=columna, values_only=True)
+            for fila_excel, (valor,) in enumerate(celdas, start=2):
+                yield fila_excel, valor
+        finally:
+            wb.close()
+
+    return encabezados[columna - 1], list(encabezados), filas()
+
+def _ruta_relacionada(ruta_parte, destino):
+    """
+    Resuelve el Target de una relación OPC respecto a la parte que la declara.
+
+    Args:
+        ruta_parte (str): Parte origen dentro del ZIP (p. ej. 'xl/workbook.xml')
+        destino (str): Target de la relación (relativo o absoluto)
+
+    Returns:
+        str: Ruta de la parte destino dentro del ZIP
+    """
+    if destino.startswith('/'):
+        return destino.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(ruta_parte), destino))
+
+def _ruta_rels(ruta_parte):
+    """Ruta del archivo .rels asociado a una parte del paquete."""
+    directorio, nombre = posixpath.split(ruta_parte)
+    return posixpath.join(directorio, '_rels', nombre + '.rels')
+
+def _partes_hojas_xlsx(zin):
+    """
+    Relaciona el título de cada hoja con su parte XML dentro del paquete.
+
+    Args:
+        zin (ZipFile): Archivo xlsx abierto para lectura
+
+    Returns:
+        dict: {titulo_hoja: ruta_parte}
+    """
+    libro = ET.fromstring(zin.read('xl/workbook.xml'))
+    rels = ET.fromstring(zin.read('xl/_rels/workbook.xml.rels'))
+    destinos = {rel.get('Id'): rel.get('Target') for rel in rels}
+    partes = {}
+    for hoja in libro.iter('{%s}sheet' % NS_HOJA):
+        destino = destinos.get(hoja.get('{%s}id' % NS_REL))
+        if destino:
+            partes[hoja.get('name')] = _ruta_relacionada('xl/workbook.xml', destino)
+    return partes
+
+def _nombre_libre(existentes, plantilla):
+    """Devuelve la primera ruta plantilla.format(n) que no exista en el paquete."""
+    numero = 1
+    while plantilla.format(numero) in existentes:
+        numero += 1
+    return plantilla.format(numero)
+
+def _extension_imagen(imagen):
+    """
+    Extensión de la parte multimedia para una imagen (ruta o bytes en memoria).
+
+    Args:
+        imagen (str o bytes): Ruta del archivo o contenido codificado
+
+    Returns:
+        str: 'jpeg' o 'png'
+    """
+    if isinstance(imagen, bytes):
+        return 'png' if imagen.startswith(b'\x89PNG') else 'jpeg'
+    if isinstance(imagen, ParteXlsx):
+        return posixpath.splitext(imagen.parte)[1].lstrip('.')
+    extension = os.path.splitext(imagen)[1].lower().lstrip('.')
+    return 'jpeg' if extension == 'jpg' else extension
+
+def _leer_parte_xlsx(imagen, paquetes):
+    """
+    Lee una ParteXlsx (imagen incrustada en otro libro).
+
+    Args:
+        imagen (ParteXlsx): Libro y parte multimedia
+        paquetes (dict): Libros ya abiertos {ruta: ZipFile} (se actualiza; el llamador los cierra)
+
+    Returns:
+        bytes: Contenido de la imagen
+    """
+    if imagen.ruta_xlsx not in paquetes:
+        paquetes[imagen.ruta_xlsx] = zipfile.ZipFile(imagen.ruta_xlsx)
+    return paquetes[imagen.ruta_xlsx].read(imagen.parte)
+
+def _xml_ancla_imagen(fila, columna, id_relacion, id_forma, dimensiones):
+    """
+    Genera el XML de un oneCellAnchor: la imagen queda anclada a la celda
+    (fila, columna) con los márgenes y el tamaño de calcular_dimensiones_optimas().
+    """
+    ancho = dimensiones['imagen_width'] * EMU_POR_PIXEL
+    alto = dimensiones['imagen_height'] * EMU_POR_PIXEL
+    return (
+        '<xdr:oneCellAnchor>'
+        f'<xdr:from><xdr:col>{columna - 1}</xdr:col><xdr:colOff>{dimensiones["offset_horizontal"]}</xdr:colOff>'
+        f'<xdr:row>{fila - 1}</xdr:row><xdr:rowOff>{dimensiones["offset_vertical"]}</xdr:rowOff></xdr:from>'
+        f'<xdr:ext cx="{ancho}" cy="{alto}"/>'
+        f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{id_forma}" name="QR {id_forma - 1}"/>'
+        '<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+        f'<xdr:blipFill><a:blip r:embed="{id_relacion}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+        f'<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{ancho}" cy="{alto}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>'
+        '<xdr:clientData/></xdr:oneCellAnchor>'
+    )
+
+def _escribir_dibujo_hoja(zout, existentes, anclas, dimensiones, medias, estadisticas,
+                          paquetes, registro=None):
+    """
+    Escribe en el paquete una parte de dibujo con sus imágenes. El XML de las
+    anclas se acumula en un archivo temporal y cada imagen se copia al ZIP en
+    cuanto aparece, de modo que la memoria no crece con el número de filas.
+    Cada imagen distinta se guarda una sola vez: las anclas repetidas apuntan
+    a la misma relación.
+
+    Args:
+        zout (ZipFile): Paquete de salida abierto para escritura
+        existentes (set): Nombres de partes ya usados (se actualiza)
+        anclas (iterable): Tuplas (fila, columna, imagen); imagen es una ruta, los bytes
+            o una ParteXlsx de otro libro
+        dimensiones (dict): Dimensiones de calcular_dimensiones_optimas()
+        medias (dict): {imagen: (ruta_media, tamaño)} compartido entre hojas (se actualiza)
+        estadisticas (dict): Contadores 'anclas', 'imagenes' y 'bytes_ahorrados' (se actualiza)
+        paquetes (dict): Libros abiertos de los que se copian ParteXlsx {ruta: ZipFile}
+        registro (dict, optional): Se rellena con {(fila, columna): (ruta_media, tamaño)}
+
+    Returns:
+        tuple: (ruta de la parte de dibujo, set de extensiones de imagen usadas)
+    """
+    ruta_dibujo = _nombre_libre(existentes, 'xl/drawings/drawing{}.xml')
+    existentes.add(ruta_dibujo)
+    extensiones = set()
+    relaciones = {}
+    numero_forma = 1
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b') as xml_anclas:
+        for fila, columna, imagen in anclas:
+            if imagen in medias:
+                ruta_media, tamano = medias[imagen]
+                estadisticas['bytes_ahorrados'] += tamano
+            else:
+                extension = _extension_imagen(imagen)
+                ruta_media = _nombre_libre(existentes, 'xl/media/qr_{}.' + extension)
+                existentes.add(ruta_media)
+                # JPEG/PNG ya están comprimidos: se guardan sin volver a comprimir
+                if isinstance(imagen, bytes):
+                    zout.writestr(ruta_media, imagen, compress_type=zipfile.ZIP_STORED)
+                elif isinstance(imagen, ParteXlsx):
+                    zout.writestr(ruta_media, _leer_parte_xlsx(imagen, paquetes),
+                                  compress_type=zipfile.ZIP_STORED)
+                else:
+                    zout.write(imagen, ruta_media, compress_type=zipfile.ZIP_STORED)
+                medias[imagen] = (ruta_media, zout.getinfo(ruta_media).file_size)
+                estadisticas['imagenes'] += 1
+
+            if ruta_media not in relaciones:
+                relaciones[ruta_media] = f"rId{len(relaciones) + 1}"
+                extensiones.add(posixpath.splitext(ruta_media)[1].lstrip('.'))
+
+            numero_forma += 1
+            estadisticas['anclas'] += 1
+            if registro is not None:
+                registro[(fila, columna)] = medias[imagen]
+            xml_anclas.write(_xml_ancla_imagen(fila, columna, relaciones[ruta_media],
+                                               numero_forma, dimensiones).encode('utf-8'))
+
+        xml_anclas.seek(0)
+        with zout.open(ruta_dibujo, 'w') as destino:
+            destino.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<xdr:wsDr xmlns:xdr="{NS_DIBUJO}" xmlns:a="{NS_DRAWINGML}" xmlns:r="{NS_REL}">'
+                .encode('utf-8'))
+            shutil.copyfileobj(xml_anclas, destino)
+            destino.write(b'</xdr:wsDr>')
+
+    with zout.open(_ruta_rels(ruta_dibujo), 'w') as destino:
+        destino.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_RELACIONES}">'.encode('utf-8'))
+        for ruta_media, id_relacion in relaciones.items():
+            destino_media = posixpath.relpath(ruta_media, 'xl/drawings')
+            destino.write(f'<Relationship Id="{id_relacion}" Type="{TIPO_REL_IMAGEN}" Target="{destino_media}"/>'.encode('utf-8'))
+        destino.write(b'</Relationships>')
+
+    return ruta_dibujo, extensiones
+
+def _copiar_hoja_con_dibujo(zin, zout, ruta_hoja, id_relacion):
+    """
+    Copia el XML de una hoja en streaming añadiendo el elemento <drawing>
+    tras </sheetData>, en la posición que exige el esquema.
+
+    Raises:
+        ValueError: Si la hoja ya tiene un dibujo (solo se admite uno por hoja)
+    """
+    elemento = f'<drawing xmlns:r="{NS_REL}" r:id="{id_relacion}"/>'.encode('utf-8')
+    marcadores = (b'</sheetData>', b'<sheetData/>')
+    with zin.open(ruta_hoja) as origen, zout.open(ruta_hoja, 'w') as destino:
+        pendiente = b''
+        while True:
+            bloque = origen.read(1024 * 1024)
+            if not bloque:
+                raise ValueError(f"{ruta_hoja} no contiene sheetData")
+            pendiente += bloque
+            posicion = -1
+            for marcador in marcadores:
+                posicion = pendiente.find(marcador)
+                if posicion >= 0:
+                    posicion += len(marcador)
+                    break
+            if posicion >= 0:
+                break
+            # Conservar el final por si un marcador quedó partido entre bloques
+            destino.write(pendiente[:-16])
+            pendiente = pendiente[-16:]
+
+        destino.write(pendiente[:posicion])
+        # Lo que sigue a sheetData es pequeño (márgenes, configuración de página...)
+        resto = pendiente[posicion:] + origen.read()
+        if b'<drawing ' in resto or b'<drawing>' in resto:
+            raise ValueError(f"{ruta_hoja} ya contiene un dibujo")
+        # Elementos que el esquema coloca después de <drawing>
+        siguientes = [resto.find(etiqueta) for etiqueta in (
+            b'<legacyDrawing', b'<picture', b'<oleObjects', b'<controls',
+            b'<webPublishItems', b'<tableParts', b'<extLst', b'</worksheet>')]
+        insercion = min(posicion for posicion in siguientes if posicion >= 0)
+        destino.write(resto[:insercion] + elemento + resto[insercion:])
+
+def _rels_con_relacion(contenido, id_relacion, tipo, destino):
+    """Añade una relación a un archivo .rels existente (o crea uno nuevo)."""
+    if contenido is None:
+        contenido = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<Relationships xmlns="{NS_RELACIONES}"></Relationships>').encode('utf-8')
+    relacion = f'<Relationship Id="{id_relacion}" Type="{tipo}" Target="{destino}"/>'.encode('utf-8')
+    if b'</Relationships>' in contenido:
+        return contenido.replace(b'</Relationships>', relacion + b'</Relationships>')
+    return contenido.replace(b'/>', b'>' + relacion + b'</Relationships>', 1)
+
+def inyectar_imagenes_xlsx(ruta_xlsx, anclas_por_hoja, dimensiones, registro_medias=None):
+    """
+    Inserta imágenes ancladas a celdas en un .xlsx ya guardado, escribiendo
+    directamente las partes de dibujo del paquete (sin objetos XLImage en memoria).
+    Las imágenes repetidas se incrustan una sola vez en todo el libro.
+
+    Args:
+        ruta_xlsx (str): Archivo .xlsx a modificar (se reemplaza al terminar)
+        anclas_por_hoja (dict): {titulo_hoja: iterable de (fila, columna, imagen)},
+            donde imagen es una ruta o los bytes de la imagen codificada
+        dimensiones (dict): Dimensiones de calcular_dimensiones_optimas()
+        registro_medias (dict, optional): Se rellena con
+            {titulo_hoja: {(fila, columna): (parte multimedia, tamaño)}} (usado por el manifiesto)
+
+    Returns:
+        dict: 'anclas' insertadas, 'imagenes' únicas incrustadas y
+            'bytes_ahorrados' por no repetir imágenes
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta_xlsx))
+    descriptor, ruta_temporal = tempfile.mkstemp(suffix='.xlsx', dir=directorio)
+    os.close(descriptor)
+    estadisticas = {'anclas': 0, 'imagenes': 0, 'bytes_ahorrados': 0}
+    medias = {}
+    paquetes = {}
+    try:
+        with zipfile.ZipFile(ruta_xlsx) as zin, \
+                zipfile.ZipFile(ruta_temporal, 'w', zipfile.ZIP_DEFLATED) as zout:
+            existentes = set(zin.namelist())
+            partes_hojas = _partes_hojas_xlsx(zin)
+            modificadas = {}
+            extensiones = set()
+            dibujos = []
+
+            for titulo, anclas in anclas_por_hoja.items():
+                ruta_hoja = partes_hojas[titulo]
+                registro = None
+                if registro_medias is not None:
+                    registro = registro_medias.setdefault(titulo, {})
+                ruta_dibujo, usadas = _escribir_dibujo_hoja(zout, existentes, anclas, dimensiones,
+                                                            medias, estadisticas, paquetes, registro)
+                extensiones |= usadas
+                dibujos.append(ruta_dibujo)
+
+                ruta_rels = _ruta_rels(ruta_hoja)
+                contenido_rels = zin.read(ruta_rels) if ruta_rels in existentes else None
+                id_relacion = 'rIdQR1'
+                while contenido_rels and f'Id="{id_relacion}"'.encode('utf-8') in contenido_rels:
+                    id_relacion += '1'
+                modificadas[ruta_rels] = _rels_con_relacion(
+                    contenido_rels, id_relacion, TIPO_REL_DIBUJO,
+                    posixpath.relpath(ruta_dibujo, posixpath.dirname(ruta_hoja)))
+                modificadas[ruta_hoja] = id_relacion
+
+            # Tipos de contenido: extensiones de imagen y la nueva parte de dibujo
+            tipos = zin.read('[Content_Types].xml')
+            for extension in sorted(extensiones):
+                if f'Extension="{extension}"'.encode('utf-8') not in tipos:
+                    tipos = tipos.replace(b'</Types>', f'<Default Extension="{extension}" ContentType="image/{extension}"/></Types>'.encode('utf-8'))
+            for ruta_dibujo in dibujos:
+                tipos = tipos.replace(b'</Types>', f'<Override PartName="/{ruta_dibujo}" ContentType="{TIPO_CONTENIDO_DIBUJO}"/></Types>'.encode('utf-8'))
+            zout.writestr('[Content_Types].xml', tipos)
+
+            for info in zin.infolist():
+                nombre = info.filename
+                if nombre == '[Content_Types].xml':
+                    continue
+                if nombre in modificadas and isinstance(modificadas[nombre], str):
+                    _copiar_hoja_con_dibujo(zin, zout, nombre, modificadas.pop(nombre))
+                elif nombre in modificadas:
+                    zout.writestr(nombre, modificadas.pop(nombre))
+                else:
+                    with zin.open(info) as origen, zout.open(nombre, 'w') as destino:
+                        shutil.copyfileobj(origen, destino, 1024 * 1024)
+            # Archivos .rels que no existían en el paquete original
+            for nombre, contenido in modificadas.items():
+                zout.writestr(nombre, contenido)
+
+        os.replace(ruta_temporal, ruta_xlsx)
+    finally:
+        for paquete in paquetes.values():
+            paquete.close()
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+    return estadisticas
+
+def guardar_excel_streaming(ruta_origen, ruta_destino, anclas_por_hoja, dimensiones,
+                            registro_medias=None):
+    """
+    Escribe el Excel de salida en modo streaming: las filas se copian del
+    origen (solo lectura) a un libro de solo escritura y las imágenes se
+    añaden después como partes de dibujo. La memoria se mantiene constante
+    aunque haya cientos de miles de imágenes.
+
+    Conserva valores y fórmulas de todas las hojas; el formato de celdas,
+    las celdas combinadas y los dibujos existentes no se copian.
+
+    Args:
+        ruta_origen (str): Excel de entrada
+        ruta_destino (str): Excel de salida
+        anclas_por_hoja (dict): {titulo_hoja: lista de (fila, columna, imagen)};
+            imagen es una ruta o los bytes de la imagen
+        dimensiones (dict): Dimensiones de calcular_dimensiones_optimas()
+        registro_medias (dict, optional): Ver inyectar_imagenes_xlsx()
+
+    Returns:
+        dict: Estadísticas de inyectar_imagenes_xlsx()
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment
+
+    origen = openpyxl.load_workbook(ruta_origen, read_only=True)
+    salida = openpyxl.Workbook(write_only=True)
+    alineacion = Alignment(horizontal='center', vertical='center', wrap_text=False)
+    try:
+        for hoja_origen in origen.worksheets:
+            hoja = salida.create_sheet(hoja_origen.title)
+            anclas = anclas_por_hoja.get(hoja_origen.title)
+            if not anclas:
+                for valores in hoja_origen.iter_rows(values_only=True):
+                    hoja.append(valores)
+                continue
+
+            # Columnas con QR de cada fila (una hoja puede tener varias columnas de salida)
+            columnas_por_fila = {}
+            for fila, columna, _ in anclas:
+                columnas_por_fila.setdefault(fila, set()).add(columna)
+            # Ancho de columna: debe definirse antes de escribir la primera fila
+            for columna in {columna for _, columna, _ in anclas}:
+                hoja.column_dimensions[letra_columna(columna)].width = dimensiones['ancho_celda']
+            for fila_excel, valores in enumerate(hoja_origen.iter_rows(values_only=True), start=1):
+                columnas = columnas_por_fila.get(fila_excel)
+                if not columnas:
+                    hoja.append(valores)
+                    continue
+                valores = list(valores) + [None] * (max(columnas) - len(valores))
+                for columna in columnas:
+                    celda = WriteOnlyCell(hoja, value=valores[columna - 1])
+                    celda.alignment = alineacion
+                    valores[columna - 1] = celda
+                # La altura se aplica al escribir la fila y se descarta después
+                hoja.row_dimensions[fila_excel].height = dimensiones['altura_celda']
+                hoja.append(valores)
+                del hoja.row_dimensions[fila_excel]
+        salida.save(ruta_destino)
+    finally:
+        origen.close()
+
+    return inyectar_imagenes_xlsx(ruta_destino, anclas_por_hoja, dimensiones, registro_medias)
+
+def ruta_manifiesto_qr(ruta_salida):
+    """
+    Ruta del manifiesto asociado a un Excel de salida.
+
+    Args:
+        ruta_salida (str): Ruta del archivo *_con_QR_optimizado.xlsx
+
+    Returns:
+        str: Ruta del manifiesto JSON
+    """
+    return os.path.splitext(ruta_salida)[0] + ".manifiesto.json"
+
+def ruta_indice_qr(ruta_salida):
+    """
+    Ruta del índice ID -> imagen asociado a un Excel de salida.
+
+    Args:
+        ruta_salida (str): Ruta del archivo *_con_QR_optimizado.xlsx
+
+    Returns:
+        str: Ruta del índice JSON
+    """
+    return os.path.splitext(ruta_salida)[0] + ".indice.json"
+
+def ruta_archivo_imagenes_qr(ruta_salida):
+    """
+    Ruta del archivo ZIP de imágenes asociado a un Excel de salida.
+
+    Args:
+        ruta_salida (str): Ruta del archivo *_con_QR_optimizado.xlsx
+
+    Returns:
+        str: Ruta del archivo .imagenes.zip
+    """
+    return os.path.splitext(ruta_salida)[0] + ".imagenes.zip"
+
+def escribir_archivo_imagenes_qr(ruta_zip, imagenes, formato=None):
+    """
+    Escribe las imágenes de forma secuencial en un único ZIP sin compresión,
+    seguidas del índice ID -> entrada (NOMBRE_INDICE_ARCHIVO). Sustituye a la
+    carpeta con un archivo por ID; como las entradas no se comprimen, cada imagen
+    queda contigua en el archivo y ArchivoImagenesQR la lee sin copiarla.
+
+    Args:
+        ruta_zip (str): Archivo ZIP de salida (se reemplaza al terminar)
+        imagenes (iterable): Tuplas (id_unico, nombre sin extensión, imagen), donde
+            imagen son los bytes o una ParteXlsx (parte de un libro o entrada de un
+            archivo anterior, incluido el propio ruta_zip); los IDs repetidos se escriben una vez
+        formato (str, optional): Formato de las imágenes en bytes (da su extensión)
+
+    Returns:
+        dict: 'imagenes' escritas y 'bytes' de imagen
+    """
+    ruta_temporal = ruta_zip + ".tmp"
+    indice = {}
+    paquetes = {}
+    estadisticas = {'imagenes': 0, 'bytes': 0}
+    try:
+        with zipfile.ZipFile(ruta_temporal, 'w', zipfile.ZIP_STORED, allowZip64=True) as paquete:
+            for id_unico, nombre, imagen in imagenes:
+                if id_unico in indice:
+                    continue
+                if isinstance(imagen, ParteXlsx):
+                    datos = _leer_parte_xlsx(imagen, paquetes)
+                    extension = posixpath.splitext(imagen.parte)[1]
+                else:
+                    datos = imagen
+                    extension = extension_de_datos(datos, formato)
+                entrada = nombre + extension
+                paquete.writestr(entrada, datos)
+                indice[id_unico] = entrada
+                estadisticas['imagenes'] += 1
+                estadisticas['bytes'] += len(datos)
+            paquete.writestr(NOMBRE_INDICE_ARCHIVO,
+                             json.dumps(indice, ensure_ascii=False, separators=(',', ':')))
+        # Las imágenes pueden leerse del archivo que se reemplaza: se cierra antes
+        for abierto in paquetes.values():
+            abierto.close()
+        os.replace(ruta_temporal, ruta_zip)
+    finally:
+        for abierto in paquetes.values():
+            abierto.close()
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+    return estadisticas
+
+class ArchivoImagenesQR:
+    """
+    Lector del archivo de imágenes de escribir_archivo_imagenes_qr(). El ZIP se
+    proyecta en memoria (mmap) y cada imagen se devuelve como un memoryview del
+    archivo: sin copias ni una apertura por imagen, listo para enviar a una API.
+
+    Uso:
+        with ArchivoImagenesQR('datos_con_QR_optimizado.imagenes.zip') as archivo:
+            for id_unico in archivo:
+                subir(archivo.nombre(id_unico), archivo[id_unico])
+    """
+
+    def __init__(self, ruta):
+        """
+        Args:
+            ruta (str): Archivo .imagenes.zip
+
+        Raises:
+            ValueError: Si el ZIP tiene entradas comprimidas o no tiene índice
+        """
+        self.ruta = ruta
+        self._archivo = open(ruta, 'rb')
+        try:
+            self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self._vista = memoryview(self._mapa)
+            # Solo se lee el directorio central: los datos se localizan por desplazamiento
+            entradas = {}
+            with zipfile.ZipFile(self._archivo) as paquete:
+                for info in paquete.infolist():
+                    if info.compress_type != zipfile.ZIP_STORED:
+                        raise ValueError(f"{ruta}: la entrada {info.filename} está comprimida")
+                    # Cabecera local: 30 bytes fijos + nombre + campo extra
+                    longitud_nombre, longitud_extra = struct.unpack_from('<HH', self._mapa, info.header_offset + 26)
+                    inicio = info.header_offset + 30 + longitud_nombre + longitud_extra
+                    entradas[info.filename] = (inicio, info.file_size)
+            if NOMBRE_INDICE_ARCHIVO not in entradas:
+                raise ValueError(f"{ruta}: falta el índice {NOMBRE_INDICE_ARCHIVO}")
+            inicio, tamano = entradas[NOMBRE_INDICE_ARCHIVO]
+            self._nombres = json.loads(self._vista[inicio:inicio + tamano].tobytes().decode('utf-8'))
+            self._posiciones = {id_unico: entradas[entrada] for id_unico, entrada in self._nombres.items()}
+        except Exception:
+            self.cerrar()
+            raise
+
+    def __getitem__(self, id_unico):
+        """Imagen del ID como memoryview (KeyError si no está en el archivo)."""
+        inicio, tamano = self._posiciones[id_unico]
+        return self._vista[inicio:inicio + tamano]
+
+    def __contains__(self, id_unico):
+        return id_unico in self._posiciones
+
+    def __iter__(self):
+        return iter(self._posiciones)
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def nombre(self, id_unico):
+        """Nombre de la entrada del ID (p. ej. 'qr_003.jpg')."""
+        return self._nombres[id_unico]
+
+    def cerrar(self):
+        """Libera la proyección; las vistas aún en uso la mantienen hasta soltarse."""
+        vista = getattr(self, '_vista', None)
+        if vista is not None:
+            vista.release()
+        mapa = getattr(self, '_mapa', None)
+        if mapa is not None:
+            try:
+                mapa.close()
+            except BufferError:
+                pass
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+def clave_celda_qr(hoja, columna, fila):
+    """
+    Identifica la celda de un QR en el manifiesto y el punto de control.
+
+    Args:
+        hoja (str): Título de la hoja
+        columna (int): Columna de salida (1-indexed)
+        fila (int): Fila de Excel
+
+    Returns:
+        str: Referencia de la celda ('Hoja!M2')
+    """
+    return f"{hoja}!{letra_columna(columna)}{fila}"
+
+def firma_fila_qr(id_unico, calidad=85, mascara=MASCARA_QR_DEFECTO, formato='jpeg'):
+    """
+    Firma del contenido de una fila: cambia si cambia el ID o cualquier
+    parámetro que afecte a la imagen del QR.
+
+    Args:
+        id_unico (str): ID_Unico de la fila
+        calidad (int): Calidad JPEG
+        mascara (str): Modo de selección de máscara
+        formato (str): Formato de imagen
+
+    Returns:
+        str: Hash hexadecimal (128 bits)
+    """
+    return clave_cache_qr(id_unico, calidad=calidad, formato=formato, mascara=mascara)[:32]
+
+def cargar_manifiesto_qr(ruta_manifiesto):
+    """
+    Carga el manifiesto de la ejecución anterior.
+
+    Args:
+        ruta_manifiesto (str): Ruta del manifiesto JSON
+
+    Returns:
+        dict o None: Manifiesto, o None si no existe, está dañado o es de otra versión
+    """
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    if manifiesto.get('version') != VERSION_MANIFIESTO:
+        return None
+    return manifiesto
+
+def guardar_manifiesto_qr(ruta_manifiesto, manifiesto):
+    """
+    Guarda el manifiesto de forma atómica (archivo temporal + reemplazo).
+
+    Args:
+        ruta_manifiesto (str): Ruta del manifiesto JSON
+        manifiesto (dict): Contenido a guardar
+    """
+    ruta_temporal = ruta_manifiesto + ".tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False, separators=(',', ':'))
+    os.replace(ruta_temporal, ruta_manifiesto)
+
+def ruta_punto_control_qr(ruta_salida):
+    """
+    Ruta del punto de control asociado a un Excel de salida.
+
+    Args:
+        ruta_salida (str): Ruta del archivo *_con_QR_optimizado.xlsx
+
+    Returns:
+        str: Ruta del punto de control JSON
+    """
+    return os.path.splitext(ruta_salida)[0] + ".punto_control.json"
+
+def cargar_punto_control_qr(ruta_punto_control, ruta_origen, parametros):
+    """
+    Carga el punto de control de una ejecución interrumpida si sigue siendo
+    aplicable: mismo Excel de origen, mismos parámetros de imagen y la carpeta
+    de imágenes todavía existe. Tiene el mismo formato de archivo que el manifiesto.
+
+    Args:
+        ruta_punto_control (str): Ruta del punto de control JSON
+        ruta_origen (str): Excel que se va a procesar
+        parametros (dict): Parámetros que determinan las imágenes (calidad, formato, máscara)
+
+    Returns:
+        dict o None: Punto de control, o None si no existe o no aplica
+    """
+    punto_control = cargar_manifiesto_qr(ruta_punto_control)
+    if (punto_control is None
+            or punto_control.get('origen') != os.path.abspath(ruta_origen)
+            or punto_control.get('parametros') != parametros
+            or not os.path.isdir(punto_control.get('directorio_qr', ''))):
+        return None
+    return punto_control
+
+def imagen_punto_control_qr(punto_control, ruta_archivo_qr, firma):
+    """
+    Busca en el punto de control una imagen ya escrita para una tarea. Solo se
+    reutiliza si su firma coincide y el archivo está completo (mismo tamaño que
+    el registrado): una escritura cortada por la caída se vuelve a generar.
+
+    Args:
+        punto_control (dict): Punto de control cargado
+        ruta_archivo_qr (str): Ruta de la imagen sin extensión
+        firma (str): Firma actual de la fila (firma_fila_qr)
+
+    Returns:
+        tuple o None: (ruta de la imagen, tamaño) o None si hay que generarla
+    """
+    nombre = os.path.basename(ruta_archivo_qr)
+    for extension in extensiones_formato(punto_control['parametros']['formato']):
+        entrada = punto_control['imagenes'].get(nombre + extension)
+        if not entrada or entrada['firma'] != firma:
+            continue
+        ruta = ruta_archivo_qr + extension
+        try:
+            if os.path.getsize(ruta) == entrada['bytes']:
+                return ruta, entrada['bytes']
+        except OSError:
+            pass
+    return None
+
+class PuntoControlQR:
+    """
+    Punto de control de una ejecución en curso: imágenes ya completas en la
+    carpeta de la ejecución y etapa alcanzada. Se guarda periódicamente, al
+    cambiar de etapa y si la ejecución falla, para poder continuar con --reanudar.
+    """
+
+    def __init__(self, ruta, ruta_origen, parametros, directorio_qr, imagenes=None):
+        """
+        Args:
+            ruta (str): Ruta del punto de control JSON
+            ruta_origen (str): Excel que se está procesando
+            parametros (dict): Parámetros que determinan las imágenes
+            directorio_qr (str): Carpeta de imágenes de la ejecución
+            imagenes (dict, optional): {nombre de archivo: {'firma', 'bytes'}} ya escritas
+                (las reutilizadas al reanudar)
+        """
+        self.ruta = ruta
+        self.estado = {
+            'version': VERSION_MANIFIESTO,
+            'origen': os.path.abspath(ruta_origen),
+            'parametros': parametros,
+            'directorio_qr': os.path.abspath(directorio_qr),
+            'etapa': 'generacion',
+            'imagenes': dict(imagenes or {}),
+        }
+        self._ultimo_guardado = time.time()
+
+    def registrar(self, ruta_imagen, firma, tamano):
+        """
+        Anota una imagen ya completa en disco (desde el hilo de escritura) y guarda
+        el punto de control si han pasado INTERVALO_PUNTO_CONTROL_SEGUNDOS.
+        """
+        self.estado['imagenes'][os.path.basename(ruta_imagen)] = {'firma': firma, 'bytes': tamano}
+        if time.time() - self._ultimo_guardado >= INTERVALO_PUNTO_CONTROL_SEGUNDOS:
+            self.guardar()
+
+    def guardar(self, etapa=None):
+        """
+        Escribe el punto de control, pasando antes a `etapa` si se indica.
+        """
+        if etapa:
+            self.estado['etapa'] = etapa
+        guardar_manifiesto_qr(self.ruta, self.estado)
+        self._ultimo_guardado = time.time()
+
+    def eliminar(self):
+        """
+        Borra el punto de control (la ejecución terminó).
+        """
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+def _cargar_reanudacion(ruta_punto_control, ruta_origen, parametros):
+    """
+    Carga el punto de control para --reanudar e informa de desde dónde se continúa.
+
+    Args:
+        ruta_punto_control (str): Ruta del punto de control JSON
+        ruta_origen (str): Excel que se va a procesar
+        parametros (dict): Parámetros que determinan las imágenes
+
+    Returns:
+        dict o None: Punto de control aplicable (ver cargar_punto_control_qr())
+    """
+    punto_control = cargar_punto_control_qr(ruta_punto_control, ruta_origen, parametros)
+    if punto_control:
+        print(f"⏯️ Reanudando desde el punto de control ({len(punto_control['imagenes'])} imágenes "
+              f"registradas, etapa '{punto_control['etapa']}')")
+    else:
+        print("⏯️ Sin punto de control aplicable: se procesa desde el principio")
+    return punto_control
+
+def _filas_reutilizables_qr(validos, nuevo_archivo, ruta_manifiesto, ruta_indice, ruta_zip,
+                            archivo_imagenes, firma):
+    """
+    Modo incremental: las filas sin cambios reutilizan la imagen ya incrustada en
+    la salida anterior, que se aparta como <salida>.anterior; solo se generan las
+    filas nuevas o modificadas.
+
+    Args:
+        validos (list): Tuplas (trabajo, fila_excel, id_unico) con ID válido
+        nuevo_archivo (str): Excel de salida (el de la ejecución anterior, si existe)
+        ruta_manifiesto (str): Manifiesto de la ejecución anterior
+        ruta_indice (str): Índice ID -> imagen de la ejecución anterior
+        ruta_zip (str): Archivo de imágenes de la ejecución anterior
+        archivo_imagenes (bool): Esta ejecución escribe un archivo de imágenes
+        firma (callable): firma(id_unico) -> firma actual de la fila (firma_fila_qr)
+
+    Returns:
+        tuple: (ruta de la salida apartada o None, {celda: (ParteXlsx, tamaño)} de las
+            filas reutilizadas, {id: ruta de su imagen en una carpeta anterior},
+            {id: nombre de su entrada en el archivo de imágenes anterior})
+    """
+    manifiesto_anterior = cargar_manifiesto_qr(ruta_manifiesto)
+    if not manifiesto_anterior or not os.path.exists(nuevo_archivo):
+        print("🔁 Incremental: sin manifiesto o salida previa, se procesan todas las filas")
+        return None, {}, {}, {}
+
+    salida_anterior = nuevo_archivo + ".anterior"
+    filas_previas = manifiesto_anterior['filas']
+    # Las filas reutilizadas conservan su imagen de la carpeta de una ejecución anterior
+    indice_anterior = cargar_manifiesto_qr(ruta_indice) or {}
+    imagenes_anteriores = {
+        id_unico: os.path.normpath(os.path.join(indice_anterior['directorio_qr'], ruta))
+        for id_unico, ruta in indice_anterior.get('imagenes', {}).items()}
+    entradas_archivo_anterior = {}
+    if archivo_imagenes:
+        # La parte incrustada en el libro es la imagen para Excel (PNG con
+        # WebP/SVG): el archivo de imágenes se alimenta del archivo anterior
+        try:
+            with ArchivoImagenesQR(ruta_zip) as archivo_anterior:
+                entradas_archivo_anterior = {id_unico: archivo_anterior.nombre(id_unico)
+                                             for id_unico in archivo_anterior}
+        except (OSError, ValueError):
+            pass
+    reutilizadas = {}
+    for trabajo, fila_excel, id_unico in validos:
+        clave = clave_celda_qr(trabajo['hoja'], trabajo['salida'], fila_excel)
+        previa = filas_previas.get(clave)
+        if archivo_imagenes and id_unico not in entradas_archivo_anterior:
+            # Sin su imagen en el archivo anterior la fila se resuelve de nuevo
+            # (normalmente desde la caché)
+            continue
+        if previa and previa['firma'] == firma(id_unico):
+            reutilizadas[clave] = (ParteXlsx(salida_anterior, previa['media']), previa['bytes'])
+    print(f"🔁 Incremental: {len(reutilizadas)} filas sin cambios, "
+          f"{len(validos) - len(reutilizadas)} nuevas o modificadas, "
+          f"{len(filas_previas) - len(reutilizadas)} eliminadas o reemplazadas")
+    # La salida anterior se aparta (se restaura si la ejecución falla)
+    os.replace(nuevo_archivo, salida_anterior)
+    return salida_anterior, reutilizadas, imagenes_anteriores, entradas_archivo_anterior
+
+def _tareas_pendientes_qr(filas_validas, reutilizadas, punto_control=None, firma=None):
     """
-    Calcula las dimensiones óptimas de celda e imagen basado en el número de registros.
-    Para archivos grandes, usa celdas más pequeñas para mejor rendimiento.
-    Para archivos pequeños, usa celdas más grandes para mejor visualización.
-    
+    Reparte las filas válidas entre reutilizadas (modo incremental), reanudadas
+    (imagen completa en el punto de control) y tareas de generación. IDs repetidos
+    (también entre hojas) producen el mismo archivo: generarlo una sola vez evita
+    que dos procesos escriban la misma ruta a la vez.
+
     Args:
-        registros_totales (int): Número total de registros a procesar
-        
+        filas_validas (list): Tuplas (trabajo, fila_excel, id_unico, ruta_archivo_qr)
+        reutilizadas (dict): Celdas (clave_celda_qr) que reutilizan la salida anterior
+        punto_control (dict, optional): Punto de control de la ejecución interrumpida
+        firma (callable, optional): firma(id_unico) -> firma actual de la fila
+
     Returns:
-        dict: Diccionario con dimensiones optimizadas
+        tuple: (list de tareas (id_unico, ruta_archivo_qr), {ruta: posición en tareas},
+            {ruta: (ruta de la imagen, tamaño)} de las imágenes reanudadas)
     """
-    if registros_totales > 1000:
-        # Para archivos muy grandes: celdas más pequeñas para mejor rendimiento
-        return {
-            'altura_celda': 75,
-            'ancho_celda': 12,
-            'imagen_width': 95,
-            'imagen_height': 95,
-            'offset_horizontal': 9525 * 3,  # 3 píxeles de margen
-            'offset_vertical': 9525 * 3,
-            'descripcion': 'Optimizado para archivos grandes (>1000 registros)'
-        }
-    elif registros_totales > 500:
-        # Para archivos medianos: tamaño intermedio
-        return {
-            'altura_celda': 80,
-            'ancho_celda': 13,
-            'imagen_width': 100,
-            'imagen_height': 100,
-            'offset_horizontal': 9525 * 4,  # 4 píxeles de margen
-            'offset_vertical': 9525 * 4,
-            'descripcion': 'Equilibrio para archivos medianos (500-1000 registros)'
-        }
-    else:
-        # Para archivos pequeños: tamaño completo para mejor visualización
-        return {
-            'altura_celda': 90,
-            'ancho_celda': 15,
-            'imagen_width': 110,
-            'imagen_height': 110,
-            'offset_horizontal': 9525 * 5,  # 5 píxeles de margen
-            'offset_vertical': 9525 * 5,
-            'descripcion': 'Máxima calidad para archivos pequeños (<500 registros)'
-        }
+    tareas = []
+    posicion_tarea = {}
+    reanudadas = {}
+    for trabajo, fila_excel, id_unico, ruta_archivo_qr in filas_validas:
+        if clave_celda_qr(trabajo['hoja'], trabajo['salida'], fila_excel) in reutilizadas \
+                or ruta_archivo_qr in posicion_tarea or ruta_archivo_qr in reanudadas:
+            continue
+        if punto_control:
+            # Reanudación: imagen ya escrita y completa antes de la interrupción (un
+            # WebP o SVG se vuelve a resolver para obtener también su PNG para Excel)
+            imagen = imagen_punto_control_qr(punto_control, ruta_archivo_qr, firma(id_unico))
+            if imagen and os.path.splitext(imagen[0])[1].lower() in EXTENSIONES_EXCEL:
+                reanudadas[ruta_archivo_qr] = imagen
+                continue
+        posicion_tarea[ruta_archivo_qr] = len(tareas)
+        tareas.append((id_unico, ruta_archivo_qr))
+    return tareas, posicion_tarea, reanudadas
 
-def generar_qr_optimizado(texto, nombre_archivo=None, calidad=85, return_image=False):
+def _insertar_imagenes_openpyxl(ruta_archivo, ruta_parcial, anclas_por_hoja, dimensiones,
+                                registro_medias, metricas):
     """
-    Genera un código QR OPTIMIZADO para APIs con formato JPEG y sin metadatos.
-    Versión corregida para evitar el error "cannot determine region size".
-    
+    Modo de escritura 'completo': carga el libro con openpyxl (conserva el formato),
+    ajusta filas y columnas, lo guarda en ruta_parcial e incrusta las imágenes.
+    Las hojas sin dibujos propios reciben después del guardado partes de dibujo
+    deduplicadas (inyectar_imagenes_xlsx()); el resto, imágenes de openpyxl.
+
     Args:
-        texto (str): Contenido del código QR (ID_Unico)
-        nombre_archivo (str, optional): Nombre del archivo sin extensión
-        calidad (int): Calidad JPEG (1-100, recomendado 85)
-        return_image (bool): Si es True, devuelve la imagen en memoria
-    
+        ruta_archivo (str): Excel de origen
+        ruta_parcial (str): Archivo donde se guarda el libro
+        anclas_por_hoja (dict): {titulo: [(fila, columna, imagen)]} (rutas, bytes o ParteXlsx)
+        dimensiones (dict): Dimensiones de calcular_dimensiones_optimas()
+        registro_medias (dict): Recibe la parte multimedia de cada celda (ver inyectar_imagenes_xlsx())
+        metricas (MetricasEjecucion): Recibe los tiempos de las etapas
+
     Returns:
-        str o Image: Ruta del archivo guardado o imagen en memoria
+        dict o None: Estadísticas de inyectar_imagenes_xlsx(), o None si no se inyectó nada
     """
-    try:
-        # Crear objeto QR con configuración OPTIMIZADA para APIs
-        qr = qrcode.QRCode(
-            version=1,  # Auto ajuste del tamaño
-            error_correction=qrcode.constants.ERROR_CORRECT_L,  # Mínima corrección = menor tamaño
-            box_size=8,  # Reducido para menor tamaño
-            border=2,    # Reducido para menos píxeles desperdiciados
-        )
-        
-        # Agregar datos al código QR
-        qr.add_data(texto)
-        qr.make(fit=True)
-        
-        # Crear imagen QR inicial
-        img_qr = qr.make_image(fill_color="black", back_color="white")
-        
-        # SOLUCIÓN: Convertir directamente a RGB evitando el error de paste()
-        # Crear nueva imagen RGB del mismo tamaño
-        img_rgb = Image.new('RGB', img_qr.size, 'white')
-        
-        # MÉTODO SEGURO: Convertir píxel por píxel si es necesario
-        if img_qr.mode == '1':  # Imagen en modo 1-bit (blanco y negro)
-            # Convertir a L (grayscale) primero, luego a RGB
-            img_gray = img_qr.convert('L')
-            img_rgb = img_gray.convert('RGB')
-        elif img_qr.mode == 'L':  # Ya en grayscale
-            img_rgb = img_qr.convert('RGB')
-        elif img_qr.mode == 'RGB':  # Ya en RGB
-            img_rgb = img_qr
-        else:
-            # Para cualquier otro modo, usar conversión directa
-            img_rgb = img_qr.convert('RGB')
-        
-        # Si necesitamos devolver la imagen en memoria
-        if return_image:
-            return img_rgb
-        
-        # Si necesitamos guardar en archivo
-        if nombre_archivo:
-            # Asegurar extensión .jpg
-            if nombre_archivo.lower().endswith('.png'):
-                nombre_archivo = nombre_archivo[:-4] + '.jpg'
-            elif not nombre_archivo.lower().endswith('.jpg'):
-                nombre_archivo += '.jpg'
-            
-            # Guardar como JPEG optimizado sin metadatos
-            img_rgb.save(nombre_archivo, 
-                        format='JPEG',
-                        quality=calidad,
-                        optimize=True,
-                        progressive=True,
-                        exif=b'')
-            
-            return nombre_archivo
-        
-        return None
-        
-    except Exception as e:
-        print(f"Error al generar QR optimizado: {str(e)}")
+    # Cargar el archivo con openpyxl para manipulación avanzada
+    import openpyxl
+    from openpyxl.drawing.image import Image as XLImage
+    from openpyxl.styles import Alignment
+
+    metricas.etapa('carga_libro')
+    wb = openpyxl.load_workbook(ruta_archivo)
+
+    # Insertar imágenes QR optimizadas CONTENIDAS en las columnas de salida.
+    # Las filas y rutas vienen de la lectura inicial: no se vuelven a leer
+    # las columnas de entrada ni a comprobar la existencia de cada archivo.
+    print("🎨 Insertando imágenes con posicionamiento perfecto...")
+    metricas.etapa('insercion')
+    reportar_insercion = ReportadorProgreso(
+        "🎨 Insertando en Excel: {completadas}/{total} ({porcentaje:.1f}%) - Procesadas: {completadas}   ")
+    total_anclas = sum(len(anclas) for anclas in anclas_por_hoja.values())
+    anclas_inyeccion = {}
+    paquetes_previos = {}
+    numero = 0
+    for titulo, anclas in anclas_por_hoja.items():
+        ws = wb[titulo]
+        # Si la hoja no tiene dibujos propios, las imágenes se escriben después
+        # de guardar como partes de dibujo deduplicadas (una por ID distinto)
+        if not ws._images and not ws._charts:
+            anclas_inyeccion[titulo] = anclas
+        for col_qr_index in {columna for _, columna, _ in anclas}:
+            ws.column_dimensions[openpyxl.utils.get_column_letter(col_qr_index)].width = dimensiones['ancho_celda']
+        for row, col_qr_index, ruta_qr in anclas:
+            # Mostrar progreso de inserción
+            numero += 1
+            reportar_insercion(numero, total_anclas)
+
+            # AVANZADO: Usar dimensiones calculadas automáticamente
+            ws.row_dimensions[row].height = dimensiones['altura_celda']
+
+            if titulo not in anclas_inyeccion:
+                if isinstance(ruta_qr, ParteXlsx):
+                    # Fila reutilizada (incremental): la imagen está en el libro anterior
+                    ruta_qr = _leer_parte_xlsx(ruta_qr, paquetes_previos)
+
+                # Crear imagen QR con tamaño EXACTO calculado para la celda
+                img = XLImage(io.BytesIO(ruta_qr) if isinstance(ruta_qr, bytes) else ruta_qr)
+
+                # CRÍTICO: Usar dimensiones calculadas para ajuste perfecto
+                img.width = dimensiones['imagen_width']
+                img.height = dimensiones['imagen_height']
+
+                # AVANZADO: Anclar imagen a la celda específica
+                cell_coordinate = openpyxl.utils.get_column_letter(col_qr_index) + str(row)
+                img.anchor = cell_coordinate
+
+                # PERFECTO: Usar offsets calculados para centrado automático
+                if hasattr(img, 'col_offset'):
+                    img.col_offset = dimensiones['offset_horizontal']
+                if hasattr(img, 'row_offset'):
+                    img.row_offset = dimensiones['offset_vertical']
+
+                # Insertar imagen con anclaje perfecto
+                ws.add_image(img)
+
+            # PROFESIONAL: Configurar alineación de celda
+            cell = ws.cell(row=row, column=col_qr_index)
+            cell.alignment = Alignment(
+                horizontal='center',
+                vertical='center',
+                wrap_text=False
+            )
+    for paquete in paquetes_previos.values():
+        paquete.close()
+
+    # Guardar el archivo Excel optimizado
+    metricas.etapa('guardado_excel')
+    wb.save(ruta_parcial)
+    if not anclas_inyeccion:
         return None
+    metricas.etapa('inyeccion_imagenes')
+    return inyectar_imagenes_xlsx(ruta_parcial, anclas_inyeccion, dimensiones, registro_medias)
 
-def obtener_tamano_archivo(ruta_archivo):
+def _actualizar_archivo_imagenes(ruta_zip, imagenes, formato):
     """
-    Obtiene el tamaño de un archivo en formato legible.
-    
+    Escribe el archivo de imágenes de la ejecución o, si esta ejecución no lo usa
+    (imagenes None), borra el de una ejecución anterior: sus imágenes ya están en
+    la carpeta y el archivo no aplica.
+
     Args:
-        ruta_archivo (str): Ruta al archivo
-        
+        ruta_zip (str): Ruta del archivo .imagenes.zip
+        imagenes (list o None): Entradas para escribir_archivo_imagenes_qr()
+        formato (str): Formato de las imágenes
+
     Returns:
-        str: Tamaño formateado (bytes, KB, MB)
+        dict o None: Estadísticas de escribir_archivo_imagenes_qr()
     """
-    if not os.path.exists(ruta_archivo):
-        return "0 bytes"
-    
-    tamano = os.path.getsize(ruta_archivo)
-    if tamano < 1024:
-        return f"{tamano} bytes"
-    elif tamano < 1024 * 1024:
-        return f"{tamano/1024:.1f} KB"
-    else:
-        return f"{tamano/(1024*1024):.1f} MB"
+    if imagenes is None:
+        if os.path.exists(ruta_zip):
+            os.remove(ruta_zip)
+        return None
+    return escribir_archivo_imagenes_qr(ruta_zip, imagenes, formato)
 
-def validar_archivo_excel(ruta_archivo):
+def guardar_indice_imagenes_qr(ruta_indice, ruta_origen, imagenes, directorio_qr=None):
     """
-    Valida que el archivo Excel existe y es accesible.
-    
+    Guarda el índice persistente ID -> imagen (nombres únicos por ID) de todas las
+    filas del libro, con las rutas relativas a la carpeta de esta ejecución o, si
+    no se creó, a la de la primera imagen. Sin imágenes en carpetas borra el índice
+    anterior, que ya no aplica.
+
     Args:
-        ruta_archivo (str): Ruta al archivo Excel
-        
-    Returns:
-        tuple: (bool: es_valido, str: mensaje)
+        ruta_indice (str): Ruta del índice JSON
+        ruta_origen (str): Excel procesado
+        imagenes (dict): {id_unico: ruta de su imagen}
+        directorio_qr (str, optional): Carpeta de esta ejecución, si se creó
     """
-    if not os.path.exists(ruta_archivo):
-        return False, f"El archivo {ruta_archivo} no existe."
-    
-    if not ruta_archivo.lower().endswith(('.xlsx', '.xls')):
-        return False, "El archivo debe tener extensión .xlsx o .xls"
-    
-    try:
-        # Intentar leer el archivo para verificar que no esté corrupto
-        pd.read_excel(ruta_archivo, nrows=1)
-        return True, "Archivo válido"
-    except Exception as e:
-        return False, f"Error al leer el archivo: {str(e)}"
+    if not imagenes:
+        if os.path.exists(ruta_indice):
+            os.remove(ruta_indice)
+        return
+    directorio_indice = os.path.abspath(directorio_qr or os.path.dirname(next(iter(imagenes.values()))))
+    guardar_manifiesto_qr(ruta_indice, {
+        'version': VERSION_MANIFIESTO,
+        'origen': os.path.abspath(ruta_origen),
+        'directorio_qr': directorio_indice,
+        'imagenes': {id_unico: os.path.relpath(ruta, directorio_indice)
+                     for id_unico, ruta in imagenes.items()},
+    })
+
+def _guardar_manifiesto_filas(ruta_manifiesto, ruta_origen, filas_validas, registro_medias, firma):
+    """
+    Guarda el manifiesto para la próxima ejecución incremental: firma y parte
+    multimedia de cada celda. Si la salida no se escribió con partes de dibujo
+    propias (registro_medias vacío), borra el manifiesto anterior, que ya no aplica.
+
+    Args:
+        ruta_manifiesto (str): Ruta del manifiesto JSON
+        ruta_origen (str): Excel procesado
+        filas_validas (list): Tuplas (trabajo, fila_excel, id_unico, ruta_archivo_qr)
+        registro_medias (dict): {hoja: {(fila, columna): (parte, bytes)}} de la inserción
+        firma (callable): firma(id_unico) -> firma de la fila (firma_fila_qr)
+    """
+    if not registro_medias:
+        if os.path.exists(ruta_manifiesto):
+            os.remove(ruta_manifiesto)
+        return
+    filas_manifiesto = {}
+    for trabajo, fila_excel, id_unico, _ in filas_validas:
+        media = registro_medias.get(trabajo['hoja'], {}).get((fila_excel, trabajo['salida']))
+        if media:
+            filas_manifiesto[clave_celda_qr(trabajo['hoja'], trabajo['salida'], fila_excel)] = {
+                'firma': firma(id_unico), 'media': media[0], 'bytes': media[1]}
+    guardar_manifiesto_qr(ruta_manifiesto, {
+        'version': VERSION_MANIFIESTO,
+        'origen': os.path.abspath(ruta_origen),
+        'filas': filas_manifiesto,
+    })
 
-def procesar_excel_optimizado(ruta_archivo):
+def procesar_excel_optimizado(ruta_archivo, workers=None, tamano_lote=TAMANO_LOTE_DEFECTO,
+                              usar_cache=True, directorio_cache=DIRECTORIO_CACHE_DEFECTO,
+                              limite_cache_mb=LIMITE_CACHE_MB_DEFECTO, modo_escritura='completo',
+                              en_memoria=False, guardar_carpeta=True, incremental=False,
+                              calidad=85, formato='jpeg', directorio_salida=None, metricas=None,
+                              mascara=MASCARA_QR_DEFECTO, profundidad_cola=None,
+                              hilos_escritura=HILOS_ESCRITURA_DEFECTO, reanudar=False,
+                              trabajos=None, archivo_imagenes=False):
     """
     Lee un archivo Excel, genera códigos QR OPTIMIZADOS para cada ID_Unico en la columna L,
     los guarda como archivos JPG comprimidos y los inserta en la columna M del Excel
     con posicionamiento perfecto dentro de las celdas.
-    
+
+    Con varios trabajos (hojas y columnas) el libro se lee y se guarda una sola vez:
+    los QR de todas las hojas comparten el mismo pool de procesos y la misma caché.
+
     Args:
         ruta_archivo (str): Ruta al archivo Excel
+        workers (int, optional): Procesos para generar QR (por defecto, núcleos disponibles;
+            1 = en serie)
+        tamano_lote (int): Filas enviadas a cada proceso por lote
+        usar_cache (bool): Reutilizar QR ya generados en ejecuciones anteriores
+        directorio_cache (str): Directorio de la caché persistente
+        limite_cache_mb (float): Tamaño máximo de la caché (se poda con LRU)
+        modo_escritura (str): 'completo' (conserva formato) o 'streaming'
+            (memoria constante; solo valores y fórmulas)
+        en_memoria (bool): Pasar los JPEG al Excel en memoria, sin releerlos de disco
+        guardar_carpeta (bool): En modo en memoria, escribir también la carpeta de
+            imágenes (en segundo plano)
+        incremental (bool): Procesar solo filas nuevas o cambiadas respecto al manifiesto
+            de la ejecución anterior; el resto reutiliza las imágenes de la salida previa
+        calidad (int): Calidad de compresión (1-100)
+        formato (str): Formato de las imágenes (ver formatos_salida())
+        directorio_salida (str, optional): Carpeta para el Excel de salida y las imágenes
+            (por defecto, el Excel junto al original y las imágenes en el directorio actual)
+        metricas (MetricasEjecucion, optional): Recibe los tiempos por etapa, contadores
+            y latencias de la ejecución
+        mascara (str): 'optima' o 'memo' (reutiliza versión y máscara entre IDs de igual forma)
+        profundidad_cola (int, optional): Lotes en vuelo entre codificación y escritura
+            (por defecto, 2 por proceso); limita la memoria si el disco es lento
+        hilos_escritura (int): Hilos que escriben las imágenes en disco
+        reanudar (bool): Continuar una ejecución interrumpida desde su punto de control,
+            reutilizando la carpeta y las imágenes ya escritas (sin efecto si no se escribe
+            la carpeta)
+        trabajos (list, optional): Trabajos TrabajoQR (hoja, columna de entrada, columna
+            de salida); por defecto, ID_Unico (o L) de la hoja activa -> M
+        archivo_imagenes (bool): Guardar las imágenes en un único ZIP sin compresión
+            (ver escribir_archivo_imagenes_qr()) en lugar de la carpeta; implica en_memoria
+
+    Returns:
+        dict: Resumen de la ejecución ('exito', 'salida', 'registros', 'qr_generados',
+            'cache_aciertos', 'directorio_qr', 'archivo_imagenes', 'error')
     """
+    salida_anterior = None
+    nuevo_archivo = None
+    ruta_parcial = None
+    punto_control_activo = None
+    resumen = {'archivo': ruta_archivo, 'exito': False, 'salida': None, 'registros': 0,
+               'qr_generados': 0, 'cache_aciertos': 0, 'directorio_qr': None,
+               'archivo_imagenes': None, 'error': None}
+    if metricas is None:
+        metricas = MetricasEjecucion()
     try:
         # Validar archivo antes de procesar
+        metricas.etapa('validacion')
         es_valido, mensaje = validar_archivo_excel(ruta_archivo)
         if not es_valido:
             print(f"❌ Error: {mensaje}")
-            return
+            resumen['error'] = mensaje
+            return resumen
+        if formato not in formatos_salida():
+            resumen['error'] = f"Formato no soportado: {formato} (opciones: {', '.join(formatos_salida())})"
+            print(f"❌ Error: {resumen['error']}")
+            return resumen
         
-        # Crear directorio principal para códigos QR optimizados
-        directorio_qr_principal = "codigos_qr_optimizados"
-        if not os.path.exists(directorio_qr_principal):
-            os.makedirs(directorio_qr_principal)
-            print(f"📁 Creado directorio: {directorio_qr_principal}")
+        # Nombre del Excel optimizado de salida , de su manifiesto y del punto de control
+        nombre_base, extension = os.path.splitext(ruta_archivo)
+        if directorio_salida:
+            os.makedirs(directorio_salida, exist_ok=True)
+            nombre_base = os.path.join(directorio_salida, os.path.basename(nombre_base))
+        nuevo_archivo = f"{nombre_base}_con_QR_optimizado{extension}"
+        ruta_manifiesto = ruta_manifiesto_qr(nuevo_archivo)
+        ruta_indice = ruta_indice_qr(nuevo_archivo)
+        ruta_zip = ruta_archivo_imagenes_qr(nuevo_archivo)
+        
+        ruta_punto_control = ruta_punto_control_qr(nuevo_archivo)
+        if archivo_imagenes:
+            # Las imágenes van a un único ZIP: se generan en memoria y no hay carpeta
+            en_memoria, guardar_carpeta = True, False
+        escribir_carpeta = guardar_carpeta or not en_memoria
+        if formato == 'auto' and not escribir_carpeta and not archivo_imagenes:
+            # Imágenes solo para el Excel: 'auto' elige entre los formatos que Excel
+            # muestra y cada imagen se codifica una vez (un WebP necesitaría su PNG)
+            formato = 'auto_excel'
+        parametros_imagen = {'calidad': calidad, 'formato': formato, 'mascara': mascara}
+        punto_control = None
+        if reanudar and not escribir_carpeta:
+            # Sin carpeta no se escribe punto de control: no hay nada que reanudar
+            print("⏯️ --reanudar requiere la carpeta de imágenes: se procesa desde el principio")
+        elif reanudar:
+            punto_control = _cargar_reanudacion(ruta_punto_control, ruta_archivo, parametros_imagen)
         
-        # Crear subdirectorio con fecha y hora actual
+        # Directorio principal para códigos QR optimizados y subdirectorio con fecha y
+        # hora actual; solo se crean si alguna imagen se escribe en ellos
+        directorio_qr_principal = "codigos_qr_optimizados"
+        if directorio_salida:
+            directorio_qr_principal = os.path.join(directorio_salida, directorio_qr_principal)
         ahora = datetime.now()
         nombre_subcarpeta = ahora.strftime("%Y-%m-%d_%H-%M-%S")
         directorio_qr = os.path.join(directorio_qr_principal, nombre_subcarpeta)
-        os.makedirs(directorio_qr)
+        if punto_control and escribir_carpeta:
+            # Reanudación: se sigue escribiendo en la carpeta de la ejecución interrumpida
+            directorio_qr = punto_control['directorio_qr']
+            os.makedirs(directorio_qr, exist_ok=True)
+            resumen['directorio_qr'] = os.path.abspath(directorio_qr)
         
-        # Cargar archivo Excel con pandas para lectura inicial
+        # Leer en streaming (una sola pasada por hoja) únicamente las columnas de entrada
+        metricas.etapa('lectura_ids')
         print(f"📖 Leyendo archivo {ruta_archivo}...")
-        df = pd.read_excel(ruta_archivo)
-        
-        # Identificar columna ID_Unico (columna L)
-        if 'ID_Unico' in df.columns:
-            id_col = 'ID_Unico'
-        elif len(df.columns) >= 12:  # Columna L sería la 12ª columna (0-indexed: 11)
-            id_col = df.columns[11]  # Índice 11 corresponde a la columna L
-        else:
-            print("❌ Error: No se pudo identificar la columna ID_Unico (L).")
-            print(f"💡 Columnas disponibles: {list(df.columns)}")
-            return
-        
-        print(f"✅ Usando columna '{id_col}' para generar códigos QR optimizados.")
+        try:
+            trabajos_resueltos = leer_columnas_trabajos(ruta_archivo, trabajos or [TRABAJO_DEFECTO])
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            resumen['error'] = str(e)
+            return resumen
+
+        for trabajo in trabajos_resueltos:
+            print(f"✅ Hoja '{trabajo['hoja']}': usando columna '{trabajo['nombre_columna']}' para "
+                  f"generar códigos QR optimizados en la columna {letra_columna(trabajo['salida'])}.")
+
+        # Preparar tareas de generación (una por celda con ID válido). Pre-paso por
+        # columna: se filtran los IDs vacíos y se limpian todos los nombres de una vez
+        for trabajo in trabajos_resueltos:
+            trabajo['textos'] = [(fila_excel, None if valor is None else str(valor))
+                                 for fila_excel, valor in trabajo.pop('filas')]
+        textos = trabajos_resueltos[0]['textos']
+        total_registros = sum(len(trabajo['textos']) for trabajo in trabajos_resueltos)
+        validos = [(trabajo, fila_excel, id_unico)
+                   for trabajo in trabajos_resueltos for fila_excel, id_unico in trabajo['textos']
+                   if id_unico is not None and id_unico.strip() != '' and id_unico != 'nan']
+        # Nombres únicos por ID en todo el libro: los que chocan tras la limpieza llevan
+        # sufijo hash, y un mismo ID en varias hojas comparte imagen
+        nombres_por_id = asignar_nombres_archivo([id_unico for _, _, id_unico in validos])
+
+        # DEBUG: Mostrar los primeros 3 registros (primer trabajo)
+        for fila_excel, id_unico in textos[:3]:
+            print(f"🔍 DEBUG - Fila {fila_excel - 1}: ID_Unico original = '{id_unico}'")
+            if id_unico in nombres_por_id:
+                print(f"✅ Nombre de archivo limpio: '{nombres_por_id[id_unico]}'")
+            else:
+                print(f"❌ ID vacío o inválido, saltando...")
         
-        # Contar registros totales y calcular dimensiones óptimas
-        total_registros = len(df)
-        dimensiones = calcular_dimensiones_optimas(total_registros)
+        metricas.contar('filas_leidas', total_registros)
+        metricas.contar('filas_omitidas', total_registros - len(validos))
+
+        # Calcular dimensiones óptimas según los registros de la hoja más grande
+        metricas.etapa('preparacion')
+        dimensiones = calcular_dimensiones_optimas(
+            max(len(trabajo['textos']) for trabajo in trabajos_resueltos))
         registros_exitosos = 0
         tamano_total = 0
         
         print(f"📊 Procesando {total_registros} registros con optimización para APIs...")
         print("🚀 OPTIMIZACIONES ACTIVAS:")
-        print("   ✅ Formato JPEG (75-80% menos tamaño)")
+        print(f"   ✅ Formato {describir_formato(formato)}"
+              f"{' (75-80% menos tamaño)' if formato in ('jpeg', 'jpeg_base') else ''}")
         print("   ✅ Sin metadatos EXIF")
         print("   ✅ Compresión optimizada")
         print("   ✅ Compatible con WhatsApp/Make/Respond.io")
@@ -303,54 +2770,156 @@ def procesar_excel_optimizado(ruta_archivo):
         print(f"   📐 Tamaño de imagen: {dimensiones['imagen_width']}x{dimensiones['imagen_height']} px")
         print(f"   🎯 {dimensiones['descripcion']}")
         print("-" * 80)
-        
-        # Generar códigos QR optimizados
-        print("🔄 Generando códigos QR optimizados...")
-        for indice, fila in df.iterrows():
-            # Mostrar progreso en tiempo real
-            progreso = (indice + 1) / total_registros * 100
-            sys.stdout.write(f"\r🔧 Generando QR: {indice + 1}/{total_registros} ({progreso:.1f}%) - Exitosos: {registros_exitosos}   ")
-            sys.stdout.flush()
-            
-            # Obtener ID_Unico
-            id_unico = str(fila[id_col])
-            
-            # DEBUG: Mostrar ID original
-            if indice < 3:  # Solo para los primeros 3 registros
-                print(f"\n🔍 DEBUG - Fila {indice + 1}: ID_Unico original = '{id_unico}'")
-            
-            # Verificar si hay datos válidos
-            if pd.isna(id_unico) or id_unico.strip() == '' or id_unico == 'nan':
-                if indice < 3:
-                    print(f"❌ ID vacío o inválido, saltando...")
+
+        def firma(id_unico):
+            return firma_fila_qr(id_unico, calidad, mascara, formato)
+
+        # Modo incremental: las filas sin cambios reutilizan la imagen ya incrustada
+        # en la salida anterior; solo se generan las filas nuevas o modificadas
+        reutilizadas = {}
+        imagenes_anteriores = {}
+        entradas_archivo_anterior = {}
+        if incremental:
+            salida_anterior, reutilizadas, imagenes_anteriores, entradas_archivo_anterior = \
+                _filas_reutilizables_qr(validos, nuevo_archivo, ruta_manifiesto, ruta_indice, ruta_zip,
+                                        archivo_imagenes, firma)
+
+        # La carpeta de la ejecución se crea solo si hay imágenes que escribir en ella:
+        # con --sin-carpeta, --archivo-imagenes o una ejecución incremental sin cambios
+        # no queda ninguna carpeta vacía
+        if escribir_carpeta and not punto_control and any(
+                clave_celda_qr(trabajo['hoja'], trabajo['salida'], fila_excel) not in reutilizadas
+                for trabajo, fila_excel, _ in validos):
+            if not os.path.exists(directorio_qr_principal):
+                os.makedirs(directorio_qr_principal, exist_ok=True)
+                print(f"📁 Creado directorio: {directorio_qr_principal}")
+            directorio_qr = crear_directorio_unico(directorio_qr)
+            resumen['directorio_qr'] = os.path.abspath(directorio_qr)
+        carpeta_creada = escribir_carpeta and os.path.isdir(directorio_qr)
+        filas_validas = [(trabajo, fila_excel, id_unico,
+                          os.path.join(directorio_qr, nombres_por_id[id_unico]))
+                         for trabajo, fila_excel, id_unico in validos]
+
+        # Todas las hojas van en una única lista de tareas, repartida por el mismo pool
+        tareas, posicion_tarea, reanudadas = _tareas_pendientes_qr(filas_validas, reutilizadas,
+                                                                   punto_control, firma)
+        if punto_control:
+            print(f"⏯️ Reanudación: {len(reanudadas)} imágenes reutilizadas, {len(tareas)} por generar")
+        metricas.contar('filas_reanudadas', len(reanudadas))
+
+        # Punto de control: imágenes escritas en la carpeta de la ejecución, guardado
+        # periódicamente para poder reanudar con --reanudar si el proceso se interrumpe
+        if escribir_carpeta:
+            punto_control_activo = PuntoControlQR(
+                ruta_punto_control, ruta_archivo, parametros_imagen, directorio_qr,
+                {os.path.basename(reanudadas[ruta][0]): {'firma': firma(id_unico), 'bytes': reanudadas[ruta][1]}
+                 for _, _, id_unico, ruta in filas_validas if ruta in reanudadas})
+
+        def registrar_en_punto_control(posicion, destino, tamano):
+            punto_control_activo.registrar(destino, firma(tareas[posicion][0]), tamano)
+
+        metricas.contar('filas_reutilizadas', len(reutilizadas))
+
+        # Generar códigos QR optimizados (caché + pool de procesos)
+        metricas.etapa('generacion_qr')
+        print(f"🔄 Generando códigos QR optimizados ({workers or os.cpu_count() or 1} procesos, "
+              f"lotes de {tamano_lote}, {hilos_escritura} hilos de escritura)...")
+        if en_memoria:
+            print(f"🧠 Modo en memoria: imágenes directas al Excel"
+                  f"{' (carpeta escrita en segundo plano)' if guardar_carpeta else ''}")
+
+        reportar_generacion = ReportadorProgreso(
+            "🔧 Generando QR: {completadas}/{total} ({porcentaje:.1f}%) - Exitosos: {exitosas}   ")
+
+        def mostrar_progreso(completadas, exitosas, total):
+            reportar_generacion(completadas, total, exitosas=exitosas)
+
+        resultados, aciertos_cache = generar_imagenes_qr(
+            tareas, calidad=calidad, workers=workers, tamano_lote=tamano_lote, usar_cache=usar_cache,
+            directorio_cache=directorio_cache, en_memoria=en_memoria,
+            guardar_archivos=guardar_carpeta, progreso=mostrar_progreso, metricas=metricas,
+            mascara=mascara, formato=formato, profundidad_cola=profundidad_cola,
+            hilos_escritura=hilos_escritura,
+            al_completar=registrar_en_punto_control if punto_control_activo else None,
+            imagen_excel=True)
+        if punto_control_activo:
+            punto_control_activo.guardar('insercion')
+        fallos_cache = len(tareas) - aciertos_cache
+        if usar_cache:
+            print(f"\n♻️ Caché: {aciertos_cache} aciertos, {fallos_cache} generados")
+
+        if escribir_carpeta:
+            metricas.contar('archivos_qr_escritos', sum(1 for resultado, *_ in resultados if resultado))
+
+        if usar_cache:
+            metricas.etapa('poda_cache')
+            eliminados, liberados = podar_cache_qr(directorio_cache, limite_cache_mb)
+            if eliminados:
+                print(f"\n🧹 Caché podada: {eliminados} archivos ({liberados/1024/1024:.1f} MB) eliminados")
+
+        # Imagen generada para cada celda, agrupada por hoja (alimenta directamente la
+        # inserción), e índice ID -> archivo de todas las filas del libro (también las
+        # reutilizadas, cuya imagen sigue en la carpeta anterior), sin consultar el disco
+        metricas.etapa('preparacion')
+        anclas_por_hoja = {trabajo['hoja']: [] for trabajo in trabajos_resueltos}
+        indice_imagenes = {}
+        imagenes_archivo = []
+        extensiones_usadas = {}
+        for trabajo, fila_excel, id_unico, ruta_archivo_qr in filas_validas:
+            indice = fila_excel - 2 if trabajo is trabajos_resueltos[0] else None
+            anclas = anclas_por_hoja[trabajo['hoja']]
+            clave = clave_celda_qr(trabajo['hoja'], trabajo['salida'], fila_excel)
+            if clave in reutilizadas:
+                resultado, tamano = reutilizadas[clave]
+                registros_exitosos += 1
+                tamano_total += tamano
+                anclas.append((fila_excel, trabajo['salida'], resultado))
+                if archivo_imagenes:
+                    imagenes_archivo.append((id_unico, os.path.basename(ruta_archivo_qr),
+                                             ParteXlsx(ruta_zip, entradas_archivo_anterior[id_unico])))
+                if escribir_carpeta and id_unico in imagenes_anteriores:
+                    indice_imagenes.setdefault(id_unico, imagenes_anteriores[id_unico])
                 continue
-            
-            # Limpiar nombre para archivo (usamos el ID_Unico para nombrar el archivo)
-            nombre_archivo = limpiar_nombre_archivo(id_unico)
-            if indice < 3:
-                print(f"✅ Nombre de archivo limpio: '{nombre_archivo}'")
-            
-            ruta_archivo_qr = os.path.join(directorio_qr, nombre_archivo)
-            
-            # Generar código QR optimizado usando el ID_Unico como contenido
-            resultado = generar_qr_optimizado(id_unico, ruta_archivo_qr, calidad=85)
+            if ruta_archivo_qr in reanudadas:
+                resultado, tamano = reanudadas[ruta_archivo_qr]
+                imagen_excel = resultado
+            else:
+                # WebP/SVG no se muestran en todas las versiones de Excel: el pool
+                # devuelve junto a cada imagen el PNG de 1 bit que se incrusta
+                resultado, tamano, imagen_excel = resultados[posicion_tarea[ruta_archivo_qr]]
             if resultado:
                 registros_exitosos += 1
-                tamano_total += os.path.getsize(resultado)
-                if indice < 3:
-                    print(f"✅ QR generado: {resultado} ({obtener_tamano_archivo(resultado)})")
+                tamano_total += tamano
+                anclas.append((fila_excel, trabajo['salida'], imagen_excel))
+                extension_qr = extension_de_datos(resultado, formato) if isinstance(resultado, bytes) \
+                    else os.path.splitext(resultado)[1].lower()
+                extensiones_usadas[extension_qr] = extensiones_usadas.get(extension_qr, 0) + 1
+                if archivo_imagenes:
+                    imagenes_archivo.append((id_unico, os.path.basename(ruta_archivo_qr), resultado))
+                if escribir_carpeta:
+                    indice_imagenes[id_unico] = ruta_archivo_qr + extension_qr
+                if indice is not None and indice < 3:
+                    if not en_memoria:
+                        descripcion = resultado
+                    elif escribir_carpeta:
+                        descripcion = ruta_archivo_qr + extension_qr
+                    else:
+                        descripcion = f"{id_unico} (en memoria)"
+                    print(f"\n✅ QR generado: {descripcion} ({tamano/1024:.1f} KB)")
             else:
-                if indice < 3:
-                    print(f"❌ Error generando QR para: {id_unico}")
-        
+                if indice is not None and indice < 3:
+                    print(f"\n❌ Error generando QR para: {id_unico}")
+
         print(f"\n✅ Códigos QR optimizados generados exitosamente!")
         print(f"📊 ESTADÍSTICAS DE OPTIMIZACIÓN:")
         print(f"   📁 Archivos generados: {registros_exitosos}/{total_registros}")
         print(f"   💾 Tamaño total: {tamano_total/1024:.1f} KB")
         if registros_exitosos > 0:
             print(f"   📈 Promedio por QR: {(tamano_total/registros_exitosos)/1024:.1f} KB")
-        print(f"   🎯 Reducción estimada vs PNG: ~75-80%")
-        print(f"   📂 Ubicación: {os.path.abspath(directorio_qr)}")
+        if formato in ('jpeg', 'jpeg_base'):
+            print(f"   🎯 Reducción estimada vs PNG: ~75-80%")
+        if carpeta_creada:
+            print(f"   📂 Ubicación: {os.path.abspath(directorio_qr)}")
         
         print("\n🔄 Insertando códigos QR CONTENIDOS en celdas Excel...")
         print("🎯 FUNCIONALIDADES AVANZADAS:")
@@ -360,80 +2929,83 @@ def procesar_excel_optimizado(ruta_archivo):
         print("   ✅ Se mueven con las celdas al copiar/pegar")
         print("   ✅ Dimensiones adaptativas según número de registros")
         
-        # Cargar el archivo con openpyxl para manipulación avanzada
-        wb = openpyxl.load_workbook(ruta_archivo)
-        ws = wb.active
-        
-        # Determinar índice de columna M (QR)
-        col_m_index = 13  # Columna M es la 13ª columna (1-indexed)
-        
-        # Insertar imágenes QR optimizadas CONTENIDAS en la columna M
-        print("🎨 Insertando imágenes con posicionamiento perfecto...")
-        for row in range(2, total_registros + 2):  # +2 porque Excel es 1-indexed y tiene cabecera
-            # Obtener ID_Unico de la columna L
-            id_unico = str(ws.cell(row=row, column=12).value)  # Columna L es la columna 12 (1-indexed)
-            
-            # Mostrar progreso de inserción
-            progreso = (row - 1) / total_registros * 100
-            sys.stdout.write(f"\r🎨 Insertando en Excel: {row-1}/{total_registros} ({progreso:.1f}%) - Procesadas: {row-1}   ")
-            sys.stdout.flush()
-            
-            if id_unico and id_unico != "None" and id_unico.strip() != '':
-                nombre_archivo = limpiar_nombre_archivo(id_unico)
-                # Buscar archivo .jpg optimizado
-                ruta_qr = os.path.join(directorio_qr, nombre_archivo + ".jpg")
-                
-                if os.path.exists(ruta_qr):
-                    # AVANZADO: Usar dimensiones calculadas automáticamente
-                    ws.row_dimensions[row].height = dimensiones['altura_celda']
-                    ws.column_dimensions[openpyxl.utils.get_column_letter(col_m_index)].width = dimensiones['ancho_celda']
-                    
-                    # Crear imagen QR con tamaño EXACTO calculado para la celda
-                    img = XLImage(ruta_qr)
-                    
-                    # CRÍTICO: Usar dimensiones calculadas para ajuste perfecto
-                    img.width = dimensiones['imagen_width']
-                    img.height = dimensiones['imagen_height']
-                    
-                    # AVANZADO: Anclar imagen a la celda específica
-                    cell_coordinate = openpyxl.utils.get_column_letter(col_m_index) + str(row)
-                    img.anchor = cell_coordinate
-                    
-                    # PERFECTO: Usar offsets calculados para centrado automático
-                    if hasattr(img, 'col_offset'):
-                        img.col_offset = dimensiones['offset_horizontal']
-                    if hasattr(img, 'row_offset'):
-                        img.row_offset = dimensiones['offset_vertical']
-                    
-                    # Insertar imagen con anclaje perfecto
-                    ws.add_image(img)
-                    
-                    # PROFESIONAL: Configurar alineación de celda
-                    cell = ws.cell(row=row, column=col_m_index)
-                    cell.alignment = Alignment(
-                        horizontal='center',
-                        vertical='center',
-                        wrap_text=False
-                    )
+        inicio_guardado = time.time()
+        registro_medias = {}
+        # El libro se escribe en un archivo parcial y solo se publica completo:
+        # una caída durante el guardado nunca deja un Excel de salida truncado
+        ruta_parcial = f"{nombre_base}_con_QR_optimizado.parcial{extension}"
+        if modo_escritura == 'streaming':
+            # Filas e imágenes se escriben incrementalmente (memoria constante)
+            print("🎨 Escribiendo Excel en modo streaming...")
+            metricas.etapa('escritura_streaming')
+            estadisticas_imagenes = guardar_excel_streaming(ruta_archivo, ruta_parcial,
+                                                            anclas_por_hoja, dimensiones,
+                                                            registro_medias=registro_medias)
+        else:
+            estadisticas_imagenes = _insertar_imagenes_openpyxl(ruta_archivo, ruta_parcial, anclas_por_hoja,
+                                                                dimensiones, registro_medias, metricas)
+        os.replace(ruta_parcial, nuevo_archivo)
+        ruta_parcial = None
+        if punto_control_activo:
+            punto_control_activo.guardar('guardado')
+        tiempo_guardado = time.time() - inicio_guardado
+        metricas.contar('bytes_excel', os.path.getsize(nuevo_archivo))
+        metricas.contar('bytes_qr', tamano_total)
+        if estadisticas_imagenes:
+            metricas.contar('imagenes_incrustadas', estadisticas_imagenes['imagenes'])
         
-        # Guardar el archivo Excel optimizado con un nuevo nombre
-        nombre_base, extension = os.path.splitext(ruta_archivo)
-        nuevo_archivo = f"{nombre_base}_con_QR_optimizado{extension}"
-        wb.save(nuevo_archivo)
+        # Archivo de imágenes: un único ZIP secuencial en lugar de un archivo por ID
+        if archivo_imagenes:
+            metricas.etapa('archivo_imagenes')
+            resumen['archivo_imagenes'] = os.path.abspath(ruta_zip)
+        estadisticas_archivo = _actualizar_archivo_imagenes(
+            ruta_zip, imagenes_archivo if archivo_imagenes else None, formato)
+
+        # Índice persistente ID -> imagen y manifiesto para la próxima ejecución incremental
+        metricas.etapa('manifiesto')
+        guardar_indice_imagenes_qr(ruta_indice, ruta_archivo, indice_imagenes,
+                                   directorio_qr if carpeta_creada else None)
+        _guardar_manifiesto_filas(ruta_manifiesto, ruta_archivo, filas_validas, registro_medias, firma)
+        if salida_anterior:
+            os.remove(salida_anterior)
+            salida_anterior = None
+        if punto_control_activo:
+            # Ejecución completa: el punto de control ya no es necesario
+            punto_control_activo.eliminar()
+            punto_control_activo = None
+        metricas.cerrar()
         
         # Mostrar resumen final completo
         print(f"\n\n🎉 PROCESO COMPLETADO CON ÉXITO!")
         print("=" * 80)
         print(f"📊 RESUMEN FINAL:")
         print(f"   ✅ {registros_exitosos}/{total_registros} códigos QR optimizados generados")
-        print(f"   📁 Archivos QR guardados en: {os.path.abspath(directorio_qr)}")
+        if carpeta_creada:
+            print(f"   📁 Archivos QR guardados en: {os.path.abspath(directorio_qr)}")
+        if estadisticas_archivo:
+            print(f"   📦 Archivo de imágenes: {resumen['archivo_imagenes']} "
+                  f"({estadisticas_archivo['imagenes']} imágenes, {obtener_tamano_archivo(resumen['archivo_imagenes'])})")
         print(f"   📄 Excel optimizado: {nuevo_archivo}")
         if registros_exitosos > 0:
             print(f"   💾 Tamaño promedio por QR: {(tamano_total/registros_exitosos)/1024:.1f} KB")
         print(f"   📐 Configuración usada: {dimensiones['descripcion']}")
+        if usar_cache:
+            print(f"   ♻️ Caché: {aciertos_cache} aciertos / {fallos_cache} fallos")
+        if estadisticas_imagenes:
+            print(f"   🧬 Imágenes incrustadas: {estadisticas_imagenes['imagenes']} únicas para "
+                  f"{estadisticas_imagenes['anclas']} filas "
+                  f"({estadisticas_imagenes['bytes_ahorrados']/1024:.1f} KB ahorrados por deduplicación)")
+        print(f"   ⏱️ Guardado del Excel: {tiempo_guardado:.2f} s ({obtener_tamano_archivo(nuevo_archivo)})")
+        print(f"   ⏱️ Tiempos por etapa (pared / CPU):")
+        for etapa, tiempos in metricas.etapas.items():
+            print(f"      • {etapa}: {tiempos['pared_s']:.2f} s / {tiempos['cpu_s']:.2f} s")
+        latencia = metricas.histogramas.get('latencia_qr')
+        if latencia and latencia['cuenta']:
+            print(f"   ⏱️ Latencia por QR: media {latencia['suma'] / latencia['cuenta'] * 1000:.2f} ms, "
+                  f"máxima {latencia['maximo'] * 1000:.2f} ms")
         
         print(f"\n🚀 OPTIMIZACIONES APLICADAS:")
-        print(f"   ✅ Formato JPEG para menor tamaño (vs PNG)")
+        print(f"   ✅ Formato {describir_formato(formato, extensiones_usadas)}")
         print(f"   ✅ Metadatos EXIF completamente eliminados")
         print(f"   ✅ Compatible con APIs: WhatsApp/Make/Respond.io")
         print(f"   ✅ Compresión optimizada para transmisión")
@@ -449,10 +3021,33 @@ def procesar_excel_optimizado(ruta_archivo):
         print(f"   🟢 Metadatos: Completamente eliminados ✓")
         print("=" * 80)
         
+        # Las filas con ID vacío se omiten por diseño; solo cuentan como fallo los QR no generados
+        resumen.update(exito=registros_exitosos == len(filas_validas),
+                       salida=os.path.abspath(nuevo_archivo), registros=total_registros,
+                       qr_generados=registros_exitosos, cache_aciertos=aciertos_cache)
+        if not resumen['exito']:
+            resumen['error'] = f"{len(filas_validas) - registros_exitosos} códigos QR no generados"
+        return resumen
+        
     except Exception as e:
         print(f"\n❌ Error crítico al procesar el archivo Excel:")
         print(f"   🔍 Detalle: {str(e)}")
         print(f"   💡 Sugerencia: Verificar que el archivo no esté abierto en Excel")
+        # Restaurar la salida anterior para poder repetir la ejecución incremental
+        if salida_anterior and os.path.exists(salida_anterior):
+            os.replace(salida_anterior, nuevo_archivo)
+        if ruta_parcial and os.path.exists(ruta_parcial):
+            os.remove(ruta_parcial)
+        # Conservar el trabajo hecho para continuar con --reanudar
+        if punto_control_activo:
+            try:
+                punto_control_activo.guardar()
+                print("   💡 Progreso guardado: ejecute de nuevo con --reanudar para continuar")
+            except OSError:
+                pass
+        metricas.cerrar()
+        resumen['error'] = str(e)
+        return resumen
 
 def mostrar_ayuda():
     """
@@ -480,9 +3075,335 @@ def mostrar_ayuda():
     print("   • Respond.io: ✅")
     print("=" * 60)
 
-def main():
+def expandir_entradas(entradas, recursivo=False):
+    """
+    Convierte archivos, directorios y patrones glob en la lista de Excel a procesar.
+    Omite las salidas ya generadas (*_con_QR_optimizado) y los bloqueos de Office (~$).
+
+    Args:
+        entradas (list): Rutas, directorios o patrones (p. ej. "datos/*.xlsx")
+        recursivo (bool): Buscar también en subdirectorios de los directorios indicados
+
+    Returns:
+        list: Rutas únicas en el orden en que se indicaron
+    """
+    archivos = []
+    vistos = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            patron = os.path.join(entrada, "**", "*.xlsx") if recursivo else os.path.join(entrada, "*.xlsx")
+            candidatos = sorted(glob.glob(patron, recursive=recursivo))
+        elif glob.has_magic(entrada):
+            candidatos = sorted(glob.glob(entrada, recursive=True))
+        else:
+            candidatos = [entrada]
+        for ruta in candidatos:
+            nombre = os.path.splitext(os.path.basename(ruta))[0]
+            if nombre.endswith("_con_QR_optimizado") or nombre.startswith("~$"):
+                continue
+            clave = os.path.abspath(ruta)
+            if clave not in vistos:
+                vistos.add(clave)
+                archivos.append(ruta)
+    return archivos
+
+def ejecutar_con_perfil(funcion, perfil, ruta_perfil=None, metricas=None):
+    """
+    Ejecuta `funcion` bajo cProfile o tracemalloc e imprime un resumen.
+    Solo se perfila el proceso principal (no los procesos de trabajo del pool).
+
+    Args:
+        funcion (callable): Función sin argumentos a ejecutar
+        perfil (str): 'cprofile', 'tracemalloc' o None (sin perfilado)
+        ruta_perfil (str, optional): Archivo .prof donde guardar el perfil de cProfile
+        metricas (MetricasEjecucion, optional): Recibe el pico de memoria de tracemalloc
+
+    Returns:
+        El valor devuelto por `funcion`
+    """
+    if perfil == 'cprofile':
+        import cProfile
+        import pstats
+        perfilador = cProfile.Profile()
+        resultado = perfilador.runcall(funcion)
+        if ruta_perfil:
+            perfilador.dump_stats(ruta_perfil)
+            print(f"\n🔬 Perfil cProfile guardado en: {ruta_perfil}")
+        pstats.Stats(perfilador, stream=sys.stdout).sort_stats('cumulative').print_stats(25)
+        return resultado
+
+    if perfil == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            resultado = funcion()
+            _, pico = tracemalloc.get_traced_memory()
+            instantanea = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        if metricas is not None:
+            metricas.contar('pico_memoria_bytes', pico)
+        print(f"\n🔬 Pico de memoria (tracemalloc): {pico / 1024 / 1024:.1f} MB")
+        for estadistica in instantanea.statistics('lineno')[:10]:
+            print(f"   {estadistica}")
+        return resultado
+
+    return funcion()
+
+def _procesar_archivo_lote(ruta_archivo, opciones, silencioso=False, perfil=None):
+    """
+    Procesa un archivo del modo por lotes. La salida detallada va a stderr (o se
+    descarta) para dejar stdout libre para el resumen.
+
+    Returns:
+        dict: Resumen de procesar_excel_optimizado() con el tiempo empleado y las métricas
+    """
+    destino = open(os.devnull, "w") if silencioso else sys.stderr
+    metricas = MetricasEjecucion()
+    ruta_perfil = None
+    if perfil == 'cprofile':
+        nombre = os.path.splitext(os.path.basename(ruta_archivo))[0]
+        ruta_perfil = os.path.join(opciones.get('directorio_salida') or os.path.dirname(ruta_archivo),
+                                   f"{nombre}_perfil.prof")
+    inicio = time.time()
+    try:
+        with contextlib.redirect_stdout(destino):
+            resumen = ejecutar_con_perfil(
+                lambda: procesar_excel_optimizado(ruta_archivo, metricas=metricas, **opciones),
+                perfil, ruta_perfil, metricas)
+    finally:
+        if silencioso:
+            destino.close()
+    resumen['segundos'] = round(time.time() - inicio, 3)
+    resumen['metricas'] = metricas.a_dict()
+    if ruta_perfil and os.path.exists(ruta_perfil):
+        resumen['perfil'] = os.path.abspath(ruta_perfil)
+    return resumen
+
+def guardar_metricas(ruta, resumenes):
+    """
+    Escribe las métricas de cada archivo en JSON o, si la ruta termina en .prom,
+    en el formato de texto de Prometheus.
+
+    Args:
+        ruta (str): Archivo de destino
+        resumenes (list): Resúmenes devueltos por procesar_lote()
+    """
+    con_metricas = [(resumen['archivo'], resumen['metricas'])
+                    for resumen in resumenes if resumen.get('metricas')]
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        if ruta.endswith('.prom'):
+            archivo.write(metricas_a_prometheus(con_metricas))
+        else:
+            json.dump({'archivos': [{'archivo': nombre, 'metricas': metricas}
+                                    for nombre, metricas in con_metricas]},
+                      archivo, ensure_ascii=False, indent=2)
+
+def procesar_lote(archivos, opciones, archivos_paralelos=1, silencioso=False, perfil=None):
+    """
+    Procesa varios archivos Excel, opcionalmente varios a la vez en procesos separados.
+
+    Args:
+        archivos (list): Rutas de los archivos Excel
+        opciones (dict): Argumentos para procesar_excel_optimizado()
+        archivos_paralelos (int): Archivos procesados simultáneamente
+        silencioso (bool): Descartar la salida detallada de cada archivo
+        perfil (str, optional): 'cprofile' o 'tracemalloc' para perfilar cada archivo
+
+    Returns:
+        list: Resúmenes en el mismo orden que `archivos`
+    """
+    if archivos_paralelos <= 1 or len(archivos) <= 1:
+        return [_procesar_archivo_lote(ruta, opciones, silencioso, perfil) for ruta in archivos]
+
+    resumenes = [None] * len(archivos)
+    with ProcessPoolExecutor(max_workers=min(archivos_paralelos, len(archivos))) as executor:
+        futuros = {executor.submit(_procesar_archivo_lote, ruta, opciones, silencioso, perfil): indice
+                   for indice, ruta in enumerate(archivos)}
+        for futuro in as_completed(futuros):
+            indice = futuros[futuro]
+            try:
+                resumenes[indice] = futuro.result()
+            except Exception as e:
+                resumenes[indice] = {'archivo': archivos[indice], 'exito': False, 'error': str(e)}
+    return resumenes
+
+def crear_parser():
+    """
+    Construye el parser de la línea de comandos (modo no interactivo).
+    """
+    def tipo_trabajo(texto):
+        try:
+            return parsear_trabajo(texto)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    parser = argparse.ArgumentParser(
+        prog="generador_qr_app.py",
+        description="Generador de códigos QR optimizado. Sin argumentos abre el menú interactivo.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_procesar = subparsers.add_parser(
+        "procesar", help="Procesa uno o varios Excel sin preguntas",
+        description="Procesa archivos, directorios o patrones glob e imprime un resumen JSON en stdout.")
+    p_procesar.add_argument("entradas", nargs="+", help="Archivos .xlsx, directorios o patrones glob")
+    p_procesar.add_argument("-r", "--recursivo", action="store_true",
+                            help="Buscar .xlsx en subdirectorios de los directorios indicados")
+    p_procesar.add_argument("-o", "--salida", dest="directorio_salida",
+                            help="Directorio para los Excel de salida y las imágenes")
+    p_procesar.add_argument("--workers", type=int, help="Procesos para generar QR por archivo")
+    p_procesar.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO)
+    p_procesar.add_argument("--profundidad-cola", type=int,
+                            help="Lotes en vuelo entre codificación y escritura (por defecto, 2 por proceso)")
+    p_procesar.add_argument("--hilos-escritura", type=int, default=HILOS_ESCRITURA_DEFECTO,
+                            help="Hilos que escriben las imágenes en disco")
+    p_procesar.add_argument("--archivos-paralelos", type=int, default=1,
+                            help="Archivos procesados simultáneamente")
+    p_procesar.add_argument("--formato", choices=formatos_salida(), default="jpeg",
+                            help=f"Formato de imagen; 'auto' elige el más pequeño bajo {PRESUPUESTO_BYTES_AUTO // 1024} KB")
+    p_procesar.add_argument("--calidad", type=int, default=85, help="Calidad de compresión (1-100)")
+    p_procesar.add_argument("--mascara", choices=MODOS_MASCARA, default=MASCARA_QR_DEFECTO,
+                            help="'memo' reutiliza versión y máscara entre IDs de igual longitud (más rápido)")
+    p_procesar.add_argument("--modo-escritura", choices=MODOS_ESCRITURA, default="completo")
+    p_procesar.add_argument("--en-memoria", action="store_true",
+                            help="No pasar las imágenes por disco antes de incrustarlas")
+    p_procesar.add_argument("--sin-carpeta", action="store_true",
+                            help="No guardar la carpeta de imágenes (requiere --en-memoria)")
+    p_procesar.add_argument("--archivo-imagenes", action="store_true",
+                            help="Guardar las imágenes en un único ZIP sin compresión "
+                                 "(<salida>.imagenes.zip) en lugar de la carpeta")
+    p_procesar.add_argument("--sin-cache", action="store_true", help="Desactivar la caché de QR")
+    p_procesar.add_argument("--directorio-cache", default=DIRECTORIO_CACHE_DEFECTO)
+    p_procesar.add_argument("--limite-cache-mb", type=float, default=LIMITE_CACHE_MB_DEFECTO)
+    p_procesar.add_argument("--incremental", action="store_true",
+                            help="Regenerar solo las filas nuevas o modificadas")
+    p_procesar.add_argument("--reanudar", action="store_true",
+                            help="Continuar una ejecución interrumpida desde su punto de control")
+    p_procesar.add_argument("--trabajo", dest="trabajos", action="append", type=tipo_trabajo,
+                            metavar="HOJA:COLUMNA:SALIDA",
+                            help="Hoja y columna de entrada (encabezado o letra) -> columna de los QR; "
+                                 "repetible. Vacíos: hoja activa, ID_Unico (o L) y M")
+    p_procesar.add_argument("-q", "--silencioso", action="store_true",
+                            help="Descartar el detalle por archivo (solo el resumen JSON)")
+    p_procesar.add_argument("--metricas", metavar="RUTA",
+                            help="Guardar tiempos por etapa, contadores e histogramas "
+                                 "(JSON, o formato Prometheus si termina en .prom)")
+    p_procesar.add_argument("--perfil", choices=("cprofile", "tracemalloc"),
+                            help="Perfilar el proceso principal de cada archivo")
+
+    p_qr = subparsers.add_parser(
+        "qr", help="Genera un único código QR (arranque rápido, sin leer Excel)",
+        description="Genera la imagen de un código QR. Sin -o, la imagen se escribe en stdout.")
+    p_qr.add_argument("texto", help="Contenido del código QR (p. ej. un ID_Unico)")
+    p_qr.add_argument("-o", "--salida", help="Ruta de la imagen (la extensión se ajusta al formato)")
+    p_qr.add_argument("--formato", choices=formatos_salida(), default="png1",
+                      help="png1 no necesita NumPy: es el arranque más rápido")
+    p_qr.add_argument("--calidad", type=int, default=85)
+    p_qr.add_argument("--mascara", choices=MODOS_MASCARA, default=MASCARA_QR_DEFECTO)
+    return parser
+
+def ejecutar_qr(args):
+    """
+    Genera un único código QR (subcomando `qr`) sin abrir ningún Excel.
+
+    Args:
+        args (Namespace): Argumentos del subcomando
+
+    Returns:
+        int: Código de salida (0 = generado, 1 = error)
+    """
+    if args.salida:
+        ruta = generar_qr_optimizado(args.texto, args.salida, calidad=args.calidad,
+                                     mascara=args.mascara, formato=args.formato)
+        if not ruta:
+            return 1
+        print(f"✅ QR guardado en: {ruta} ({obtener_tamano_archivo(ruta)})")
+        return 0
+    datos = generar_qr_optimizado(args.texto, calidad=args.calidad, return_bytes=True,
+                                  mascara=args.mascara, formato=args.formato)
+    if not datos:
+        return 1
+    sys.stdout.buffer.write(datos)
+    sys.stdout.flush()
+    return 0
+
+def ejecutar_cli(argv):
+    """
+    Ejecuta el modo por lotes sin interacción.
+
+    Args:
+        argv (list): Argumentos de la línea de comandos
+
+    Returns:
+        int: Código de salida (0 = todo correcto, 1 = algún archivo falló, 2 = error de uso)
+    """
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.calidad <= 100:
+        parser.error("--calidad debe estar entre 1 y 100")
+    if args.comando == "qr":
+        return ejecutar_qr(args)
+    if args.sin_carpeta and not args.en_memoria:
+        parser.error("--sin-carpeta requiere --en-memoria")
+    if args.reanudar and (args.sin_carpeta or args.archivo_imagenes):
+        # El punto de control registra las imágenes de la carpeta de la ejecución
+        parser.error("--reanudar requiere la carpeta de imágenes (no se combina con "
+                     "--sin-carpeta ni --archivo-imagenes)")
+    try:
+        # Repeticiones evidentes sin abrir el Excel; la hoja activa indicada por su
+        # título se comprueba al leer cada libro
+        comprobar_salidas_trabajos(args.trabajos or [])
+    except ValueError as e:
+        parser.error(f"--trabajo repetido: {e}")
+
+    archivos = expandir_entradas(args.entradas, args.recursivo)
+    if not archivos:
+        print("❌ Error: Ninguna entrada coincide con archivos Excel.", file=sys.stderr)
+        return 2
+
+    opciones = {
+        'workers': args.workers,
+        'tamano_lote': args.tamano_lote,
+        'profundidad_cola': args.profundidad_cola,
+        'hilos_escritura': args.hilos_escritura,
+        'usar_cache': not args.sin_cache,
+        'directorio_cache': args.directorio_cache,
+        'limite_cache_mb': args.limite_cache_mb,
+        'modo_escritura': args.modo_escritura,
+        'en_memoria': args.en_memoria,
+        'guardar_carpeta': not args.sin_carpeta,
+        'archivo_imagenes': args.archivo_imagenes,
+        'incremental': args.incremental,
+        'reanudar': args.reanudar,
+        'trabajos': args.trabajos,
+        'calidad': args.calidad,
+        'mascara': args.mascara,
+        'formato': args.formato,
+        'directorio_salida': args.directorio_salida,
+    }
+    inicio = time.time()
+    resumenes = procesar_lote(archivos, opciones, args.archivos_paralelos, args.silencioso, args.perfil)
+    fallidos = sum(1 for resumen in resumenes if not resumen['exito'])
+    if args.metricas:
+        guardar_metricas(args.metricas, resumenes)
+    # Las métricas completas van solo a --metricas, nunca al resumen de stdout
+    for resumen in resumenes:
+        resumen.pop('metricas', None)
+
+    json.dump({
+        'archivos': resumenes,
+        'total': len(resumenes),
+        'exitosos': len(resumenes) - fallidos,
+        'fallidos': fallidos,
+        'segundos': round(time.time() - inicio, 3),
+    }, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 1 if fallidos else 0
+
+def menu_interactivo():
     """
-    Función principal del generador de códigos QR optimizado.
+    Menú interactivo del generador de códigos QR optimizado.
     """
     # Mensaje de bienvenida completo y profesional
     print("=" * 90)
@@ -568,5 +3489,20 @@ def main():
         print("\nPresione Enter para salir...")
         input()
 
+def main(argv=None):
+    """
+    Función principal: sin argumentos abre el menú interactivo; con argumentos
+    ejecuta el modo por lotes (ver `python generador_qr_app.py procesar --help`).
+
+    Returns:
+        int: Código de salida
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        menu_interactivo()
+        return 0
+    return ejecutar_cli(argv)
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
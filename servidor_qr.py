@@ -0,0 +1,630 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Servicio HTTP del Generador de Códigos QR
+-----------------------------------------
+Servidor asyncio de larga duración para integraciones (Make.com, Respond.io):
+las dependencias se importan una sola vez y la codificación se reparte en un
+pool de procesos, sin pagar el arranque de Python por cada lote.
+
+Uso:
+    python servidor_qr.py --puerto 8080 --workers 4
+
+Endpoints:
+    GET  /qr?id=<ID>&formato=png1&calidad=85&mascara=optima
+         Imagen del código QR (bytes, con su Content-Type)
+    POST /lote?formato=png1
+         Cuerpo JSON {"ids": [...], "formato": ..., "calidad": ..., "mascara": ...},
+         un archivo .xlsx (se lee la columna ID_Unico) o un formulario
+         multipart/form-data con el .xlsx. Respuesta NDJSON en streaming: una
+         línea por ID según se completa y una línea final de resumen
+    GET  /salud
+         Estado del servicio y contadores
+
+Ejemplo:
+    curl -o qr.png "http://127.0.0.1:8080/qr?id=ABC123&formato=png1"
+    curl --data-binary @datos.xlsx "http://127.0.0.1:8080/lote?formato=png1"
+    curl -F archivo=@datos.xlsx -F formato=png1 "http://127.0.0.1:8080/lote"
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+import functools
+from collections import OrderedDict
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ProcessPoolExecutor
+
+import generador_qr_app as app
+
+# Imágenes recientes conservadas en memoria (un PNG de 1 bit ocupa ~220 bytes)
+CAPACIDAD_LRU_DEFECTO = 10000
+
+# Límites de la petición HTTP
+TAMANO_MAXIMO_CUERPO = 50 * 1024 * 1024
+TAMANO_MAXIMO_ENCABEZADOS = 64 * 1024
+MAXIMO_IDS_LOTE = 100000
+
+TIPOS_CONTENIDO = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+}
+
+MOTIVOS_HTTP = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+class ErrorPeticion(Exception):
+    """
+    Error atribuible al cliente; se responde con su código HTTP y un JSON de error.
+    """
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def codificar_lote(textos, calidad, formato, mascara):
+    """
+    Codifica un lote de códigos QR en memoria dentro de un proceso del pool.
+
+    Returns:
+        list: Bytes de cada imagen (o None si no se pudo generar), en orden
+    """
+    return [app.generar_qr_optimizado(texto, calidad=calidad, return_bytes=True, mascara=mascara,
+                                      formato=formato)
+            for texto in textos]
+
+class ServicioQR:
+    """
+    Generación de códigos QR compartida entre peticiones concurrentes.
+
+    Las imágenes recientes se sirven desde una LRU en memoria; las peticiones
+    simultáneas del mismo código esperan a una única codificación en curso
+    (coalescencia) y el trabajo de CPU se envía por lotes al pool de procesos.
+    """
+
+    def __init__(self, workers=None, tamano_lote=app.TAMANO_LOTE_DEFECTO,
+                 capacidad_lru=CAPACIDAD_LRU_DEFECTO):
+        """
+        Args:
+            workers (int, optional): Procesos del pool (por defecto, núcleos disponibles)
+            tamano_lote (int): Códigos por envío al pool en el endpoint de lote
+            capacidad_lru (int): Imágenes conservadas en memoria
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.tamano_lote = max(1, tamano_lote)
+        self.capacidad_lru = capacidad_lru
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.lru = OrderedDict()
+        self.en_vuelo = {}
+        # Referencias a las codificaciones en curso: el bucle solo guarda referencias débiles
+        self.tareas = set()
+        self.inicio = time.time()
+        self.contadores = {
+            'peticiones': 0,
+            'qr_servidos': 0,
+            'qr_generados': 0,
+            'aciertos_lru': 0,
+            'coalescidas': 0,
+            'errores': 0,
+        }
+
+    def cerrar(self):
+        """
+        Detiene el pool de procesos.
+        """
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _desde_lru(self, clave):
+        """
+        Imagen de la LRU (marcada como usada recientemente) o None si no está.
+        """
+        datos = self.lru.get(clave)
+        if datos is not None:
+            self.lru.move_to_end(clave)
+            self.contadores['aciertos_lru'] += 1
+        return datos
+
+    def _guardar_lru(self, clave, datos):
+        """
+        Guarda una imagen en la LRU, expulsando las menos usadas si se supera la capacidad.
+        """
+        if self.capacidad_lru <= 0:
+            return
+        self.lru[clave] = datos
+        self.lru.move_to_end(clave)
+        while len(self.lru) > self.capacidad_lru:
+            self.lru.popitem(last=False)
+
+    def _pendientes(self, ids, calidad, formato, mascara):
+        """
+        Resuelve cada ID desde la LRU o desde una codificación en curso y envía
+        al pool, en lotes, los que faltan.
+
+        Returns:
+            list: Un asyncio.Future con los bytes (o None) por cada ID, en orden
+        """
+        bucle = asyncio.get_running_loop()
+        futuros = []
+        nuevos = []
+        for texto in ids:
+            clave = app.clave_cache_qr(texto, calidad, formato, app.MOTOR_RENDER_DEFECTO, mascara)
+            futuro = bucle.create_future()
+            datos = self._desde_lru(clave)
+            if datos is not None:
+                futuro.set_result(datos)
+            elif clave in self.en_vuelo:
+                # Coalescencia: mismo código ya en codificación (en esta u otra petición)
+                self.contadores['coalescidas'] += 1
+                futuro = self.en_vuelo[clave]
+            else:
+                self.en_vuelo[clave] = futuro
+                nuevos.append((texto, clave, futuro))
+            futuros.append(futuro)
+
+        for inicio in range(0, len(nuevos), self.tamano_lote):
+            lote = nuevos[inicio:inicio + self.tamano_lote]
+            tarea = asyncio.ensure_future(self._codificar_lote(lote, calidad, formato, mascara))
+            self.tareas.add(tarea)
+            tarea.add_done_callback(self.tareas.discard)
+        return futuros
+
+    async def _codificar_lote(self, lote, calidad, formato, mascara):
+        """
+        Codifica un lote en el pool y resuelve los futuros de sus IDs.
+
+        Args:
+            lote (list): Tuplas (texto, clave de caché, asyncio.Future)
+            calidad (int): Calidad de compresión (1-100)
+            formato (str): Formato de las imágenes
+            mascara (str): Modo de máscara ('optima' o 'memo')
+        """
+        bucle = asyncio.get_running_loop()
+        textos = [texto for texto, _, _ in lote]
+        try:
+            resultados = await bucle.run_in_executor(
+                self.pool, codificar_lote, textos, calidad, formato, mascara)
+        except Exception as e:
+            # Cada código del lote se resuelve como no generado (None): un futuro
+            # coalescido puede no tener ya a nadie esperándolo y una excepción sin
+            # recoger solo dejaría un aviso en el registro de asyncio
+            print(f"❌ Error codificando un lote de {len(lote)} códigos: {e}", file=sys.stderr)
+            resultados = [None] * len(lote)
+        for posicion, (_, clave, futuro) in enumerate(lote):
+            del self.en_vuelo[clave]
+            if futuro.done():
+                continue
+            datos = resultados[posicion]
+            if datos:
+                self.contadores['qr_generados'] += 1
+                self._guardar_lru(clave, datos)
+            futuro.set_result(datos)
+
+    async def obtener(self, texto, calidad=85, formato='png1', mascara=app.MASCARA_QR_DEFECTO):
+        """
+        Devuelve la imagen de un único código QR.
+
+        Returns:
+            bytes o None: Imagen codificada o None si no se pudo generar
+        """
+        (futuro,) = self._pendientes([texto], calidad, formato, mascara)
+        return await asyncio.shield(futuro)
+
+    async def generar_lote(self, ids, calidad=85, formato='png1', mascara=app.MASCARA_QR_DEFECTO):
+        """
+        Genera un lote de códigos y los entrega según se completan.
+
+        Yields:
+            tuple: (índice en `ids`, bytes o None)
+        """
+        futuros = self._pendientes(ids, calidad, formato, mascara)
+
+        async def esperar(indice, futuro):
+            return indice, await asyncio.shield(futuro)
+
+        for siguiente in asyncio.as_completed([esperar(i, f) for i, f in enumerate(futuros)]):
+            yield await siguiente
+
+    def estado(self):
+        """
+        Estado del servicio para /salud.
+        """
+        return {
+            'estado': 'ok',
+            'workers': self.workers,
+            'tamano_lote': self.tamano_lote,
+            'lru': {'entradas': len(self.lru), 'capacidad': self.capacidad_lru},
+            'en_vuelo': len(self.en_vuelo),
+            'segundos_activo': round(time.time() - self.inicio, 1),
+            'contadores': dict(self.contadores),
+        }
+
+def parametros_qr(consulta, cuerpo=None):
+    """
+    Extrae y valida los parámetros de imagen de la consulta (o del cuerpo JSON,
+    que tiene prioridad).
+
+    Args:
+        consulta (dict): Resultado de parse_qs de la URL
+        cuerpo (dict, optional): Cuerpo JSON de la petición
+
+    Returns:
+        tuple: (calidad, formato, mascara)
+    """
+    cuerpo = cuerpo or {}
+
+    def valor(nombre, defecto):
+        if nombre in cuerpo:
+            return cuerpo[nombre]
+        return consulta.get(nombre, [defecto])[0]
+
+    formato = valor('formato', 'png1')
+    if formato not in app.formatos_salida():
+        raise ErrorPeticion(400, f"formato no soportado: {formato} (use {', '.join(app.formatos_salida())})")
+    mascara = valor('mascara', app.MASCARA_QR_DEFECTO)
+    if mascara not in app.MODOS_MASCARA:
+        raise ErrorPeticion(400, f"mascara no soportada: {mascara} (use {', '.join(app.MODOS_MASCARA)})")
+    try:
+        calidad = int(valor('calidad', 85))
+    except (TypeError, ValueError):
+        raise ErrorPeticion(400, "calidad debe ser un entero")
+    if not 1 <= calidad <= 100:
+        raise ErrorPeticion(400, "calidad debe estar entre 1 y 100")
+    return calidad, formato, mascara
+
+def leer_ids_xlsx(contenido):
+    """
+    Lee la columna ID_Unico de un .xlsx recibido en el cuerpo de la petición,
+    con los mismos criterios que el procesamiento de archivos (se omiten vacíos).
+
+    Args:
+        contenido (bytes): Archivo .xlsx
+
+    Returns:
+        list: IDs en el orden de las filas
+    """
+    descriptor, ruta = tempfile.mkstemp(suffix='.xlsx')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        try:
+            _, _, filas_ids = app.leer_columna_ids(ruta)
+        except Exception as e:
+            raise ErrorPeticion(400, f"xlsx no válido: {e}")
+        if filas_ids is None:
+            raise ErrorPeticion(400, "no se encontró la columna ID_Unico (ni la columna L)")
+        ids = []
+        for _, valor in filas_ids:
+            id_unico = str(valor)
+            if valor is None or id_unico.strip() == '' or id_unico == 'nan':
+                continue
+            ids.append(id_unico)
+        return ids
+    finally:
+        os.remove(ruta)
+
+def leer_formulario(tipo_contenido, cuerpo):
+    """
+    Separa un cuerpo multipart/form-data (p. ej. `curl -F archivo=@datos.xlsx`)
+    en el archivo .xlsx y los campos de texto.
+
+    Args:
+        tipo_contenido (str): Encabezado Content-Type completo (con boundary)
+        cuerpo (bytes): Cuerpo de la petición
+
+    Returns:
+        tuple: (bytes del .xlsx o None, dict de campos {nombre: valor})
+    """
+    mensaje = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + tipo_contenido.encode('latin-1') + b'\r\n\r\n' + cuerpo)
+    if not mensaje.is_multipart():
+        raise ErrorPeticion(400, "formulario multipart no válido")
+    archivo = None
+    campos = {}
+    for parte in mensaje.iter_parts():
+        contenido = parte.get_payload(decode=True) or b''
+        if parte.get_filename() is not None or contenido.startswith(b'PK'):
+            if archivo is None:
+                archivo = contenido
+        else:
+            nombre = parte.get_param('name', header='content-disposition')
+            if nombre:
+                campos[nombre] = contenido.decode('utf-8').strip()
+    return archivo, campos
+
+async def leer_peticion(lector):
+    """
+    Lee una petición HTTP/1.1 (línea de petición, encabezados y cuerpo con
+    Content-Length).
+
+    Returns:
+        tuple o None: (método, destino, encabezados, cuerpo) o None si se cerró la conexión
+    """
+    try:
+        bloque = await lector.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise ErrorPeticion(413, "encabezados demasiado grandes")
+    lineas = bloque.decode('latin-1').split('\r\n')
+    try:
+        metodo, destino, _ = lineas[0].split(' ', 2)
+    except ValueError:
+        raise ErrorPeticion(400, "línea de petición no válida")
+    encabezados = {}
+    for linea in lineas[1:]:
+        if ':' in linea:
+            nombre, valor = linea.split(':', 1)
+            encabezados[nombre.strip().lower()] = valor.strip()
+    if 'chunked' in encabezados.get('transfer-encoding', '').lower():
+        raise ErrorPeticion(400, "use Content-Length (no se admite Transfer-Encoding: chunked)")
+    try:
+        longitud = int(encabezados.get('content-length', 0))
+    except ValueError:
+        raise ErrorPeticion(400, "Content-Length no válido")
+    if longitud > TAMANO_MAXIMO_CUERPO:
+        raise ErrorPeticion(413, f"cuerpo mayor de {TAMANO_MAXIMO_CUERPO // (1024 * 1024)} MB")
+    cuerpo = await lector.readexactly(longitud) if longitud else b''
+    return metodo.upper(), destino, encabezados, cuerpo
+
+def encabezados_respuesta(estado, tipo, longitud=None, extra=None):
+    """
+    Construye la línea de estado y los encabezados de una respuesta HTTP/1.1.
+
+    Args:
+        estado (int): Código de estado HTTP
+        tipo (str): Content-Type de la respuesta
+        longitud (int, optional): Content-Length; sin ella la respuesta usa
+            Transfer-Encoding: chunked
+        extra (dict, optional): Encabezados adicionales {nombre: valor}
+
+    Returns:
+        bytes: Encabezados terminados en la línea vacía
+    """
+    lineas = [f"HTTP/1.1 {estado} {MOTIVOS_HTTP.get(estado, '')}", f"Content-Type: {tipo}"]
+    if longitud is None:
+        lineas.append("Transfer-Encoding: chunked")
+    else:
+        lineas.append(f"Content-Length: {longitud}")
+    for nombre, valor in (extra or {}).items():
+        lineas.append(f"{nombre}: {valor}")
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode('latin-1')
+
+async def responder(escritor, estado, cuerpo, tipo='application/json', extra=None):
+    """
+    Envía una respuesta completa con Content-Length.
+
+    Args:
+        escritor (asyncio.StreamWriter): Conexión del cliente
+        estado (int): Código de estado HTTP
+        cuerpo (bytes o dict): Cuerpo de la respuesta; lo que no son bytes se envía como JSON
+        tipo (str): Content-Type (si el cuerpo son bytes)
+        extra (dict, optional): Encabezados adicionales {nombre: valor}
+    """
+    if not isinstance(cuerpo, bytes):
+        cuerpo = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+    escritor.write(encabezados_respuesta(estado, tipo, len(cuerpo), extra) + cuerpo)
+    await escritor.drain()
+
+async def atender_qr(servicio, escritor, consulta):
+    """
+    Atiende GET /qr: responde con la imagen de un único código QR.
+
+    Args:
+        servicio (ServicioQR): Servicio compartido
+        escritor (asyncio.StreamWriter): Conexión del cliente
+        consulta (dict): Parámetros de la URL (parse_qs)
+    """
+    textos = consulta.get('id')
+    if not textos or not textos[0].strip():
+        raise ErrorPeticion(400, "falta el parámetro id")
+    calidad, formato, mascara = parametros_qr(consulta)
+    datos = await servicio.obtener(textos[0], calidad, formato, mascara)
+    if not datos:
+        servicio.contadores['errores'] += 1
+        await responder(escritor, 500, {'error': 'no se pudo generar el código QR'})
+        return
+    servicio.contadores['qr_servidos'] += 1
+    tipo = TIPOS_CONTENIDO.get(app.extension_de_datos(datos, formato), 'application/octet-stream')
+    await responder(escritor, 200, datos, tipo,
+                    {'Cache-Control': 'public, max-age=31536000, immutable'})
+
+async def atender_lote(servicio, escritor, consulta, encabezados, cuerpo):
+    """
+    Atiende POST /lote: lee los IDs (JSON, .xlsx o formulario multipart) y
+    responde en NDJSON con una línea por código según se completa.
+
+    Args:
+        servicio (ServicioQR): Servicio compartido
+        escritor (asyncio.StreamWriter): Conexión del cliente
+        consulta (dict): Parámetros de la URL (parse_qs)
+        encabezados (dict): Encabezados de la petición (nombres en minúsculas)
+        cuerpo (bytes): Cuerpo de la petición
+    """
+    tipo = encabezados.get('content-type', '').split(';')[0].strip().lower()
+    if tipo == 'multipart/form-data':
+        archivo, campos = leer_formulario(encabezados['content-type'], cuerpo)
+        if archivo is None:
+            raise ErrorPeticion(400, "el formulario no incluye un archivo .xlsx")
+        calidad, formato, mascara = parametros_qr(consulta, campos)
+        ids = await asyncio.get_running_loop().run_in_executor(None, leer_ids_xlsx, archivo)
+    elif tipo == 'application/json' or cuerpo[:1] in (b'{', b'['):
+        try:
+            datos_json = json.loads(cuerpo or b'{}')
+        except ValueError:
+            raise ErrorPeticion(400, "JSON no válido")
+        if isinstance(datos_json, list):
+            datos_json = {'ids': datos_json}
+        ids = datos_json.get('ids')
+        if not isinstance(ids, list):
+            raise ErrorPeticion(400, "se esperaba {\"ids\": [...]}")
+        ids = [str(texto) for texto in ids]
+        calidad, formato, mascara = parametros_qr(consulta, datos_json)
+    elif cuerpo.startswith(b'PK'):
+        calidad, formato, mascara = parametros_qr(consulta)
+        # openpyxl es bloqueante: se lee en un hilo para no detener el bucle
+        ids = await asyncio.get_running_loop().run_in_executor(None, leer_ids_xlsx, cuerpo)
+    else:
+        raise ErrorPeticion(400, "envíe JSON {\"ids\": [...]}, un archivo .xlsx o un formulario multipart")
+    if len(ids) > MAXIMO_IDS_LOTE:
+        raise ErrorPeticion(413, f"máximo {MAXIMO_IDS_LOTE} IDs por lote")
+
+    # Respuesta NDJSON con codificación chunked: cada código se envía al completarse
+    escritor.write(encabezados_respuesta(200, 'application/x-ndjson'))
+    inicio = time.time()
+    generados = 0
+    try:
+        async for indice, datos in servicio.generar_lote(ids, calidad, formato, mascara):
+            if datos:
+                generados += 1
+                linea = {'indice': indice, 'id': ids[indice], 'extension': app.extension_de_datos(datos, formato),
+                         'bytes': len(datos), 'datos': base64.b64encode(datos).decode('ascii')}
+            else:
+                linea = {'indice': indice, 'id': ids[indice], 'error': 'no se pudo generar el código QR'}
+            escribir_fragmento(escritor, linea)
+            await escritor.drain()
+    except ConnectionError:
+        raise
+    except Exception as e:
+        # La respuesta ya empezó (200): el error se comunica como última línea del flujo
+        servicio.contadores['errores'] += 1
+        print(f"❌ Error generando el lote: {e}", file=sys.stderr)
+        escribir_fragmento(escritor, {'fin': True, 'error': 'error interno del servidor'})
+        escritor.write(b'0\r\n\r\n')
+        await escritor.drain()
+        return
+    servicio.contadores['qr_servidos'] += generados
+    servicio.contadores['errores'] += len(ids) - generados
+    escribir_fragmento(escritor, {'fin': True, 'total': len(ids), 'generados': generados,
+                                  'segundos': round(time.time() - inicio, 3)})
+    escritor.write(b'0\r\n\r\n')
+    await escritor.drain()
+
+def escribir_fragmento(escritor, objeto):
+    """
+    Escribe un objeto como una línea NDJSON en un fragmento de la codificación chunked.
+
+    Args:
+        escritor (asyncio.StreamWriter): Conexión del cliente
+        objeto (dict): Línea a enviar
+    """
+    linea = json.dumps(objeto, ensure_ascii=False).encode('utf-8') + b'\n'
+    escritor.write(f"{len(linea):x}\r\n".encode('ascii') + linea + b'\r\n')
+
+async def atender_conexion(servicio, lector, escritor):
+    """
+    Atiende las peticiones de una conexión (con keep-alive de HTTP/1.1).
+    """
+    try:
+        while True:
+            try:
+                peticion = await leer_peticion(lector)
+                if peticion is None:
+                    break
+                metodo, destino, encabezados, cuerpo = peticion
+                servicio.contadores['peticiones'] += 1
+                url = urlsplit(destino)
+                consulta = parse_qs(url.query)
+                if url.path == '/qr':
+                    if metodo != 'GET':
+                        raise ErrorPeticion(405, "use GET")
+                    await atender_qr(servicio, escritor, consulta)
+                elif url.path == '/lote':
+                    if metodo != 'POST':
+                        raise ErrorPeticion(405, "use POST")
+                    await atender_lote(servicio, escritor, consulta, encabezados, cuerpo)
+                elif url.path == '/salud':
+                    await responder(escritor, 200, servicio.estado())
+                else:
+                    raise ErrorPeticion(404, f"ruta desconocida: {url.path}")
+            except ErrorPeticion as e:
+                await responder(escritor, e.estado, {'error': str(e)}, extra={'Connection': 'close'})
+                break
+            if encabezados.get('connection', '').lower() == 'close':
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        servicio.contadores['errores'] += 1
+        print(f"❌ Error atendiendo la petición: {e}", file=sys.stderr)
+        try:
+            await responder(escritor, 500, {'error': 'error interno del servidor'},
+                            extra={'Connection': 'close'})
+        except ConnectionError:
+            pass
+    finally:
+        escritor.close()
+
+async def iniciar_servidor(servicio, host='127.0.0.1', puerto=8080):
+    """
+    Crea el servidor asyncio (puerto 0 = puerto libre elegido por el sistema).
+
+    Returns:
+        asyncio.Server: Servidor ya escuchando
+    """
+    return await asyncio.start_server(functools.partial(atender_conexion, servicio), host, puerto,
+                                      limit=TAMANO_MAXIMO_ENCABEZADOS)
+
+async def servir(host, puerto, workers, tamano_lote, capacidad_lru):
+    """
+    Arranca el servicio y atiende peticiones hasta que se detiene.
+
+    Args:
+        host (str): Dirección de escucha
+        puerto (int): Puerto (0 = elegir uno libre)
+        workers (int, optional): Procesos del pool (por defecto, núcleos disponibles)
+        tamano_lote (int): Códigos por envío al pool en el endpoint de lote
+        capacidad_lru (int): Imágenes conservadas en memoria
+    """
+    servicio = ServicioQR(workers, tamano_lote, capacidad_lru)
+    try:
+        servidor = await iniciar_servidor(servicio, host, puerto)
+        direccion = servidor.sockets[0].getsockname()
+        print(f"🚀 Servicio QR escuchando en http://{direccion[0]}:{direccion[1]} "
+              f"({servicio.workers} procesos, LRU de {capacidad_lru} imágenes)", flush=True)
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servicio.cerrar()
+
+def main(argv=None):
+    """
+    Punto de entrada del servicio.
+
+    Args:
+        argv (list, optional): Argumentos de la línea de comandos (por defecto, sys.argv)
+
+    Returns:
+        int: Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Servicio HTTP del generador de códigos QR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080, help="Puerto (0 = elegir uno libre)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tamano-lote", type=int, default=app.TAMANO_LOTE_DEFECTO)
+    parser.add_argument("--capacidad-lru", type=int, default=CAPACIDAD_LRU_DEFECTO,
+                        help="Imágenes recientes conservadas en memoria (0 = sin LRU)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(servir(args.host, args.puerto, args.workers, args.tamano_lote, args.capacidad_lru))
+    except KeyboardInterrupt:
+        print("\n👋 Servicio detenido")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Utilidades compartidas por las pruebas (ejecutar con `python -m pytest` desde la raíz).
+"""
+
+import os
+import sys
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generador_qr_app as app  # noqa: E402
+
+NS_TIPOS = "http://schemas.openxmlformats.org/package/2006/content-types"
+NS_RELACIONES = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def _relaciones(paquete, ruta_parte):
+    rels = ET.fromstring(paquete.read(app._ruta_rels(ruta_parte)))
+    return {rel.get('Id'): (rel.get('Type'), app._ruta_relacionada(ruta_parte, rel.get('Target')))
+            for rel in rels.iter('{%s}Relationship' % NS_RELACIONES)}
+
+
+def comprobar_paquete(ruta):
+    """
+    Comprueba la coherencia del paquete: cada relación apunta a una parte que
+    existe y cada parte de dibujo e imagen tiene su tipo de contenido.
+
+    Returns:
+        dict: {titulo_hoja: ruta de su parte de dibujo}
+    """
+    dibujos = {}
+    with zipfile.ZipFile(ruta) as paquete:
+        assert paquete.testzip() is None
+        nombres = set(paquete.namelist())
+        tipos = ET.fromstring(paquete.read('[Content_Types].xml'))
+        por_defecto = {tipo.get('Extension') for tipo in tipos.iter('{%s}Default' % NS_TIPOS)}
+        sustituciones = {tipo.get('PartName'): tipo.get('ContentType')
+                         for tipo in tipos.iter('{%s}Override' % NS_TIPOS)}
+        for titulo, ruta_hoja in app._partes_hojas_xlsx(paquete).items():
+            if app._ruta_rels(ruta_hoja) not in nombres:
+                continue
+            for tipo, destino in _relaciones(paquete, ruta_hoja).values():
+                assert destino in nombres, f"{ruta_hoja} apunta a {destino}, que no existe"
+                if tipo == app.TIPO_REL_DIBUJO:
+                    assert titulo not in dibujos, f"{titulo} tiene más de un dibujo"
+                    dibujos[titulo] = destino
+                    assert sustituciones.get('/' + destino) == app.TIPO_CONTENIDO_DIBUJO
+        for ruta_dibujo in dibujos.values():
+            for tipo, destino in _relaciones(paquete, ruta_dibujo).values():
+                assert destino in nombres
+                assert posixpath.splitext(destino)[1].lstrip('.') in por_defecto
+    return dibujos
+
+
+def anclas_de(hoja):
+    """Celdas (fila, columna) donde están ancladas las imágenes de una hoja."""
+    return sorted((imagen.anchor._from.row + 1, imagen.anchor._from.col + 1) for imagen in hoja._images)
+
+
+def crear_libro(ruta, ids, hojas_extra=None):
+    """
+    Crea un Excel con la estructura esperada (ID_Unico en la columna L).
+
+    Args:
+        ruta (str): Archivo a crear
+        ids (list): Valores de ID_Unico (None = celda vacía)
+        hojas_extra (dict, optional): {titulo: filas} con hojas adicionales
+    """
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Datos"
+    ws.append([f"Columna_{i}" for i in range(1, 12)] + ["ID_Unico"])
+    for numero, id_unico in enumerate(ids):
+        ws.append([f"dato_{numero}_{i}" for i in range(1, 12)] + [id_unico])
+    for titulo, filas in (hojas_extra or {}).items():
+        hoja = wb.create_sheet(titulo)
+        for fila in filas:
+            hoja.append(fila)
+    wb.save(ruta)
+    return ruta
+
+
+@pytest.fixture
+def opciones_rapidas(tmp_path):
+    """Opciones de procesar_excel_optimizado() sin procesos ni caché compartida."""
+    return {'workers': 1, 'usar_cache': False, 'directorio_salida': str(tmp_path / "salida"),
+            'directorio_cache': str(tmp_path / "cache")}
+
+
+@pytest.fixture(autouse=True)
+def directorio_trabajo(tmp_path, monkeypatch):
+    """Cada prueba trabaja en su propio directorio temporal."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,60 @@
+"""
+Pruebas de la suite de benchmarks y de su comparación contra una base.
+"""
+
+import copy
+import json
+
+import benchmark_qr
+
+
+def _resultados(total=1.0, codificacion=0.5, guardado=0.01, rss=100.0, filas=1000):
+    return {'casos': [{'filas': filas, 'longitud_id': 32, 'segundos_total': total,
+                       'etapas': {'lectura': 0.2, 'codificacion': codificacion, 'insercion': 0.2,
+                                  'guardado': guardado},
+                       'pico_rss_mb': rss}]}
+
+
+def test_comparar_con_base_respeta_el_umbral():
+    base = _resultados()
+    assert benchmark_qr.comparar_con_base(copy.deepcopy(base), base, 0.10) == []
+
+    # Dentro del umbral (+8%) y tiempos por debajo del ruido (0.01 s -> 0.04 s)
+    dentro = _resultados(total=1.08, codificacion=0.54, guardado=0.04, rss=109.0)
+    assert benchmark_qr.comparar_con_base(dentro, base, 0.10) == []
+
+    # Por encima del umbral: etapa, total y RSS
+    fuera = _resultados(total=1.2, codificacion=0.56, rss=111.0)
+    regresiones = benchmark_qr.comparar_con_base(fuera, base, 0.10)
+    assert len(regresiones) == 3
+    assert any("total 1.00 s → 1.20 s (+20%)" in regresion for regresion in regresiones)
+    assert any("codificacion 0.50 s → 0.56 s (+12%)" in regresion for regresion in regresiones)
+    assert any("RSS 100.0 MB → 111.0 MB" in regresion for regresion in regresiones)
+    # El mismo empeoramiento pasa con un umbral mayor
+    assert benchmark_qr.comparar_con_base(fuera, base, 0.25) == []
+
+    # Los casos que no están en la base no se comparan
+    assert benchmark_qr.comparar_con_base(_resultados(total=9.0, filas=10), base, 0.10) == []
+
+
+def test_suite_con_base(tmp_path, capsys):
+    ruta_resultados = str(tmp_path / "resultados.json")
+    comun = ["suite", "--tamanos", "5", "--longitudes", "8", "--workers", "2", "--tamano-lote", "2",
+             "--salida", ruta_resultados]
+    assert benchmark_qr.main(comun) == 0
+    with open(ruta_resultados, encoding="utf-8") as archivo:
+        resultados = json.load(archivo)
+    caso, = resultados['casos']
+    assert caso['exito'] and caso['filas'] == 5 and caso['longitud_id'] == 8
+
+    # Base holgada: pasa; base con la mitad de memoria: regresión y código 1
+    ruta_base = str(tmp_path / "base.json")
+    for factor, esperado in ((10.0, 0), (0.5, 1)):
+        base = copy.deepcopy(resultados)
+        base['casos'][0]['segundos_total'] *= factor
+        base['casos'][0]['etapas'] = {etapa: valor * factor for etapa, valor in caso['etapas'].items()}
+        base['casos'][0]['pico_rss_mb'] *= factor
+        with open(ruta_base, "w", encoding="utf-8") as archivo:
+            json.dump(base, archivo)
+        assert benchmark_qr.main(comun + ["--base", ruta_base, "--umbral", "0.10"]) == esperado
+    assert "regresiones frente a" in capsys.readouterr().out
@@ -0,0 +1,107 @@
+"""
+Pruebas de la caché persistente de QR.
+"""
+
+import os
+import shutil
+
+import pytest
+
+from conftest import app
+
+
+def _archivos_temporales(directorio):
+    return [nombre for nombre in os.listdir(directorio) if nombre.endswith(".tmp")]
+
+
+def test_copia_sin_enlaces_es_atomica(tmp_path, monkeypatch):
+    # Sistema de archivos sin enlaces duros (FAT/SMB) y caída a mitad de la copia
+    origen = tmp_path / "origen.png"
+    origen.write_bytes(b"\x89PNG" + b"x" * 1000)
+    destino = tmp_path / "destino.png"
+
+    def sin_enlaces(*_):
+        raise OSError("enlaces no soportados")
+
+    def copia_interrumpida(fuente, temporal):
+        with open(temporal, 'wb') as archivo:
+            archivo.write(b"\x89PN")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(os, "link", sin_enlaces)
+    monkeypatch.setattr(shutil, "copyfile", copia_interrumpida)
+    with pytest.raises(KeyboardInterrupt):
+        app._enlazar_o_copiar(str(origen), str(destino))
+    assert not destino.exists()
+    assert _archivos_temporales(tmp_path) == []
+
+    monkeypatch.undo()
+    monkeypatch.setattr(os, "link", sin_enlaces)
+    app._enlazar_o_copiar(str(origen), str(destino))
+    assert destino.read_bytes() == origen.read_bytes()
+
+
+def test_no_reescribe_un_inodo_enlazado(tmp_path):
+    # Un destino ya enlazado desde otra carpeta se reemplaza, no se sobrescribe
+    origen = tmp_path / "nuevo.png"
+    origen.write_bytes(b"nuevo")
+    destino = tmp_path / "destino.png"
+    otra_carpeta = tmp_path / "otra_ejecucion.png"
+    destino.write_bytes(b"anterior")
+    os.link(destino, otra_carpeta)
+
+    app._enlazar_o_copiar(str(origen), str(destino))
+    assert destino.read_bytes() == b"nuevo"
+    assert otra_carpeta.read_bytes() == b"anterior"
+
+
+def test_escritura_en_memoria_interrumpida_no_deja_entrada(tmp_path, monkeypatch):
+    directorio_cache = tmp_path / "cache"
+    clave = app.clave_cache_qr("ABC123")
+    ruta = app.ruta_cache_qr(str(directorio_cache), clave, ".png")
+
+    reemplazar = os.replace
+
+    def caida(*_):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(os, "replace", caida)
+    with pytest.raises(KeyboardInterrupt):
+        app._guardar_salida_qr(b"\x89PNG datos", None, str(directorio_cache), clave, ".png")
+    assert not os.path.exists(ruta)
+    assert _archivos_temporales(os.path.dirname(ruta)) == []
+
+    monkeypatch.setattr(os, "replace", reemplazar)
+    app._guardar_salida_qr(b"\x89PNG datos", None, str(directorio_cache), clave, ".png")
+    assert app.cache_leer(str(directorio_cache), clave, ".png") == b"\x89PNG datos"
+
+
+def test_copias_desde_cache_respetan_la_contrapresion(tmp_path, monkeypatch):
+    # Los aciertos de caché también ocupan un hueco de la cola de escritura
+    import threading
+    import time
+
+    directorio_cache = str(tmp_path / "cache")
+    tareas = [(f"ID-{numero}", str(tmp_path / f"qr_{numero}")) for numero in range(8)]
+    app.generar_imagenes_qr(tareas, workers=1, directorio_cache=directorio_cache)
+
+    copiar = app._copiar_desde_cache
+    activas = {'ahora': 0, 'maximo': 0}
+    cerrojo = threading.Lock()
+
+    def copia_lenta(*argumentos):
+        with cerrojo:
+            activas['ahora'] += 1
+            activas['maximo'] = max(activas['maximo'], activas['ahora'])
+        time.sleep(0.01)
+        with cerrojo:
+            activas['ahora'] -= 1
+        return copiar(*argumentos)
+
+    monkeypatch.setattr(app, "_copiar_desde_cache", copia_lenta)
+    otra = [(texto, ruta + "_b") for texto, ruta in tareas]
+    resultados, aciertos = app.generar_imagenes_qr(otra, workers=1, directorio_cache=directorio_cache,
+                                                   profundidad_cola=1, hilos_escritura=4)
+    assert aciertos == len(tareas)
+    assert activas['maximo'] == 1
+    assert all(os.path.exists(ruta) for ruta, _ in resultados)
@@ -0,0 +1,38 @@
+"""
+Pruebas de la canalización de generación (generar_imagenes_qr): el número de
+procesos no cambia las imágenes.
+"""
+
+import os
+
+import pytest
+
+from conftest import app
+
+# IDs de varias formas (longitudes y modos) repartidos entre lotes
+IDS = ([f"{numero:08d}" for numero in range(12)] + [f"ID-{numero:04d}" for numero in range(12)]
+       + [f"https://ejemplo.com/qr/{numero}" + "x" * numero * 7 for numero in range(8)])
+
+
+def _imagenes(tmp_path, workers, **opciones):
+    # Memoria de formas vacía en cada ejecución (los procesos del pool la heredan)
+    app._FORMAS_QR.clear()
+    directorio = tmp_path / f"workers_{workers}"
+    directorio.mkdir()
+    tareas = [(id_unico, str(directorio / f"qr_{posicion}")) for posicion, id_unico in enumerate(IDS)]
+    resultados, _ = app.generar_imagenes_qr(tareas, workers=workers, tamano_lote=3, usar_cache=False,
+                                            **opciones)
+    imagenes = []
+    for ruta, tamano in resultados:
+        with open(ruta, 'rb') as archivo:
+            imagenes.append((os.path.basename(ruta), archivo.read()))
+        assert tamano == len(imagenes[-1][1])
+    return imagenes
+
+
+@pytest.mark.parametrize("formato", ['jpeg', 'png1', 'webp', 'svg', 'auto'])
+@pytest.mark.parametrize("mascara", app.MODOS_MASCARA)
+def test_varios_procesos_dan_las_mismas_imagenes(tmp_path, formato, mascara, monkeypatch):
+    monkeypatch.setattr(app, "_FORMAS_QR", app.OrderedDict())
+    en_serie = _imagenes(tmp_path, 1, formato=formato, mascara=mascara)
+    assert _imagenes(tmp_path, 3, formato=formato, mascara=mascara) == en_serie
@@ -0,0 +1,78 @@
+"""
+Pruebas de la línea de comandos (modo no interactivo).
+"""
+
+import json
+
+import pytest
+
+from conftest import app, crear_libro
+
+
+def test_metricas_fuera_del_resumen(tmp_path, capsys):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-1"])
+    comun = ["procesar", origen, "-o", str(tmp_path / "salida"), "--workers", "1", "--sin-cache", "-q"]
+
+    for extra in ([], ["--metricas", str(tmp_path / "metricas.json")]):
+        assert app.ejecutar_cli(comun + extra) == 0
+        resumen = json.loads(capsys.readouterr().out)
+        archivo, = resumen['archivos']
+        assert 'metricas' not in archivo
+        assert archivo['qr_generados'] == 3
+
+    with open(tmp_path / "metricas.json", encoding='utf-8') as entrada:
+        metricas, = json.load(entrada)['archivos']
+    # Dos IDs distintos codificados para tres filas
+    assert metricas['metricas']['contadores']['imagenes_codificadas'] == 2
+
+
+def test_trabajos_con_la_misma_salida(tmp_path, capsys):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1"])
+    with pytest.raises(SystemExit) as salida:
+        app.ejecutar_cli(["procesar", origen, "--trabajo", "Datos:ID_Unico:M", "--trabajo", "Datos:A:m"])
+    assert salida.value.code == 2
+    assert "--trabajo repetido" in capsys.readouterr().err
+
+    # La hoja activa y su título explícito son la misma hoja
+    resumen = app.procesar_excel_optimizado(origen, workers=1, usar_cache=False, trabajos=[
+        app.parsear_trabajo("::M"), app.parsear_trabajo("Datos:A:M")])
+    assert not resumen['exito']
+    assert "columna M de la hoja 'Datos'" in resumen['error']
+
+    # La misma comprobación en ambos casos; la columna se compara sin distinguir mayúsculas
+    with pytest.raises(ValueError, match="columna M de la hoja activa"):
+        app.comprobar_salidas_trabajos([app.TrabajoQR(None, None, 'M'), app.TrabajoQR(None, 'A', 'm')])
+    app.comprobar_salidas_trabajos([app.TrabajoQR(None, None, 'M'), app.TrabajoQR('Otra', None, 'M')])
+
+
+@pytest.mark.parametrize("opciones", [["--en-memoria", "--sin-carpeta"], ["--archivo-imagenes"]])
+def test_reanudar_sin_carpeta_es_un_error_de_uso(tmp_path, capsys, opciones):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1"])
+    with pytest.raises(SystemExit) as salida:
+        app.ejecutar_cli(["procesar", origen, "--reanudar"] + opciones)
+    assert salida.value.code == 2
+    assert "--reanudar requiere la carpeta de imágenes" in capsys.readouterr().err
+
+
+def test_resumen_json_intacto_con_procesos_spawn(tmp_path):
+    # Con spawn/forkserver los procesos del pool no heredan la redirección de stdout
+    import os
+    import subprocess
+    import sys
+
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "x" * 4000, "ID-2"])
+    programa = ("import multiprocessing, sys; multiprocessing.set_start_method('spawn'); "
+                "import generador_qr_app as app; sys.exit(app.main(sys.argv[1:]))")
+    proceso = subprocess.run(
+        [sys.executable, "-c", programa, "procesar", origen, "-o", str(tmp_path / "salida"),
+         "--workers", "2", "--tamano-lote", "1", "--sin-cache"],
+        cwd=str(tmp_path), capture_output=True, text=True, encoding='utf-8', timeout=300,
+        env=dict(os.environ, PYTHONPATH=raiz, PYTHONIOENCODING='utf-8'))
+    assert proceso.returncode == 1, proceso.stderr
+    resumen = json.loads(proceso.stdout)
+    archivo, = resumen['archivos']
+    assert archivo['qr_generados'] == 2
+    assert archivo['error'] == "1 códigos QR no generados"
+    # El diagnóstico del proceso de trabajo sigue visible, en stderr
+    assert "Error al generar QR optimizado" in proceso.stderr
@@ -0,0 +1,90 @@
+"""
+Pruebas del modo de escritura en streaming (guardar_excel_streaming()).
+"""
+
+import zipfile
+
+import openpyxl
+from openpyxl.comments import Comment
+from openpyxl.drawing.image import Image as XLImage
+
+from conftest import app, anclas_de, comprobar_paquete, crear_libro
+
+
+def _valores(ruta):
+    wb = openpyxl.load_workbook(ruta)
+    return {hoja.title: [list(fila) for fila in hoja.iter_rows(values_only=True)] for hoja in wb.worksheets}
+
+
+def _medias(ruta):
+    with zipfile.ZipFile(ruta) as paquete:
+        return sorted(paquete.read(n) for n in paquete.namelist() if n.startswith('xl/media/'))
+
+
+def test_conserva_valores_y_formulas_de_todas_las_hojas(tmp_path):
+    origen = crear_libro(str(tmp_path / "origen.xlsx"), ["A1", "B2", None, "C3"],
+                         hojas_extra={"Tickets": [["Ticket", "Total"], ["T-1", "=1+1"], ["T-2", 7]]})
+    destino = str(tmp_path / "destino.xlsx")
+    qr = app.generar_qr_optimizado("A1", return_bytes=True, formato='png1')
+    anclas = {"Datos": [(2, 13, qr), (3, 13, qr), (5, 13, qr)], "Tickets": [(2, 3, qr), (3, 4, qr)]}
+    dimensiones = app.calcular_dimensiones_optimas(4)
+    registro = {}
+
+    estadisticas = app.guardar_excel_streaming(origen, destino, anclas, dimensiones, registro)
+    assert estadisticas == {'anclas': 5, 'imagenes': 1, 'bytes_ahorrados': 4 * len(qr)}
+    assert set(registro["Tickets"]) == {(2, 3), (3, 4)}
+    comprobar_paquete(destino)
+
+    # Los valores (y las fórmulas) no cambian; las celdas con QR se crean vacías
+    esperados = _valores(origen)
+    for hoja, filas in _valores(destino).items():
+        assert [[valor for valor in fila if valor is not None] for fila in filas] == \
+               [[valor for valor in fila if valor is not None] for fila in esperados[hoja]]
+    wb = openpyxl.load_workbook(destino)
+    assert wb["Tickets"]["B2"].value == "=1+1"
+    assert anclas_de(wb["Datos"]) == [(2, 13), (3, 13), (5, 13)]
+    assert anclas_de(wb["Tickets"]) == [(2, 3), (3, 4)]
+    assert wb["Datos"].row_dimensions[5].height == dimensiones['altura_celda']
+    assert wb["Datos"].row_dimensions[4].height is None
+    assert wb["Tickets"].column_dimensions["D"].width == dimensiones['ancho_celda']
+    assert wb["Tickets"]["C2"].alignment.horizontal == 'center'
+
+
+def test_streaming_y_completo_producen_el_mismo_libro(tmp_path, opciones_rapidas):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-1", "", "ID-3"])
+    salidas = {}
+    for modo in ("completo", "streaming"):
+        opciones = dict(opciones_rapidas, directorio_salida=str(tmp_path / modo))
+        resumen = app.procesar_excel_optimizado(origen, modo_escritura=modo, formato='png1', **opciones)
+        assert resumen['exito']
+        salidas[modo] = resumen['salida']
+        comprobar_paquete(resumen['salida'])
+
+    assert _valores(salidas["completo"]) == _valores(salidas["streaming"])
+    assert _medias(salidas["completo"]) == _medias(salidas["streaming"])
+    completo = openpyxl.load_workbook(salidas["completo"]).active
+    streaming = openpyxl.load_workbook(salidas["streaming"]).active
+    assert anclas_de(completo) == anclas_de(streaming) == [(2, 13), (3, 13), (4, 13), (6, 13)]
+
+
+def test_hojas_con_dibujos_y_comentarios(tmp_path):
+    origen = crear_libro(str(tmp_path / "origen.xlsx"), ["ID-1", "ID-2"])
+    ruta_logo = str(tmp_path / "logo.png")
+    with open(ruta_logo, 'wb') as archivo:
+        archivo.write(app.generar_qr_optimizado("LOGO", return_bytes=True, formato='png1'))
+    wb = openpyxl.load_workbook(origen)
+    wb["Datos"]["A2"].comment = Comment("Revisar", "autor")
+    portada = wb.create_sheet("Portada")
+    portada.add_image(XLImage(ruta_logo), "B2")
+    wb.save(origen)
+
+    destino = str(tmp_path / "destino.xlsx")
+    qr = app.generar_qr_optimizado("ID-1", return_bytes=True, formato='png1')
+    app.guardar_excel_streaming(origen, destino, {"Datos": [(2, 13, qr), (3, 13, qr)]},
+                                app.calcular_dimensiones_optimas(2))
+    dibujos = comprobar_paquete(destino)
+    assert set(dibujos) == {"Datos"}
+    wb = openpyxl.load_workbook(destino)
+    assert anclas_de(wb["Datos"]) == [(2, 13), (3, 13)]
+    assert wb["Datos"]["A2"].value == "dato_0_1"
+    assert wb.sheetnames == ["Datos", "Portada"]
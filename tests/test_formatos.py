@@ -0,0 +1,126 @@
+"""
+Pruebas de los formatos de salida: codificadores registrados y formatos que
+Excel no muestra (WebP/SVG).
+"""
+
+import os
+import zipfile
+
+import pytest
+
+from conftest import app, crear_libro
+
+
+def _codificar_gif(qr, calidad, motor):
+    return app._guardar_en_memoria(app.renderizar_matriz_qr(qr.get_matrix(), app.QR_BOX_SIZE), format='GIF')
+
+
+def _medias(ruta):
+    with zipfile.ZipFile(ruta) as paquete:
+        return [paquete.read(n) for n in paquete.namelist() if n.startswith('xl/media/')]
+
+
+def test_codificador_registrado_usa_su_extension(tmp_path, opciones_rapidas, monkeypatch):
+    monkeypatch.setitem(app.CODIFICADORES, 'gif', ('.gif', _codificar_gif))
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2"])
+    opciones = dict(opciones_rapidas, usar_cache=True)
+
+    primera = app.procesar_excel_optimizado(origen, formato='gif', **opciones)
+    assert primera['exito'], primera['error']
+    assert sorted(os.path.splitext(nombre)[1] for nombre in os.listdir(primera['directorio_qr'])) == \
+        ['.gif', '.gif']
+
+    # Las entradas de caché llevan la extensión registrada: la segunda ejecución acierta
+    segunda = app.procesar_excel_optimizado(origen, formato='gif', **opciones)
+    assert segunda['exito']
+    assert segunda['cache_aciertos'] == 2
+
+
+def test_webp_incrusta_png_del_pool_y_de_la_cache(tmp_path, opciones_rapidas, monkeypatch, capsys):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-1"])
+    opciones = dict(opciones_rapidas, usar_cache=True)
+
+    primera = app.procesar_excel_optimizado(origen, formato='webp', **opciones)
+    assert primera['exito'], primera['error']
+    assert all(datos.startswith(b'\x89PNG') for datos in _medias(primera['salida']))
+    salida = capsys.readouterr().out
+    assert "Formato WebP sin pérdida" in salida
+    assert "Formato JPEG" not in salida and "75-80%" not in salida
+
+    # Todo en caché (WebP y su PNG): no se vuelve a codificar nada
+    def sin_codificar(*_):
+        raise AssertionError("no debería codificarse ningún QR")
+
+    monkeypatch.setitem(app.CODIFICADORES, 'png1', ('.png', sin_codificar))
+    monkeypatch.setitem(app.CODIFICADORES, 'webp', ('.webp', sin_codificar))
+    segunda = app.procesar_excel_optimizado(origen, formato='webp', **opciones)
+    assert segunda['exito'], segunda['error']
+    assert segunda['cache_aciertos'] == 2
+    assert sorted(_medias(segunda['salida'])) == sorted(_medias(primera['salida']))
+
+
+def test_generar_imagenes_qr_devuelve_la_imagen_para_excel(tmp_path):
+    tareas = [("ID-1", str(tmp_path / "a")), ("ID-2", str(tmp_path / "b"))]
+    for formato, firma in (('svg', b'<svg'), ('jpeg', b'\xff\xd8')):
+        resultados, _ = app.generar_imagenes_qr(tareas, workers=1, usar_cache=False, en_memoria=True,
+                                                guardar_archivos=False, formato=formato, imagen_excel=True)
+        for datos, tamano, excel in resultados:
+            assert datos.startswith(firma) and tamano == len(datos)
+            assert excel.startswith(b'\xff\xd8' if formato == 'jpeg' else b'\x89PNG')
+
+
+@pytest.mark.parametrize("primera_con_archivo", [True, False])
+def test_incremental_con_archivo_conserva_el_formato(tmp_path, opciones_rapidas, primera_con_archivo):
+    import openpyxl
+
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-3"])
+    opciones = dict(opciones_rapidas, incremental=True, formato='webp')
+    primera = app.procesar_excel_optimizado(origen, archivo_imagenes=primera_con_archivo, **opciones)
+    assert primera['exito'], primera['error']
+
+    wb = openpyxl.load_workbook(origen)
+    wb.active["L4"] = "ID-4"
+    wb.save(origen)
+    segunda = app.procesar_excel_optimizado(origen, archivo_imagenes=True, **opciones)
+    assert segunda['exito'], segunda['error']
+
+    # Las filas reutilizadas salen del archivo anterior (o se resuelven de nuevo), no
+    # del PNG incrustado en el libro
+    with app.ArchivoImagenesQR(segunda['archivo_imagenes']) as archivo:
+        assert sorted(archivo) == ["ID-1", "ID-2", "ID-4"]
+        for id_unico in archivo:
+            assert archivo.nombre(id_unico).endswith(".webp")
+            assert bytes(archivo[id_unico]) == app.generar_qr_optimizado(id_unico, return_bytes=True,
+                                                                        formato='webp')
+
+
+def test_auto_solo_para_excel_codifica_una_vez(tmp_path, opciones_rapidas, monkeypatch, capsys):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2"])
+    codificados = []
+
+    def contar(nombre):
+        extension, funcion = app.CODIFICADORES[nombre]
+
+        def codificar(qr, calidad, motor):
+            codificados.append(nombre)
+            return funcion(qr, calidad, motor)
+        monkeypatch.setitem(app.CODIFICADORES, nombre, (extension, codificar))
+
+    for nombre in app.CODIFICADORES:
+        contar(nombre)
+
+    # Sin carpeta ni archivo de imágenes: ni WebP ni un segundo PNG para Excel
+    resumen = app.procesar_excel_optimizado(origen, formato='auto', en_memoria=True, guardar_carpeta=False,
+                                            **opciones_rapidas)
+    assert resumen['exito'], resumen['error']
+    assert resumen['directorio_qr'] is None
+    assert 'webp' not in codificados
+    assert len(codificados) == 2 * len(app.FORMATOS_AUTO['auto_excel'])
+    assert all(datos.startswith((b'\x89PNG', b'\xff\xd8')) for datos in _medias(resumen['salida']))
+    assert "auto para Excel" in capsys.readouterr().out
+
+    # Con carpeta, 'auto' sigue probando todos sus candidatos
+    codificados.clear()
+    resumen = app.procesar_excel_optimizado(origen, formato='auto', **opciones_rapidas)
+    assert resumen['exito'], resumen['error']
+    assert codificados.count('webp') == 2
@@ -0,0 +1,126 @@
+"""
+Pruebas de inyectar_imagenes_xlsx(): el paquete resultante se vuelve a abrir
+con openpyxl y se comprueban anclas, relaciones y [Content_Types].xml.
+"""
+
+import os
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.comments import Comment
+from openpyxl.drawing.image import Image as XLImage
+
+from conftest import app, anclas_de, comprobar_paquete
+
+
+def _qr(texto):
+    return app.generar_qr_optimizado(texto, return_bytes=True, formato='png1')
+
+
+def _dimensiones():
+    return app.calcular_dimensiones_optimas(10)
+
+
+def test_anclas_relaciones_y_tipos(tmp_path):
+    ruta = str(tmp_path / "libro.xlsx")
+    wb = openpyxl.Workbook()
+    wb.active.title = "Datos"
+    wb.create_sheet("Otra")
+    wb.save(ruta)
+
+    repetida = _qr("REPETIDO")
+    anclas = {
+        "Datos": [(2, 13, _qr("A")), (3, 13, repetida), (4, 13, repetida)],
+        "Otra": [(5, 2, repetida), (5, 3, _qr("B"))],
+    }
+    dimensiones = _dimensiones()
+    registro = {}
+    estadisticas = app.inyectar_imagenes_xlsx(ruta, anclas, dimensiones, registro)
+
+    assert estadisticas['anclas'] == 5
+    assert estadisticas['imagenes'] == 3
+    assert estadisticas['bytes_ahorrados'] == 2 * len(repetida)
+    assert set(registro["Otra"]) == {(5, 2), (5, 3)}
+    assert registro["Datos"][(3, 13)] == registro["Datos"][(4, 13)] == registro["Otra"][(5, 2)]
+
+    dibujos = comprobar_paquete(ruta)
+    assert set(dibujos) == {"Datos", "Otra"}
+    with zipfile.ZipFile(ruta) as paquete:
+        assert len([n for n in paquete.namelist() if n.startswith('xl/media/')]) == 3
+
+    wb = openpyxl.load_workbook(ruta)
+    assert anclas_de(wb["Datos"]) == [(2, 13), (3, 13), (4, 13)]
+    assert anclas_de(wb["Otra"]) == [(5, 2), (5, 3)]
+    imagen = wb["Datos"]._images[0]
+    assert imagen.anchor._from.colOff == dimensiones['offset_horizontal']
+    assert imagen.anchor._from.rowOff == dimensiones['offset_vertical']
+    assert imagen.anchor.ext.width == dimensiones['imagen_width'] * app.EMU_POR_PIXEL
+
+
+def test_conserva_comentarios(tmp_path):
+    ruta = str(tmp_path / "comentarios.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws["A1"] = "ID_Unico"
+    ws["A1"].comment = Comment("Nota de la columna", "autor")
+    ws["A2"] = "ABC"
+    wb.save(ruta)
+
+    app.inyectar_imagenes_xlsx(ruta, {ws.title: [(2, 13, _qr("ABC"))]}, _dimensiones())
+    comprobar_paquete(ruta)
+
+    with zipfile.ZipFile(ruta) as paquete:
+        xml_hoja = paquete.read(app._partes_hojas_xlsx(paquete)[ws.title])
+    # El esquema exige <drawing> antes de <legacyDrawing> (comentarios)
+    assert xml_hoja.index(b'<drawing ') < xml_hoja.index(b'<legacyDrawing')
+
+    wb = openpyxl.load_workbook(ruta)
+    assert wb.active["A1"].comment.text == "Nota de la columna"
+    assert anclas_de(wb.active) == [(2, 13)]
+
+
+def test_hoja_con_dibujo_propio(tmp_path):
+    ruta = str(tmp_path / "dibujos.xlsx")
+    ruta_logo = str(tmp_path / "logo.png")
+    with open(ruta_logo, 'wb') as archivo:
+        archivo.write(_qr("LOGO"))
+    wb = openpyxl.Workbook()
+    wb.active.title = "Portada"
+    wb.active.add_image(XLImage(ruta_logo), "B2")
+    wb.create_sheet("Datos")
+    wb.save(ruta)
+
+    # Otra hoja del libro: su dibujo se conserva y el nuevo no choca con él
+    app.inyectar_imagenes_xlsx(ruta, {"Datos": [(2, 13, _qr("X"))]}, _dimensiones())
+    dibujos = comprobar_paquete(ruta)
+    assert dibujos["Portada"] != dibujos["Datos"]
+    wb = openpyxl.load_workbook(ruta)
+    assert anclas_de(wb["Portada"]) == [(2, 2)]
+    assert anclas_de(wb["Datos"]) == [(2, 13)]
+
+    # La misma hoja: solo se admite un dibujo por hoja y el libro queda intacto
+    with open(ruta, 'rb') as archivo:
+        original = archivo.read()
+    with pytest.raises(ValueError):
+        app.inyectar_imagenes_xlsx(ruta, {"Portada": [(3, 13, _qr("Y"))]}, _dimensiones())
+    with open(ruta, 'rb') as archivo:
+        assert archivo.read() == original
+    assert sorted(os.listdir(tmp_path)) == ["dibujos.xlsx", "logo.png"]
+
+
+def test_reutiliza_partes_de_otro_libro(tmp_path):
+    anterior = str(tmp_path / "anterior.xlsx")
+    nuevo = str(tmp_path / "nuevo.xlsx")
+    for ruta in (anterior, nuevo):
+        openpyxl.Workbook().save(ruta)
+    imagen = _qr("PREVIO")
+    registro = {}
+    app.inyectar_imagenes_xlsx(anterior, {"Sheet": [(2, 13, imagen)]}, _dimensiones(), registro)
+    parte, _ = registro["Sheet"][(2, 13)]
+
+    app.inyectar_imagenes_xlsx(nuevo, {"Sheet": [(2, 13, app.ParteXlsx(anterior, parte))]}, _dimensiones())
+    comprobar_paquete(nuevo)
+    with zipfile.ZipFile(nuevo) as paquete:
+        medias = [n for n in paquete.namelist() if n.startswith('xl/media/')]
+        assert [paquete.read(n) for n in medias] == [imagen]
@@ -0,0 +1,84 @@
+"""
+Pruebas del modo de máscara 'memo': versión y máscara reutilizadas entre IDs
+de la misma forma.
+"""
+
+import random
+import string
+
+import pytest
+
+from conftest import app
+
+
+def _qr(texto, version=1, mascara=None):
+    import qrcode
+
+    qr = qrcode.QRCode(version=version, error_correction=app.QR_ERROR_CORRECTION,
+                       box_size=app.QR_BOX_SIZE, border=app.QR_BORDER, mask_pattern=mascara)
+    qr.add_data(texto)
+    return qr
+
+
+def _textos(alfabeto, longitud, cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    return ["".join(aleatorio.choice(alfabeto) for _ in range(longitud)) for _ in range(cantidad)]
+
+
+@pytest.fixture(autouse=True)
+def formas_vacias(monkeypatch):
+    """Cada prueba empieza sin formas memorizadas."""
+    monkeypatch.setattr(app, "_FORMAS_QR", app.OrderedDict())
+
+
+@pytest.mark.parametrize("alfabeto", [string.digits, string.ascii_uppercase + string.digits,
+                                      string.ascii_letters + string.digits + "-_/:"])
+@pytest.mark.parametrize("longitud", [1, 8, 17, 32, 64, 150, 400])
+def test_memo_equivale_a_una_construccion_valida(alfabeto, longitud):
+    textos = _textos(alfabeto, longitud, 6, semilla=longitud)
+    for texto in textos:
+        ajustado = _qr(texto)
+        ajustado.make(fit=True)
+        memo = _qr(texto)
+        app.construir_qr_memoizado(memo)
+
+        # Misma versión que la búsqueda de ajuste y una máscara válida
+        clave = (tuple((segmento.mode, len(segmento)) for segmento in memo.data_list), memo.error_correction)
+        version, mascara = app._FORMAS_QR[clave]
+        assert memo.version == version == ajustado.version
+        assert mascara in range(8)
+        # Exactamente el QR que qrcode construye con esa versión y esa máscara: la
+        # información de formato declara la máscara usada y el código se lee igual
+        referencia = _qr(texto, version, mascara)
+        referencia.make(fit=False)
+        assert memo.get_matrix() == referencia.get_matrix()
+    # Los IDs de la misma forma reutilizan la entrada memorizada
+    assert len(app._FORMAS_QR) < len(textos)
+
+
+def test_formas_memorizadas_acotadas(monkeypatch):
+    monkeypatch.setattr(app, "CAPACIDAD_FORMAS_QR", 4)
+    for longitud in range(1, 11):
+        app.construir_qr_memoizado(_qr("x" * longitud))
+    assert len(app._FORMAS_QR) == 4
+
+    # Una forma usada recientemente sobrevive a la siguiente expulsión
+    app.construir_qr_memoizado(_qr("y" * 7))
+    app.construir_qr_memoizado(_qr("x" * 11))
+    longitudes = [segmentos[0][1] for segmentos, _ in app._FORMAS_QR]
+    assert longitudes == [9, 10, 7, 11]
+
+
+def test_mascara_independiente_del_orden():
+    # Cada proceso del pool ve primero un ID distinto de la misma forma
+    ids = _textos("0123456789abcdef", 32, 20, semilla=1)
+    matrices = []
+    for orden in (ids, ids[::-1]):
+        app._FORMAS_QR.clear()
+        por_id = {}
+        for id_unico in orden:
+            qr = _qr(id_unico)
+            app.construir_qr_memoizado(qr)
+            por_id[id_unico] = qr.get_matrix()
+        matrices.append(por_id)
+    assert matrices[0] == matrices[1]
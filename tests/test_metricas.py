@@ -0,0 +1,74 @@
+"""
+Pruebas de la instrumentación y de la exportación en formato Prometheus.
+"""
+
+import re
+
+from conftest import app
+
+# Muestra del formato de exposición: nombre{etiquetas} valor
+PATRON_MUESTRA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{((?:[a-zA-Z_]\w*="(?:[^"\\\n]|\\.)*",?)*)\} (\S+)$')
+PATRON_ETIQUETA = re.compile(r'([a-zA-Z_]\w*)="((?:[^"\\]|\\.)*)"')
+
+
+def _desescapar(valor):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), valor)
+
+
+def _muestras(texto):
+    """
+    Analiza el texto exportado.
+
+    Returns:
+        tuple: ({familia: tipo}, [(nombre, {etiqueta: valor}, valor)])
+    """
+    tipos = {}
+    muestras = []
+    for linea in texto.splitlines():
+        if linea.startswith("# TYPE "):
+            _, _, nombre, tipo = linea.split(" ")
+            assert nombre not in tipos, f"familia {nombre} declarada dos veces"
+            tipos[nombre] = tipo
+            continue
+        coincidencia = PATRON_MUESTRA.match(linea)
+        assert coincidencia, f"línea no válida: {linea!r}"
+        nombre, etiquetas, valor = coincidencia.groups()
+        muestras.append((nombre, {clave: _desescapar(crudo) for clave, crudo in PATRON_ETIQUETA.findall(etiquetas)},
+                         float(valor)))
+    return tipos, muestras
+
+
+def _metricas(latencias):
+    metricas = app.MetricasEjecucion()
+    metricas.etapa('generacion_qr')
+    metricas.contar('filas_leidas', len(latencias))
+    for segundos in latencias:
+        metricas.observar('latencia_qr', segundos)
+    return metricas.a_dict()
+
+
+def test_exportacion_prometheus():
+    archivo_raro = 'C:\\datos\\"libro"\nnuevo.xlsx'
+    latencias = [0.0001, 0.003, 0.003, 0.2, 5.0]
+    texto = app.metricas_a_prometheus([("a.xlsx", _metricas(latencias)), (archivo_raro, _metricas([0.01]))])
+    tipos, muestras = _muestras(texto)
+
+    assert tipos == {'qr_etapa_pared_segundos': 'gauge', 'qr_etapa_cpu_segundos': 'gauge',
+                     'qr_filas_leidas': 'gauge', 'qr_latencia_qr_segundos': 'histogram'}
+    # El nombre del archivo vuelve intacto tras escapar \\, " y el salto de línea
+    assert {etiquetas['archivo'] for _, etiquetas, _ in muestras} == {"a.xlsx", archivo_raro}
+
+    por_archivo = [(nombre, etiquetas, valor) for nombre, etiquetas, valor in muestras
+                   if etiquetas['archivo'] == "a.xlsx"]
+    cubetas = [(etiquetas['le'], valor) for nombre, etiquetas, valor in por_archivo
+               if nombre == 'qr_latencia_qr_segundos_bucket']
+    # Cubetas acumulativas, una por límite y +Inf al final
+    assert [le for le, _ in cubetas] == [str(limite) for limite in app.LIMITES_LATENCIA] + ['+Inf']
+    assert [valor for _, valor in cubetas] == [
+        sum(1 for segundos in latencias if segundos <= float(le)) for le, _ in cubetas]
+    totales = {nombre: valor for nombre, _, valor in por_archivo
+               if nombre in ('qr_latencia_qr_segundos_sum', 'qr_latencia_qr_segundos_count',
+                             'qr_filas_leidas')}
+    assert totales['qr_latencia_qr_segundos_count'] == len(latencias) == cubetas[-1][1]
+    assert abs(totales['qr_latencia_qr_segundos_sum'] - sum(latencias)) < 1e-6
+    assert totales['qr_filas_leidas'] == len(latencias)
@@ -0,0 +1,67 @@
+"""
+Pruebas de la limpieza de IDs y de la asignación de nombres de archivo únicos.
+"""
+
+import re
+
+import pytest
+
+from conftest import app
+
+
+def _valido(nombre):
+    return bool(re.fullmatch(r'[a-z0-9_\-]+', nombre)) and len(nombre) <= app.LONGITUD_MAXIMA_NOMBRE
+
+
+def test_limpiar_columna():
+    nombres = ["ID 001", "  Ab/c?d  ", "ÁRBOL-1", "nan", "None", "", "...", "a\nb", "x_y-Z"]
+    assert app._limpiar_columna(nombres) == ["id_001", "abcd", "rbol-1", "", "", "", "", "ab", "x_y-z"]
+
+
+def test_limpiar_columna_con_saltos_de_linea_internos():
+    # El salto de línea interno obliga a la limpieza fila a fila: el resto de filas no se desplaza
+    assert app._limpiar_columna(["A 1", "b\nc", "D"]) == ["a_1", "bc", "d"]
+
+
+@pytest.mark.parametrize("ids", [
+    ["a b", "a_b", "a/b_", "A B"],            # iguales tras la limpieza
+    ["ABC", "abc", "Abc"],                    # solo difieren en mayúsculas
+    ["", "...", "???", "nan", "None"],        # vacíos tras la limpieza
+    ["CON", "con", "Nul", "com1", "LPT9"],    # nombres reservados de Windows
+    ["x" * 150, "x" * 151, "x" * 100],        # truncados a la longitud máxima
+])
+def test_nombres_unicos_y_validos(ids):
+    nombres = app.asignar_nombres_archivo(ids)
+    assert set(nombres) == set(ids)
+    # Únicos también en un sistema de archivos que no distingue mayúsculas
+    assert len({nombre.lower() for nombre in nombres.values()}) == len(ids)
+    for nombre in nombres.values():
+        assert _valido(nombre), nombre
+        assert nombre not in app.NOMBRES_RESERVADOS
+    # Deterministas: la misma lista da los mismos nombres
+    assert app.asignar_nombres_archivo(ids) == nombres
+
+
+def test_primer_id_conserva_el_nombre_limpio():
+    nombres = app.asignar_nombres_archivo(["ID-1", "id-1", "ID 2", "...", "ID-1"])
+    assert nombres["ID-1"] == "id-1"
+    assert nombres["id-1"] == f"id-1_{app.sufijo_hash_nombre('id-1')}"
+    assert nombres["ID 2"] == "id_2"
+    assert nombres["..."] == f"qr_{app.sufijo_hash_nombre('...')}"
+
+
+def test_nombre_con_sufijo_no_quita_el_suyo_a_un_id_posterior():
+    # "A" choca con "a" y su nombre con sufijo coincide con el limpio de un ID posterior
+    sufijado = f"a_{app.sufijo_hash_nombre('A')}"
+    nombres = app.asignar_nombres_archivo(["a", "A", sufijado])
+    assert nombres[sufijado] == sufijado
+    assert nombres["A"] not in ("a", sufijado)
+    assert nombres["A"].startswith(sufijado)
+
+
+def test_nombre_reservado_lleva_sufijo():
+    nombres = app.asignar_nombres_archivo(["CON", "aux1", "COM10"])
+    assert nombres["CON"] == f"con_{app.sufijo_hash_nombre('CON')}"
+    # Solo los nombres exactos están reservados
+    assert nombres["aux1"] == "aux1"
+    assert nombres["COM10"] == "com10"
@@ -0,0 +1,187 @@
+"""
+Pruebas de extremo a extremo de procesar_excel_optimizado().
+"""
+
+import os
+
+import pytest
+
+from conftest import app, crear_libro
+
+
+def _carpetas_qr(directorio_salida):
+    principal = os.path.join(directorio_salida, "codigos_qr_optimizados")
+    if not os.path.isdir(principal):
+        return None
+    return sorted(os.listdir(principal))
+
+
+@pytest.mark.parametrize("opciones", [
+    {'en_memoria': True, 'guardar_carpeta': False},
+    {'archivo_imagenes': True},
+])
+def test_sin_carpeta_no_crea_directorios(tmp_path, opciones_rapidas, opciones):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2"])
+    resumen = app.procesar_excel_optimizado(origen, **opciones_rapidas, **opciones)
+    assert resumen['exito']
+    assert resumen['directorio_qr'] is None
+    assert _carpetas_qr(opciones_rapidas['directorio_salida']) is None
+
+
+def test_incremental_sin_cambios_no_deja_carpeta_vacia(tmp_path, opciones_rapidas):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2"])
+    primera = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert primera['exito'] and primera['directorio_qr']
+    carpetas = _carpetas_qr(opciones_rapidas['directorio_salida'])
+    assert len(carpetas) == 1
+
+    segunda = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert segunda['exito']
+    assert segunda['directorio_qr'] is None
+    assert _carpetas_qr(opciones_rapidas['directorio_salida']) == carpetas
+
+
+def test_incremental_en_hoja_con_dibujos_propios(tmp_path, opciones_rapidas):
+    # Regresión: las filas reutilizadas (ParteXlsx) de una hoja que ya tiene
+    # imágenes van por XLImage y deben leerse del libro anterior
+    import openpyxl
+    from openpyxl.drawing.image import Image as XLImage
+
+    from conftest import anclas_de
+
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-3"])
+    primera = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert primera['exito']
+
+    ruta_logo = str(tmp_path / "logo.png")
+    with open(ruta_logo, 'wb') as archivo:
+        archivo.write(app.generar_qr_optimizado("LOGO", return_bytes=True, formato='png1'))
+    wb = openpyxl.load_workbook(origen)
+    wb.active.add_image(XLImage(ruta_logo), "A10")
+    wb.active["L4"] = "ID-3-CAMBIADO"
+    wb.save(origen)
+
+    segunda = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert segunda['exito'], segunda['error']
+    hoja = openpyxl.load_workbook(segunda['salida']).active
+    assert anclas_de(hoja) == [(2, 13), (3, 13), (4, 13), (10, 1)]
+
+
+def test_reanudar_tras_una_caida(tmp_path, opciones_rapidas, monkeypatch, capsys):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-3"])
+
+    def caida(*_, **__):
+        raise RuntimeError("caída durante el guardado")
+
+    monkeypatch.setattr(app, "inyectar_imagenes_xlsx", caida)
+    primera = app.procesar_excel_optimizado(origen, **opciones_rapidas)
+    assert not primera['exito']
+    carpeta = primera['directorio_qr']
+    assert len(os.listdir(carpeta)) == 3
+
+    monkeypatch.undo()
+    capsys.readouterr()
+    segunda = app.procesar_excel_optimizado(origen, reanudar=True, **opciones_rapidas)
+    assert segunda['exito'], segunda['error']
+    assert "3 imágenes reutilizadas, 0 por generar" in capsys.readouterr().out
+    assert segunda['directorio_qr'] == carpeta
+    assert _carpetas_qr(opciones_rapidas['directorio_salida']) == [os.path.basename(carpeta)]
+
+
+def test_al_completar_tras_escribir_la_imagen(tmp_path, monkeypatch):
+    import time
+
+    tareas = [(f"ID-{numero}", str(tmp_path / f"qr_{numero}")) for numero in range(6)]
+    avisadas = []
+    # Escrituras lentas: el aviso no puede adelantarse al archivo
+    for nombre in ("_guardar_salida_qr", "_enlazar_o_copiar"):
+        original = getattr(app, nombre)
+        monkeypatch.setattr(app, nombre, lambda *a, _original=original, **k: (time.sleep(0.02), _original(*a, **k))[1])
+
+    def al_completar(posicion, destino, tamano):
+        assert os.path.getsize(destino) == tamano
+        avisadas.append(posicion)
+
+    for _ in range(2):
+        # Generación y, en la segunda pasada, copias desde la caché
+        app.generar_imagenes_qr(tareas, workers=1, tamano_lote=2, directorio_cache=str(tmp_path / "cache"),
+                                al_completar=al_completar)
+        assert sorted(avisadas) == list(range(len(tareas)))
+        for _, ruta in tareas:
+            os.remove(ruta + ".jpg")
+        avisadas.clear()
+
+
+def test_indice_describe_todo_el_libro_en_incremental(tmp_path, opciones_rapidas):
+    import json
+
+    import openpyxl
+
+    def imagenes_del_indice(resumen):
+        with open(app.ruta_indice_qr(resumen['salida']), encoding='utf-8') as archivo:
+            indice = json.load(archivo)
+        rutas = {id_unico: os.path.normpath(os.path.join(indice['directorio_qr'], ruta))
+                 for id_unico, ruta in indice['imagenes'].items()}
+        assert all(os.path.isfile(ruta) for ruta in rutas.values())
+        return rutas
+
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-3"])
+    primera = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert set(imagenes_del_indice(primera)) == {"ID-1", "ID-2", "ID-3"}
+
+    # Una fila cambia: las otras dos siguen apuntando a la carpeta anterior
+    wb = openpyxl.load_workbook(origen)
+    wb.active["L4"] = "ID-4"
+    wb.save(origen)
+    segunda = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    rutas = imagenes_del_indice(segunda)
+    assert set(rutas) == {"ID-1", "ID-2", "ID-4"}
+    assert os.path.dirname(rutas["ID-4"]) == segunda['directorio_qr']
+    assert os.path.dirname(rutas["ID-1"]) == primera['directorio_qr']
+
+    # Sin cambios: el índice se conserva completo
+    tercera = app.procesar_excel_optimizado(origen, incremental=True, **opciones_rapidas)
+    assert tercera['directorio_qr'] is None
+    assert imagenes_del_indice(tercera) == rutas
+
+
+@pytest.mark.parametrize("fallo, etapa", [
+    ("inyectar_imagenes_xlsx", 'insercion'),
+    ("guardar_indice_imagenes_qr", 'guardado'),
+])
+def test_punto_control_registra_la_etapa(tmp_path, opciones_rapidas, monkeypatch, capsys, fallo, etapa):
+    import json
+
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2", "ID-3"])
+
+    def caida(*_, **__):
+        raise RuntimeError(f"caída en la etapa {etapa}")
+
+    monkeypatch.setattr(app, fallo, caida)
+    primera = app.procesar_excel_optimizado(origen, **opciones_rapidas)
+    assert not primera['exito']
+    ruta_salida = os.path.join(opciones_rapidas['directorio_salida'], "ids_con_QR_optimizado.xlsx")
+    with open(app.ruta_punto_control_qr(ruta_salida), encoding='utf-8') as archivo:
+        punto_control = json.load(archivo)
+    assert punto_control['etapa'] == etapa
+    assert sorted(punto_control['imagenes']) == sorted(os.listdir(primera['directorio_qr']))
+
+    monkeypatch.undo()
+    capsys.readouterr()
+    segunda = app.procesar_excel_optimizado(origen, reanudar=True, **opciones_rapidas)
+    assert segunda['exito'], segunda['error']
+    assert "3 imágenes reutilizadas, 0 por generar" in capsys.readouterr().out
+    assert not os.path.exists(app.ruta_punto_control_qr(ruta_salida))
+
+
+@pytest.mark.parametrize("opciones", [
+    {'en_memoria': True, 'guardar_carpeta': False},
+    {'archivo_imagenes': True},
+])
+def test_reanudar_sin_carpeta(tmp_path, opciones_rapidas, capsys, opciones):
+    origen = crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", "ID-2"])
+    resumen = app.procesar_excel_optimizado(origen, reanudar=True, **opciones_rapidas, **opciones)
+    assert resumen['exito']
+    assert "--reanudar requiere la carpeta de imágenes" in capsys.readouterr().out
+    ruta_salida = os.path.join(opciones_rapidas['directorio_salida'], "ids_con_QR_optimizado.xlsx")
+    assert not os.path.exists(app.ruta_punto_control_qr(ruta_salida))
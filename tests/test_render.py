@@ -0,0 +1,72 @@
+"""
+Pruebas del rasterizado de la matriz QR: las imágenes decodifican a los mismos
+módulos que qr.get_matrix().
+"""
+
+import io
+
+import pytest
+
+from conftest import app
+
+TEXTOS = ["A", "ID-000123", "https://ejemplo.com/" + "x" * 120]
+
+
+def _qr(texto, box_size=app.QR_BOX_SIZE, border=app.QR_BORDER):
+    import qrcode
+
+    qr = qrcode.QRCode(error_correction=app.QR_ERROR_CORRECTION, box_size=box_size, border=border)
+    qr.add_data(texto)
+    qr.make(fit=True)
+    return qr
+
+
+def modulos_de_imagen(imagen, box_size, lado):
+    """
+    Muestrea el centro de cada módulo de una imagen decodificada.
+
+    Returns:
+        list: Matriz de booleanos (True = módulo oscuro) de lado x lado
+    """
+    gris = imagen.convert('L')
+    assert gris.size == (lado * box_size, lado * box_size)
+    centro = box_size // 2
+    return [[gris.getpixel((x * box_size + centro, y * box_size + centro)) < 128 for x in range(lado)]
+            for y in range(lado)]
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+@pytest.mark.parametrize("box_size, border", [(app.QR_BOX_SIZE, app.QR_BORDER), (1, 0), (3, 4), (10, 1)])
+def test_rasterizado_numpy_coincide_con_la_matriz(texto, box_size, border):
+    qr = _qr(texto, box_size, border)
+    matriz = qr.get_matrix()
+    imagen = app.renderizar_matriz_qr(matriz, box_size)
+    assert imagen.mode == 'L'
+    assert modulos_de_imagen(imagen, box_size, len(matriz)) == matriz
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+@pytest.mark.parametrize("formato", ['jpeg', 'jpeg_base'])
+def test_jpeg_de_un_canal_decodifica_a_la_matriz(texto, formato):
+    from PIL import Image
+
+    qr = _qr(texto)
+    datos = app.CODIFICADORES[formato][1](qr, 85, 'rapido')
+    imagen = Image.open(io.BytesIO(datos))
+    assert imagen.mode == 'L'
+    assert modulos_de_imagen(imagen, app.QR_BOX_SIZE, len(qr.get_matrix())) == qr.get_matrix()
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+@pytest.mark.parametrize("box_size, border", [(app.QR_BOX_SIZE, app.QR_BORDER), (1, 0), (3, 4), (10, 1)])
+def test_png_1bit_directo_coincide_con_la_matriz(texto, box_size, border):
+    from PIL import Image
+
+    qr = _qr(texto, box_size, border)
+    matriz = qr.get_matrix()
+    imagen = Image.open(io.BytesIO(app.codificar_png_1bit(qr.modules, box_size, border)))
+    imagen.load()
+    assert imagen.mode == '1'
+    assert modulos_de_imagen(imagen, box_size, len(matriz)) == matriz
+    # Sin pérdida: cada píxel, no solo el centro del módulo, coincide con el rasterizado
+    assert imagen.convert('L').tobytes() == app.renderizar_matriz_qr(matriz, box_size).tobytes()
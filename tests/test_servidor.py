@@ -0,0 +1,144 @@
+"""
+Pruebas del servicio HTTP (servidor_qr.py) en un puerto libre elegido por el sistema.
+"""
+
+import asyncio
+import base64
+import gc
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import servidor_qr
+from conftest import app, crear_libro
+
+
+@pytest.fixture
+def servidor():
+    """Servidor escuchando en 127.0.0.1:<puerto libre> en un hilo con su propio bucle."""
+    servicio = servidor_qr.ServicioQR(workers=1, tamano_lote=2)
+    listo = threading.Event()
+    control = {}
+
+    async def principal():
+        control['bucle'] = asyncio.get_running_loop()
+        control['parar'] = asyncio.Event()
+        servidor = await servidor_qr.iniciar_servidor(servicio, '127.0.0.1', 0)
+        control['puerto'] = servidor.sockets[0].getsockname()[1]
+        listo.set()
+        async with servidor:
+            await control['parar'].wait()
+
+    # asyncio.run() cancela al salir las conexiones que sigan abiertas
+    hilo = threading.Thread(target=asyncio.run, args=(principal(),), daemon=True)
+    hilo.start()
+    assert listo.wait(30)
+    try:
+        yield control['puerto'], servicio
+    finally:
+        control['bucle'].call_soon_threadsafe(control['parar'].set)
+        hilo.join(30)
+        servicio.cerrar()
+
+
+def _peticion(puerto, metodo, ruta, cuerpo=None, encabezados=None):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+    try:
+        conexion.request(metodo, ruta, body=cuerpo, headers=encabezados or {})
+        respuesta = conexion.getresponse()
+        return respuesta.status, respuesta.getheader('Content-Type'), respuesta.read()
+    finally:
+        conexion.close()
+
+
+def _lineas(cuerpo):
+    return [json.loads(linea) for linea in cuerpo.decode('utf-8').splitlines()]
+
+
+def _png(texto):
+    return app.generar_qr_optimizado(texto, return_bytes=True, formato='png1')
+
+
+def test_qr_individual(servidor):
+    puerto, servicio = servidor
+    estado, tipo, cuerpo = _peticion(puerto, 'GET', '/qr?id=ABC123&formato=png1')
+    assert (estado, tipo) == (200, 'image/png')
+    assert cuerpo == _png("ABC123")
+
+    # La segunda petición se sirve desde la LRU
+    assert _peticion(puerto, 'GET', '/qr?id=ABC123&formato=png1')[2] == cuerpo
+    assert servicio.contadores['aciertos_lru'] == 1
+    assert _peticion(puerto, 'GET', '/qr?formato=png1')[0] == 400
+
+
+def test_lote_json_en_ndjson(servidor):
+    puerto, _ = servidor
+    ids = ["ID-1", "ID-2", "ID-1", "ID-3"]
+    estado, tipo, cuerpo = _peticion(puerto, 'POST', '/lote?formato=png1', json.dumps({'ids': ids}),
+                                     {'Content-Type': 'application/json'})
+    assert (estado, tipo) == (200, 'application/x-ndjson')
+    *lineas, fin = _lineas(cuerpo)
+    assert fin['fin'] and fin['total'] == fin['generados'] == len(ids)
+    assert sorted(linea['indice'] for linea in lineas) == list(range(len(ids)))
+    for linea in lineas:
+        assert linea['id'] == ids[linea['indice']] and linea['extension'] == '.png'
+        assert base64.b64decode(linea['datos']) == _png(linea['id'])
+
+
+def test_lote_desde_formulario_multipart(servidor, tmp_path):
+    puerto, _ = servidor
+    with open(crear_libro(str(tmp_path / "ids.xlsx"), ["ID-1", None, "ID-2"]), 'rb') as archivo:
+        xlsx = archivo.read()
+    limite = "limite-de-prueba"
+    cuerpo = (f'--{limite}\r\nContent-Disposition: form-data; name="formato"\r\n\r\nsvg\r\n'
+              f'--{limite}\r\nContent-Disposition: form-data; name="archivo"; filename="ids.xlsx"\r\n'
+              f'Content-Type: application/octet-stream\r\n\r\n').encode('ascii') + xlsx + \
+        f'\r\n--{limite}--\r\n'.encode('ascii')
+    estado, _, respuesta = _peticion(puerto, 'POST', '/lote', cuerpo,
+                                     {'Content-Type': f'multipart/form-data; boundary={limite}'})
+    assert estado == 200
+    *lineas, fin = _lineas(respuesta)
+    assert fin['generados'] == 2
+    assert sorted(linea['id'] for linea in lineas) == ["ID-1", "ID-2"]
+    assert all(linea['extension'] == '.svg' for linea in lineas)
+
+
+def test_error_inesperado_responde_500(servidor, monkeypatch):
+    puerto, _ = servidor
+
+    def fallo(_):
+        raise RuntimeError("fallo inesperado")
+
+    monkeypatch.setattr(servidor_qr, "leer_ids_xlsx", fallo)
+    estado, _, cuerpo = _peticion(puerto, 'POST', '/lote', b'PK\x03\x04',
+                                  {'Content-Type': 'application/octet-stream'})
+    assert estado == 500
+    assert json.loads(cuerpo) == {'error': 'error interno del servidor'}
+
+
+def test_fallo_del_pool_sin_excepciones_sin_recoger(monkeypatch):
+    servicio = servidor_qr.ServicioQR(workers=1)
+    servicio.cerrar()
+    servicio.pool = ThreadPoolExecutor(max_workers=1)
+
+    def fallo(*_):
+        raise RuntimeError("pool caído")
+
+    monkeypatch.setattr(servidor_qr, "codificar_lote", fallo)
+    avisos = []
+
+    async def pedir():
+        asyncio.get_running_loop().set_exception_handler(lambda _, contexto: avisos.append(contexto))
+        # Dos peticiones del mismo código se coalescen en una sola codificación
+        return await asyncio.gather(servicio.obtener("ABC"), servicio.obtener("ABC"))
+
+    try:
+        assert asyncio.run(pedir()) == [None, None]
+        gc.collect()
+        assert avisos == []
+        assert servicio.contadores['coalescidas'] == 1
+    finally:
+        servicio.cerrar()